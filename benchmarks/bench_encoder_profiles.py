@@ -0,0 +1,125 @@
+"""
+Benchmark des profils de FaceEncoder (fast / balanced / accurate) : latence du
+descripteur par visage et précision de vérification sur un jeu étiqueté.
+
+Le jeu est un dossier avec un sous-dossier par personne (organisation LFW) :
+
+    dataset/alice/001.jpg, dataset/alice/002.jpg, dataset/bob/001.jpg, ...
+
+La détection (HOG dlib) est faite une seule fois par image et partagée par tous les
+profils : seule la partie propre au profil (landmarks + descripteur) est chronométrée.
+Toutes les paires sont ensuite comparées (core.calibration) pour obtenir EER et TAR
+au FAR visé. Le rapport JSON est lu par models.face_encoder.profile_measurements().
+
+    python benchmarks/bench_encoder_profiles.py dataset/ --target-far 0.001
+"""
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.face_encoder import FaceEncoder, ENCODER_PROFILES, DEFAULT_PROFILE_REPORT
+from core.calibration import pair_histograms, roc_from_histograms
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+def load_dataset(root, max_per_identity=None):
+    """Liste de (chemin, identité) ; seules les identités avec au moins 2 images sont gardées."""
+    samples = []
+    for person in sorted(p for p in Path(root).iterdir() if p.is_dir()):
+        files = sorted(f for f in person.iterdir() if f.suffix.lower() in IMAGE_SUFFIXES)
+        if max_per_identity:
+            files = files[:max_per_identity]
+        if len(files) >= 2:
+            samples.extend((f, person.name) for f in files)
+    return samples
+
+
+def detect(encoder, samples):
+    """Image, niveaux de gris et boîte du plus grand visage, une fois pour tous les profils."""
+    detected = []
+    for path, identity in samples:
+        img = cv2.imread(str(path))
+        if img is None:
+            continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        rects = encoder.detector(gray)
+        if len(rects) == 0:
+            continue
+        r = max(rects, key=lambda r: r.width() * r.height())
+        detected.append((img, gray, (r.left(), r.top(), r.width(), r.height()), identity))
+    return detected
+
+
+def run_profile(encoder, detected, profile):
+    """Embeddings (N, 128) et latences (ms) du profil, après un échauffement."""
+    img, gray, box, _ = detected[0]
+    encoder.encode_faces(img, boxes=[box], gray=gray, profile=profile)
+
+    embeddings = np.zeros((len(detected), 128), dtype=np.float32)
+    latencies = np.zeros(len(detected))
+    for i, (img, gray, box, _) in enumerate(detected):
+        t0 = time.perf_counter()
+        _, emb = encoder.encode_faces(img, boxes=[box], gray=gray, profile=profile)
+        latencies[i] = (time.perf_counter() - t0) * 1000
+        embeddings[i] = emb[0]
+    return embeddings, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence / précision des profils FaceEncoder")
+    parser.add_argument("dataset", help="Dossier avec un sous-dossier d'images par personne")
+    parser.add_argument("--profiles", nargs="+", default=list(ENCODER_PROFILES), choices=list(ENCODER_PROFILES))
+    parser.add_argument("--max-per-identity", type=int, default=None)
+    parser.add_argument("--target-far", type=float, default=1e-3, help="FAR pour le TAR rapporté")
+    parser.add_argument("--workers", type=int, default=None, help="Processus pour la comparaison des paires")
+    parser.add_argument("--output", default=str(DEFAULT_PROFILE_REPORT), help="Rapport JSON")
+    args = parser.parse_args()
+
+    samples = load_dataset(args.dataset, args.max_per_identity)
+    encoder = FaceEncoder()
+    detected = detect(encoder, samples)
+    if len(detected) < 2:
+        raise SystemExit("Pas assez de visages détectés dans le jeu de données.")
+    identities = {identity: i for i, identity in enumerate(sorted({d[3] for d in detected}))}
+    labels = np.array([identities[d[3]] for d in detected], dtype=np.int32)
+
+    report = {
+        "dataset": str(args.dataset),
+        "faces": len(detected),
+        "identities": len(identities),
+        "target_far": args.target_far,
+        "profiles": {},
+    }
+    print(f"{len(detected)} visages, {len(identities)} personnes")
+    print(f"{'Profil':<10}{'moy. ms':>9}{'p95 ms':>9}{'EER':>9}{'TAR@FAR':>10}{'seuil':>8}")
+    for profile in args.profiles:
+        embeddings, latencies = run_profile(encoder, detected, profile)
+        totals, _, _ = pair_histograms(embeddings, labels, workers=args.workers)
+        roc = roc_from_histograms(*totals["euclidean"], target_far=args.target_far)
+        report["profiles"][profile] = {
+            "settings": ENCODER_PROFILES[profile],
+            "latency_ms_mean": round(float(latencies.mean()), 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            "eer": roc["eer"],
+            "verification_accuracy": round(1.0 - roc["eer"], 5),
+            "tar_at_target_far": round(roc["tar_at_recommended"], 5),
+            "threshold_euclidean": roc["recommended_threshold"],
+        }
+        res = report["profiles"][profile]
+        print(f"{profile:<10}{res['latency_ms_mean']:>9.2f}{res['latency_ms_p95']:>9.2f}"
+              f"{res['eer']:>9.3%}{res['tar_at_target_far']:>10.3%}{res['threshold_euclidean']:>8.3f}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Rapport : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark du prétraitement âge/genre : chemin historique (resize → cvtColor →
+astype/255 → expand_dims, une allocation par étape) contre PreprocessBuffer
+(buffers préalloués réutilisés).
+
+    python benchmarks/bench_preprocessing.py --frames 300 --faces 1 --fps 30
+"""
+import sys
+import time
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.preprocessing import PreprocessBuffer
+
+
+def legacy_preprocess(crops, size=(224, 224)):
+    batch = []
+    for face_img in crops:
+        face_img = cv2.resize(face_img, size)
+        face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+        face_img = face_img.astype("float32") / 255.0
+        batch.append(np.expand_dims(face_img, axis=0))
+    return np.concatenate(batch, axis=0)
+
+
+def make_crops(n_frames, n_faces, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n_frames):
+        crops = []
+        for _ in range(n_faces):
+            h, w = rng.integers(120, 320, size=2)
+            crops.append(rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8))
+        frames.append(crops)
+    return frames
+
+
+def run(fn, frames):
+    """Retourne (latence moyenne ms, latence p95 ms, pic d'octets alloués par image)."""
+    for crops in frames[:5]:
+        fn(crops)
+
+    latencies = []
+    for crops in frames:
+        t0 = time.perf_counter()
+        fn(crops)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    tracemalloc.start()
+    allocated = 0
+    for crops in frames:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        fn(crops)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - current
+    tracemalloc.stop()
+
+    return float(np.mean(latencies)), float(np.percentile(latencies, 95)), allocated / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prétraitement âge/genre")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--faces", type=int, default=1, help="Visages par image")
+    parser.add_argument("--fps", type=float, default=30.0, help="Cadence caméra de référence")
+    args = parser.parse_args()
+
+    frames = make_crops(args.frames, args.faces)
+    buffer = PreprocessBuffer(size=(224, 224), batch_size=args.faces)
+
+    ref = legacy_preprocess(frames[0])
+    out = buffer.fill(frames[0])
+    assert np.allclose(ref, out, atol=1e-6), "Résultats différents entre les deux chemins"
+
+    budget_ms = 1000.0 / args.fps
+    print(f"{args.frames} images, {args.faces} visage(s)/image, budget {budget_ms:.1f} ms/image à {args.fps:g} img/s")
+    print(f"{'Chemin':<18}{'moy. ms':>10}{'p95 ms':>10}{'Ko alloués/img':>17}{'% budget':>10}")
+    for name, fn in (("historique", legacy_preprocess), ("PreprocessBuffer", buffer.fill)):
+        mean_ms, p95_ms, bytes_per_frame = run(fn, frames)
+        print(f"{name:<18}{mean_ms:>10.3f}{p95_ms:>10.3f}{bytes_per_frame / 1024:>17.1f}"
+              f"{100 * mean_ms / budget_ms:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
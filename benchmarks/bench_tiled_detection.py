@@ -0,0 +1,65 @@
+"""
+Latence de FaceDetector sur des images haute résolution : détection en un seul appel
+contre détection tuilée avec 1, 2, 4… threads. Les visages trouvés sont comptés pour
+vérifier que le découpage n'en perd pas.
+
+    python benchmarks/bench_tiled_detection.py entree_4k.jpg --detector dlib --tile-size 1024
+"""
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.face_detector import FaceDetector
+
+
+def measure(detector, grays, repeat):
+    """Latence moyenne (ms) par image et nombre total de visages, après un échauffement."""
+    detector.detect_faces(None, gray=grays[0])
+    latencies = []
+    faces = 0
+    for _ in range(repeat):
+        for gray in grays:
+            t0 = time.perf_counter()
+            found, _ = detector.detect_faces(None, gray=gray)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        faces = sum(len(detector.detect_faces(None, gray=gray)[0]) for gray in grays)
+    return float(np.mean(latencies)), faces
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Détection tuilée : latence selon le nombre de threads")
+    parser.add_argument("images", nargs="+", help="Images haute résolution")
+    parser.add_argument("--detector", choices=("haar", "dlib", "cascade"), default="dlib")
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--tile-overlap", type=int, default=None)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, cpus} & set(range(1, cpus + 1))))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    grays = [cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in args.images]
+    grays = [g for g in grays if g is not None]
+    if not grays:
+        raise SystemExit("Aucune image lisible.")
+
+    base_ms, base_faces = measure(FaceDetector(detector_type=args.detector), grays, args.repeat)
+    print(f"{len(grays)} image(s) {grays[0].shape[1]}x{grays[0].shape[0]}, détecteur {args.detector}")
+    print(f"{'mode':<14}{'ms/image':>10}{'visages':>9}{'gain':>7}")
+    print(f"{'sans tuiles':<14}{base_ms:>10.1f}{base_faces:>9}{1.0:>7.2f}")
+    for workers in args.workers:
+        detector = FaceDetector(detector_type=args.detector, tile_size=args.tile_size,
+                                tile_overlap=args.tile_overlap, tile_workers=workers)
+        ms, faces = measure(detector, grays, args.repeat)
+        detector.close()
+        print(f"{f'tuiles x{workers}':<14}{ms:>10.1f}{faces:>9}{base_ms / ms:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
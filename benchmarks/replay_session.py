@@ -0,0 +1,152 @@
+"""
+Rejeu sans interface d'une session enregistrée (login_interface.py --record session.npz) :
+les images et les touches passent par la même boucle que l'application (CameraWorker +
+LoginSession / RegisterSession : détection, suivi, encodage, reconnaissance), ce qui
+permet de comparer deux versions du code sur exactement la même entrée.
+
+    python benchmarks/replay_session.py session.npz                  # pleine vitesse
+    python benchmarks/replay_session.py session.npz --realtime       # horloge d'origine
+    python benchmarks/replay_session.py session.npz --output after.json
+
+Mesures : FPS de bout en bout, temps de traitement par image, latence entre une touche
+et la décision qui suit (accès accordé / refusé, inscription), et en temps réel le nombre
+d'images sautées parce que la boucle avait pris du retard.
+Attention : le rejeu d'une inscription crée réellement l'utilisateur dans la base configurée.
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(root))
+sys.path.insert(0, str(root / "interfaces"))
+
+from camera_worker import CameraWorker
+from core.frame_source import ReplaySource
+
+DECISIONS = ("granted", "denied", "enrolled", "error")
+
+
+class ReplayWorker(CameraWorker):
+    """CameraWorker qui horodate les décisions postées par la session."""
+
+    def __init__(self, session, source):
+        super().__init__(session, display_width=None, source=source)
+        self.decisions = []
+
+    def post(self, kind, payload=None):
+        if kind in DECISIONS:
+            self.decisions.append((time.perf_counter(), kind, payload))
+        super().post(kind, payload)
+
+
+class TimedSession:
+    """Chronomètre process() de la session enveloppée."""
+
+    def __init__(self, session):
+        self.session = session
+        self.frame_times = []
+        self.started = None
+
+    def open(self, worker):
+        self.session.open(worker)
+
+    def close(self):
+        self.session.close()
+
+    def process(self, worker, frame, command):
+        t0 = time.perf_counter()
+        if self.started is None:
+            self.started = t0
+        display = self.session.process(worker, frame, command)
+        self.frame_times.append(time.perf_counter() - t0)
+        return display
+
+
+def make_session(interface, username=None):
+    if interface == "register":
+        from registre_interface import RegisterSession
+        return RegisterSession(username or "replay")
+    from login_interface import LoginSession
+    return LoginSession()
+
+
+def replay(path, session, realtime=False):
+    """Rejoue `path` dans `session` (dans le thread courant) et retourne le rapport."""
+    source = ReplaySource(path, realtime=realtime)
+    timed = TimedSession(session)
+    worker = ReplayWorker(timed, source)
+    worker.run()
+    ended = time.perf_counter()
+
+    frame_ms = np.array(timed.frame_times) * 1000
+    wall = ended - timed.started if timed.started is not None else 0.0
+
+    # Latence : décision ↔ dernière touche rejouée avant elle
+    command_times = np.array(source.command_times)
+    decisions = []
+    for t, kind, payload in worker.decisions:
+        before = command_times[command_times <= t]
+        latency = round(float(t - before[-1]) * 1000, 2) if len(before) else None
+        decisions.append({"kind": kind, "payload": payload, "latency_ms": latency})
+    latencies = [d["latency_ms"] for d in decisions if d["latency_ms"] is not None]
+
+    return {
+        "recording": str(path),
+        "mode": "realtime" if realtime else "full_speed",
+        "frames_recorded": source.n_frames,
+        "recorded_duration_s": round(float(source.timestamps[-1]), 3) if source.n_frames else 0.0,
+        "frames_processed": len(frame_ms),
+        "frames_dropped": source.dropped,
+        "wall_s": round(wall, 3),
+        "fps": round(len(frame_ms) / wall, 2) if wall > 0 else None,
+        "frame_ms_mean": round(float(frame_ms.mean()), 2) if len(frame_ms) else None,
+        "frame_ms_p95": round(float(np.percentile(frame_ms, 95)), 2) if len(frame_ms) else None,
+        "key_to_decision_ms": round(float(np.mean(latencies)), 2) if latencies else None,
+        "decisions": decisions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejeu sans interface d'une session enregistrée")
+    parser.add_argument("recording", help="Fichier .npz produit avec --record")
+    parser.add_argument("--interface", choices=("login", "register"), default="login")
+    parser.add_argument("--username", help="Nom utilisé pour le rejeu d'une inscription")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Respecte l'horloge de l'enregistrement (images sautées si la boucle est en retard)")
+    parser.add_argument("--output", help="Rapport JSON (pour comparer deux versions)")
+    args = parser.parse_args()
+
+    session = make_session(args.interface, args.username)
+    report = replay(args.recording, session, realtime=args.realtime)
+
+    print(f"{report['frames_processed']}/{report['frames_recorded']} images ({report['mode']}), "
+          f"{report['frames_dropped']} sautée(s)")
+    print(f"FPS : {report['fps']}  |  image : {report['frame_ms_mean']} ms (p95 {report['frame_ms_p95']} ms)")
+    for d in report["decisions"]:
+        print(f"  {d['kind']:<9} {d['payload']!s:<30} touche → décision : {d['latency_ms']} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"✅ Rapport : {args.output}")
+
+    # Écritures différées (tentatives inconnues, inscription) appliquées avant de quitter,
+    # pool de détection tuilée arrêté
+    module = sys.modules.get("login_interface" if args.interface == "login" else "registre_interface")
+    compactor = getattr(module, "compactor", None)
+    if compactor is not None:
+        compactor.close()
+    detector = getattr(module, "detector", None)
+    if detector is not None:
+        detector.close()
+    backend = getattr(module, "db", None) or getattr(module, "db_manager", None)
+    if backend is not None:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Calibration du seuil de reconnaissance sur la population enregistrée.
+
+Toutes les paires d'embeddings de la galerie sont comparées (paires "genuine" =
+même utilisateur, "impostor" = utilisateurs différents) par tuiles de taille bornée,
+réparties sur plusieurs processus. Les distances ne sont jamais stockées : chaque
+tuile alimente directement des histogrammes, d'où une mémoire fixe quel que soit N.
+
+    python core/calibration.py --memory-mb 512 --workers 8 --target-far 0.001 --plot calibration.png
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database.storage import get_database
+
+
+METRICS = ("cosine", "euclidean")
+DEFAULT_CALIBRATION_PATH = Path(__file__).resolve().parents[1] / "calibration.json"
+
+# Histogrammes : distances dans [0, MAX_DISTANCE), au-delà regroupées dans le dernier bin
+N_BINS = 4000
+MAX_DISTANCE = 2.0
+
+# Octets par paire dans une tuile : distances float32, codes int32, étiquettes int32, temporaires
+BYTES_PER_PAIR = 20
+
+# Données partagées par les processus de calcul (initialisées une seule fois)
+_raw = None
+_unit = None
+_sq_norms = None
+_labels = None
+
+
+def _init_worker(raw, labels):
+    global _raw, _unit, _sq_norms, _labels
+    _raw = raw
+    norms = np.linalg.norm(raw, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    _unit = raw / norms
+    _sq_norms = np.einsum("ij,ij->i", raw, raw)
+    _labels = labels
+
+
+def _bin(dist):
+    idx = (dist * (N_BINS / MAX_DISTANCE)).astype(np.int32)
+    np.clip(idx, 0, N_BINS - 1, out=idx)
+    return idx
+
+
+def _tile_histograms(i0, i1, j0, j1):
+    """Histogrammes genuine / impostor des paires (i, j) de la tuile, avec i < j."""
+    # Code par paire : bin (impostor), N_BINS + bin (genuine), 2 * N_BINS (paire ignorée)
+    # → un seul bincount par métrique, sans extraction par masque
+    same = (_labels[i0:i1, None] == _labels[None, j0:j1]).astype(np.int32) * N_BINS
+    if i0 == j0:
+        # Tuile diagonale : triangle supérieur strict uniquement
+        same[np.tril_indices(i1 - i0)] = 2 * N_BINS
+
+    result = {}
+    for metric in METRICS:
+        if metric == "cosine":
+            dist = 1.0 - _unit[i0:i1] @ _unit[j0:j1].T
+        else:
+            dist = _sq_norms[i0:i1, None] + _sq_norms[None, j0:j1] - 2.0 * (_raw[i0:i1] @ _raw[j0:j1].T)
+            np.sqrt(np.maximum(dist, 0.0, out=dist), out=dist)
+        codes = _bin(dist)
+        codes += same
+        if i0 == j0:
+            np.minimum(codes, 2 * N_BINS, out=codes)
+        counts = np.bincount(codes.ravel(), minlength=2 * N_BINS + 1)
+        result[metric] = (counts[N_BINS:2 * N_BINS], counts[:N_BINS])
+    return result
+
+
+def tile_size_for(memory_mb, workers):
+    """Côté de tuile tel que workers tuiles simultanées tiennent dans memory_mb."""
+    budget = memory_mb * 1024 * 1024 / max(workers, 1)
+    return max(64, int(math.sqrt(budget / BYTES_PER_PAIR)))
+
+
+def pair_histograms(embeddings, labels, memory_mb=512, workers=None):
+    """Histogrammes genuine / impostor de toutes les paires, par métrique."""
+    raw = np.ascontiguousarray(embeddings, dtype=np.float32)
+    labels = np.asarray(labels)
+    n = len(raw)
+    workers = workers or os.cpu_count() or 1
+    tile = tile_size_for(memory_mb, workers)
+    starts = list(range(0, n, tile))
+    tasks = [(i, min(i + tile, n), j, min(j + tile, n)) for a, i in enumerate(starts) for j in starts[a:]]
+
+    totals = {m: (np.zeros(N_BINS, dtype=np.int64), np.zeros(N_BINS, dtype=np.int64)) for m in METRICS}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(raw, labels)) as pool:
+        for result in pool.map(_tile_histograms, *zip(*tasks), chunksize=max(1, len(tasks) // (workers * 8))):
+            for metric, (genuine, impostor) in result.items():
+                totals[metric][0][:] += genuine
+                totals[metric][1][:] += impostor
+    return totals, tile, len(tasks)
+
+
+def roc_from_histograms(genuine, impostor, target_far=1e-3):
+    """
+    Courbes ROC / DET depuis les histogrammes. Une paire est acceptée si distance < seuil.
+    Retourne EER, seuil à l'EER, seuil recommandé (FAR <= target_far) et les courbes.
+    """
+    thresholds = np.arange(1, N_BINS + 1) * (MAX_DISTANCE / N_BINS)
+    n_gen = max(int(genuine.sum()), 1)
+    n_imp = max(int(impostor.sum()), 1)
+    far = np.cumsum(impostor) / n_imp
+    frr = 1.0 - np.cumsum(genuine) / n_gen
+
+    eer_idx = int(np.argmin(np.abs(far - frr)))
+    eer = float((far[eer_idx] + frr[eer_idx]) / 2.0)
+
+    allowed = np.nonzero(far <= target_far)[0]
+    rec_idx = int(allowed[-1]) if len(allowed) else 0
+
+    # Courbes sous-échantillonnées (≈ 200 points) pour le rapport JSON
+    step = max(1, N_BINS // 200)
+    return {
+        "eer": round(eer, 5),
+        "eer_threshold": round(float(thresholds[eer_idx]), 4),
+        "recommended_threshold": round(float(thresholds[rec_idx]), 4),
+        "target_far": target_far,
+        "far_at_recommended": float(far[rec_idx]),
+        "tar_at_recommended": float(1.0 - frr[rec_idx]),
+        "genuine_pairs": int(genuine.sum()),
+        "impostor_pairs": int(impostor.sum()),
+        "curve": {
+            "threshold": thresholds[::step].round(4).tolist(),
+            "far": far[::step].tolist(),
+            "frr": frr[::step].tolist(),
+        },
+    }
+
+
+def plot_curves(report, output_path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, (ax_roc, ax_det) = plt.subplots(1, 2, figsize=(12, 5))
+    for metric, res in report["metrics"].items():
+        far = np.array(res["curve"]["far"])
+        frr = np.array(res["curve"]["frr"])
+        ax_roc.plot(far, 1.0 - frr, label=f"{metric} (EER={res['eer']:.3%})")
+        ax_det.plot(np.maximum(far, 1e-7), np.maximum(frr, 1e-7), label=metric)
+    ax_roc.set_xscale("log")
+    ax_roc.set_xlabel("FAR")
+    ax_roc.set_ylabel("TAR")
+    ax_roc.set_title("ROC")
+    ax_det.set_xscale("log")
+    ax_det.set_yscale("log")
+    ax_det.set_xlabel("FAR")
+    ax_det.set_ylabel("FRR")
+    ax_det.set_title("DET")
+    for ax in (ax_roc, ax_det):
+        ax.grid(True, which="both", alpha=0.3)
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=120)
+    plt.close(fig)
+
+
+def recommended_threshold(metric, path=DEFAULT_CALIBRATION_PATH, default=0.45):
+    """Seuil recommandé pour une métrique d'après le dernier rapport de calibration."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return float(json.load(f)["metrics"][metric]["recommended_threshold"])
+    except Exception:
+        return default
+
+
+def calibrate(memory_mb=512, workers=None, target_far=1e-3):
+    gallery, _ = get_database().get_gallery()
+    if gallery is None or len(gallery) < 2:
+        raise ValueError("Pas assez d'embeddings dans la base pour calibrer le seuil.")
+
+    t0 = time.perf_counter()
+    totals, tile, n_tiles = pair_histograms(gallery.embeddings, gallery.row_user, memory_mb=memory_mb, workers=workers)
+    elapsed = time.perf_counter() - t0
+
+    report = {
+        "embeddings": len(gallery),
+        "users": gallery.n_users,
+        "tile": tile,
+        "tiles": n_tiles,
+        "seconds": round(elapsed, 2),
+        "metrics": {m: roc_from_histograms(g, i, target_far) for m, (g, i) in totals.items()},
+    }
+    if report["metrics"]["cosine"]["genuine_pairs"] == 0:
+        print("⚠️ Aucun utilisateur n'a plusieurs embeddings : pas de paires genuine, FRR/EER non significatifs.")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibration du seuil de reconnaissance (ROC / DET / EER)")
+    parser.add_argument("--memory-mb", type=int, default=512, help="Mémoire max pour les tuiles de distances")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : nb de cœurs)")
+    parser.add_argument("--target-far", type=float, default=1e-3, help="Taux de fausse acceptation visé")
+    parser.add_argument("--output", default=str(DEFAULT_CALIBRATION_PATH), help="Rapport JSON")
+    parser.add_argument("--plot", default=None, help="Image PNG des courbes ROC / DET")
+    args = parser.parse_args()
+
+    report = calibrate(memory_mb=args.memory_mb, workers=args.workers, target_far=args.target_far)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.plot:
+        plot_curves(report, args.plot)
+
+    print(f"{report['embeddings']} embeddings, {report['users']} utilisateurs — "
+          f"{report['tiles']} tuiles de {report['tile']} en {report['seconds']} s")
+    for metric, res in report["metrics"].items():
+        print(f"  {metric:<10} EER={res['eer']:.3%} (seuil {res['eer_threshold']}) | "
+              f"seuil recommandé (FAR≤{args.target_far:g}) = {res['recommended_threshold']} "
+              f"→ TAR={res['tar_at_recommended']:.3%}")
+    print(f"✅ Rapport : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import sys
+import cv2
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.face_tracker import FaceTracker
+from utils.preprocessing import crop_face
+
+
+class ContinuousAuthenticator:
+    """
+    Authentification mains libres : les visages suivis sont reconnus en tâche de fond
+    toutes les `recognize_every` images, les distances de chaque piste sont gardées sur
+    une fenêtre glissante et la décision est prise par vote sur cette fenêtre.
+
+    Une piste identifiée avec confiance n'est plus jamais re-reconnue ; une piste
+    refusée n'est retentée qu'à un rythme ralenti (`denied_backoff`).
+
+    Avec un FaceQualityScorer (`quality`), chaque rafale de `recognize_every` images
+    n'envoie au descripteur que la meilleure image de la piste (et rien si aucune
+    ne passe le seuil de qualité).
+    """
+
+    def __init__(self, recognizer, recognize_every=5, window=5, min_votes=3,
+                 denied_backoff=4, max_workers=1, quality=None):
+        self.recognizer = recognizer
+        self.quality = quality
+        self.recognize_every = recognize_every
+        self.window = window
+        self.min_votes = min_votes
+        self.denied_backoff = denied_backoff
+        self.tracker = FaceTracker()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="continuous-auth")
+        self.frame_index = 0
+        self.states = {}
+
+    def _new_state(self):
+        return {
+            "votes": deque(maxlen=self.window),
+            "status": "pending",
+            "user_id": None,
+            "name": None,
+            "distance": None,
+            "future": None,
+            "last_submit": -10 ** 9,
+            "crop": None,
+            "reported": None,
+            "burst_frames": 0,
+            "best": None,
+        }
+
+    def _recognize(self, frame, box, shape):
+        """
+        Exécuté dans le thread de fond : encodage + comparaison à la galerie. Les landmarks
+        de l'image (s'il y en a) sont réutilisés ; l'encodeur est protégé par son verrou.
+        """
+        shapes = [shape] if shape is not None else None
+        _, embeddings = self.recognizer.encoder.encode_faces(frame, boxes=[box], shapes=shapes)
+        if len(embeddings) == 0:
+            return None
+        return self.recognizer.match_embeddings(embeddings)[0]
+
+    def _vote(self, state):
+        """Décision sur la fenêtre : candidat majoritaire et distance moyenne."""
+        votes = [v for v in state["votes"] if v[0] is not None]
+        if not votes:
+            return
+        candidate, count = Counter(uid for uid, _ in votes).most_common(1)[0]
+        distances = [d for uid, d in votes if uid == candidate]
+        mean_distance = sum(distances) / len(distances)
+        state["distance"] = mean_distance
+
+        if count >= self.min_votes and mean_distance < self.recognizer.threshold:
+            state["status"] = "granted"
+            state["user_id"] = candidate
+            state["name"] = self.recognizer.user_name(candidate)
+        elif len(state["votes"]) >= self.window:
+            state["status"] = "denied"
+
+    def _collect(self, state):
+        future = state["future"]
+        if future is None or not future.done():
+            return
+        state["future"] = None
+        try:
+            match = future.result()
+        except Exception as e:
+            print(f"⚠️ Erreur reconnaissance en tâche de fond : {e}")
+            return
+        if match is None:
+            return
+        state["votes"].append((match["candidate_id"], match["distance"]))
+        self._vote(state)
+
+    def _interval(self, state):
+        if state["status"] == "denied":
+            return self.recognize_every * self.denied_backoff
+        return self.recognize_every
+
+    def _needs_recognition(self, state):
+        return state["status"] != "granted" and state["future"] is None
+
+    def _submit(self, state, frame, box, shape):
+        state["crop"] = crop_face(frame, box, margin_pct=0.3)
+        state["last_submit"] = self.frame_index
+        state["future"] = self.executor.submit(self._recognize, frame, box, shape)
+
+    def process(self, frame, faces, shapes=None, gray=None):
+        """
+        À appeler à chaque image avec les boîtes détectées et, si disponibles, leurs
+        landmarks (predictor de l'encodeur) et l'image en gris déjà calculée (cf.
+        FacePipeline) : ils servent à la qualité et sont passés tels quels à l'encodeur
+        au lieu d'être recalculés. L'image est gardée jusqu'à l'encodage en tâche de
+        fond : l'appelant dessine sur une copie, jamais sur `frame`.
+        Ne bloque jamais : la reconnaissance est soumise au thread de fond et ses
+        résultats relevés aux images suivantes.
+        Retourne la liste des pistes visibles : dicts {track_id, box, status, user_id, name, distance}.
+        """
+        self.frame_index += 1
+        tracks, removed = self.tracker.update(faces)
+        for tid in removed:
+            state = self.states.pop(tid, None)
+            if state is not None and state["future"] is not None:
+                state["future"].cancel()
+
+        # Le suivi conserve l'ordre des boîtes : shapes[i] est celle de tracks[i]
+        track_shapes = list(shapes) if shapes is not None and len(shapes) == len(tracks) else [None] * len(tracks)
+
+        quality = None
+        if self.quality is not None and tracks:
+            if gray is None:
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            quality = self.quality.score(gray, [box for _, box in tracks], shapes)
+
+        visible = []
+        for i, (tid, box) in enumerate(tracks):
+            state = self.states.setdefault(tid, self._new_state())
+            self._collect(state)
+
+            if self._needs_recognition(state):
+                if quality is None:
+                    if self.frame_index - state["last_submit"] >= self._interval(state):
+                        self._submit(state, frame, box, track_shapes[i])
+                else:
+                    # Rafale : on garde la meilleure image de la piste
+                    state["burst_frames"] += 1
+                    score = float(quality["score"][i])
+                    if quality["passed"][i] and (state["best"] is None or score > state["best"][0]):
+                        state["best"] = (score, frame, box, track_shapes[i])
+                    if state["burst_frames"] >= self._interval(state):
+                        if state["best"] is not None:
+                            self._submit(state, *state["best"][1:])
+                        state["best"] = None
+                        state["burst_frames"] = 0
+
+            visible.append({
+                "track_id": tid,
+                "box": box,
+                "status": state["status"],
+                "user_id": state["user_id"],
+                "name": state["name"],
+                "distance": state["distance"],
+            })
+        return visible
+
+    def pop_decisions(self):
+        """Pistes dont la décision (accès accordé / refusé) n'a pas encore été signalée."""
+        decisions = []
+        for tid, state in self.states.items():
+            if state["status"] in ("granted", "denied") and state["reported"] != state["status"]:
+                state["reported"] = state["status"]
+                decisions.append((tid, dict(state)))
+        return decisions
+
+    def reset(self):
+        for state in self.states.values():
+            if state["future"] is not None:
+                state["future"].cancel()
+        self.states = {}
+        self.tracker.reset()
+
+    def close(self):
+        self.reset()
+        self.executor.shutdown(wait=False)
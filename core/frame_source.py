@@ -0,0 +1,195 @@
+"""
+Sources d'images pour la boucle caméra (interfaces.camera_worker.CameraWorker) :
+
+- CameraSource    : webcam (cv2.VideoCapture), comportement historique ;
+- RecordingSource : enveloppe une source et enregistre la session (images JPEG,
+                    horodatages, commandes clavier) dans un fichier .npz compact ;
+- ReplaySource    : relit un enregistrement, à pleine vitesse ou en temps réel
+                    (images sautées si la boucle prend du retard, comme une caméra).
+"""
+import time
+import cv2
+import numpy as np
+
+
+class FrameSource:
+    """Interface commune ; les commandes (touches) peuvent venir de la source elle-même (rejeu)."""
+
+    finished = False
+
+    def open(self):
+        """Ouvre la source (dans le thread qui la lira). Retourne False en cas d'échec."""
+        return True
+
+    def read(self):
+        """Retourne (ok, frame)."""
+        raise NotImplementedError
+
+    def next_command(self):
+        """Commande enregistrée à rejouer pour l'image courante (None sinon)."""
+        return None
+
+    def record_command(self, command):
+        """Notifie une commande appliquée à l'image courante (utilisé par l'enregistreur)."""
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    def __init__(self, index=0):
+        self.index = index
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.index)
+        return self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class RecordingSource(FrameSource):
+    """
+    Enregistre les images lues (JPEG), leur horodatage relatif et les commandes avec
+    l'index de l'image à laquelle elles ont été appliquées. Écrit à release().
+    """
+
+    def __init__(self, source, path, jpeg_quality=90):
+        self.source = source
+        self.path = path
+        self.jpeg_quality = jpeg_quality
+        self._jpegs = []
+        self._timestamps = []
+        self._commands = []
+        self._t0 = None
+
+    def open(self):
+        return self.source.open()
+
+    @property
+    def finished(self):
+        return self.source.finished
+
+    def read(self):
+        ok, frame = self.source.read()
+        if ok:
+            now = time.perf_counter()
+            if self._t0 is None:
+                self._t0 = now
+            ok_jpeg, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if ok_jpeg:
+                self._jpegs.append(buf.tobytes())
+                self._timestamps.append(now - self._t0)
+        return ok, frame
+
+    def next_command(self):
+        return self.source.next_command()
+
+    def record_command(self, command):
+        if self._jpegs:
+            self._commands.append((len(self._jpegs) - 1, self._timestamps[-1], command))
+        self.source.record_command(command)
+
+    def release(self):
+        self.source.release()
+        if not self._jpegs:
+            return
+        sizes = np.array([len(j) for j in self._jpegs], dtype=np.int64)
+        np.savez(
+            self.path,
+            jpeg=np.frombuffer(b"".join(self._jpegs), dtype=np.uint8),
+            offsets=np.concatenate([[0], np.cumsum(sizes)]),
+            timestamps=np.array(self._timestamps, dtype=np.float64),
+            command_frames=np.array([c[0] for c in self._commands], dtype=np.int64),
+            command_times=np.array([c[1] for c in self._commands], dtype=np.float64),
+            commands=np.array([c[2] for c in self._commands], dtype=str),
+        )
+        print(f"🎞️ Session enregistrée : {len(self._jpegs)} images, {len(self._commands)} commande(s) → {self.path}")
+
+
+class ReplaySource(FrameSource):
+    """
+    Rejoue un enregistrement. realtime=False : toutes les images, aussi vite que la
+    boucle les consomme. realtime=True : horloge de l'enregistrement respectée ; les
+    images déjà dépassées quand la boucle en demande une nouvelle sont sautées et
+    comptées dans `dropped`.
+    """
+
+    def __init__(self, path, realtime=False):
+        with np.load(path, allow_pickle=False) as data:
+            self._jpeg = data["jpeg"]
+            self._offsets = data["offsets"]
+            self.timestamps = data["timestamps"]
+            self._command_frames = data["command_frames"]
+            self._command_times = data["command_times"]
+            self._commands = data["commands"].tolist()
+        self.realtime = realtime
+        self.n_frames = len(self.timestamps)
+        self.index = -1
+        self.dropped = 0
+        self.frames_read = 0
+        self._next_command = 0
+        self._pending_commands = []
+        # Instant (perf_counter) de chaque touche rejouée : en temps réel, celui où elle a
+        # été pressée sur l'horloge du rejeu, même si son image a été sautée
+        self.command_times = []
+        self._t0 = None
+
+    @property
+    def finished(self):
+        return self.index >= self.n_frames - 1
+
+    def _decode(self, i):
+        buf = self._jpeg[self._offsets[i]:self._offsets[i + 1]]
+        return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+    def read(self):
+        if self.finished:
+            return False, None
+        target = self.index + 1
+        if self.realtime:
+            now = time.perf_counter()
+            if self._t0 is None:
+                self._t0 = now - self.timestamps[0]
+            elapsed = now - self._t0
+            # Dernière image déjà "émise" par la caméra à cet instant
+            latest = int(np.searchsorted(self.timestamps, elapsed, side="right")) - 1
+            if latest > target:
+                self.dropped += latest - target
+                target = latest
+            elif self.timestamps[target] > elapsed:
+                time.sleep(self.timestamps[target] - elapsed)
+        self.index = target
+        self.frames_read += 1
+
+        # Commandes des images atteintes (y compris sautées), rejouées une par image lue
+        while (self._next_command < len(self._command_frames)
+               and self._command_frames[self._next_command] <= self.index):
+            self._pending_commands.append(self._next_command)
+            self._next_command += 1
+        return True, self._decode(self.index)
+
+    def next_command(self):
+        if not self._pending_commands:
+            return None
+        i = self._pending_commands.pop(0)
+        if self.realtime:
+            self.command_times.append(self._t0 + self._command_times[i])
+        else:
+            self.command_times.append(time.perf_counter())
+        return self._commands[i]
+
+
+def open_source(camera_index=0, record=None, replay=None, realtime=True):
+    """Source des interfaces : webcam, éventuellement enregistrée (`record`), ou rejeu (`replay`)."""
+    if replay:
+        return ReplaySource(replay, realtime=realtime)
+    source = CameraSource(camera_index)
+    if record:
+        source = RecordingSource(source, record)
+    return source
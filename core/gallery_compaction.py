@@ -0,0 +1,338 @@
+"""
+Compactage de la galerie : chaque utilisateur est ramené à au plus K embeddings
+représentatifs, les autres sont archivés (face_embeddings_archive) et ne sont plus
+chargés pour la reconnaissance. Les réinscriptions successives ne font donc plus
+grossir la mémoire ni le coût de chaque recherche.
+
+Sélection des représentants parmi les échantillons d'un utilisateur :
+- "farthest" : point le plus central, puis itérativement le plus éloigné des choisis
+  (couvre les variations : lunettes, éclairage, angle) ;
+- "medoids"  : k-medoids initialisé par "farthest" (représentants au centre de chaque mode).
+
+Le rapport compare la précision avant / après (chaque échantillon des utilisateurs
+compactés, archivé ou non, est identifié contre la galerie sans lui-même).
+
+    python core/gallery_compaction.py --k 5 --method medoids            # rapport seul
+    python core/gallery_compaction.py --k 5 --method medoids --apply    # archive
+"""
+import os
+import sys
+import json
+import queue
+import argparse
+import threading
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database.storage import get_database
+from database.gallery import Gallery
+from core.calibration import recommended_threshold
+
+
+METHODS = ("medoids", "farthest")
+DEFAULT_K = 5
+
+
+def _pairwise(embeddings):
+    sq = np.einsum("ij,ij->i", embeddings, embeddings)
+    d2 = sq[:, None] + sq[None, :] - 2.0 * (embeddings @ embeddings.T)
+    return np.sqrt(np.maximum(d2, 0.0))
+
+
+def farthest_point(embeddings, k, dists=None):
+    """Indices de k échantillons : le plus central, puis le plus éloigné de ceux déjà choisis."""
+    n = len(embeddings)
+    if n <= k:
+        return np.arange(n)
+    dists = _pairwise(embeddings) if dists is None else dists
+    chosen = [int(np.argmin(dists.sum(axis=1)))]
+    nearest = dists[chosen[0]].copy()
+    while len(chosen) < k:
+        i = int(np.argmax(nearest))
+        chosen.append(i)
+        nearest = np.minimum(nearest, dists[i])
+    return np.array(chosen)
+
+
+def k_medoids(embeddings, k, max_iter=20):
+    """k-medoids (alternance affectation / médoïde de chaque groupe), initialisé par farthest_point."""
+    n = len(embeddings)
+    if n <= k:
+        return np.arange(n)
+    dists = _pairwise(embeddings)
+    medoids = farthest_point(embeddings, k, dists)
+    for _ in range(max_iter):
+        labels = np.argmin(dists[:, medoids], axis=1)
+        updated = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            if len(members):
+                updated[c] = members[np.argmin(dists[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(np.sort(updated), np.sort(medoids)):
+            break
+        medoids = updated
+    return medoids
+
+
+def select_representatives(embeddings, k, method="medoids"):
+    if method == "farthest":
+        return farthest_point(embeddings, k)
+    if method == "medoids":
+        return k_medoids(embeddings, k)
+    raise ValueError(f"method doit être l'un de {METHODS} (reçu : {method!r})")
+
+
+def plan_compaction(gallery, k=DEFAULT_K, method="medoids", user_ids=None):
+    """
+    Lignes à archiver pour que chaque utilisateur (tous, ou `user_ids`) garde au plus
+    k échantillons. Retourne (ids des lignes archivées, index des utilisateurs compactés).
+    """
+    counts = np.bincount(gallery.row_user, minlength=gallery.n_users)
+    if user_ids is None:
+        candidates = np.flatnonzero(counts > k)
+    else:
+        candidates = [gallery.user_index(uid) for uid in user_ids]
+        candidates = [u for u in candidates if u is not None and counts[u] > k]
+
+    archived = []
+    for u in candidates:
+        rows = np.flatnonzero(gallery.row_user == u)
+        keep = select_representatives(np.asarray(gallery.embeddings[rows], dtype=np.float32), k, method)
+        drop = np.setdiff1d(np.arange(len(rows)), keep)
+        archived.extend(gallery.row_ids[rows[drop]].tolist())
+    return archived, np.asarray(candidates, dtype=np.int32)
+
+
+def _nearest(matrix, queries, self_index=None, excluded=None, max_elements=1 << 25):
+    """
+    Ligne de `matrix` la plus proche de chaque requête et sa distance (inf si aucune).
+    self_index : ligne propre à chaque requête (-1 : aucune), jamais retenue ;
+    excluded   : masque (M,) des lignes ignorées pour toutes les requêtes.
+    """
+    best = np.zeros(len(queries), dtype=np.int64)
+    dist = np.full(len(queries), np.inf)
+    if len(matrix) == 0 or len(queries) == 0:
+        return best, dist
+    sq = np.einsum("ij,ij->i", matrix, matrix)
+
+    # Blocs de requêtes bornés en mémoire (max_elements distances à la fois)
+    chunk = max(1, max_elements // len(matrix))
+    for start in range(0, len(queries), chunk):
+        q = queries[start:start + chunk]
+        d2 = np.einsum("ij,ij->i", q, q)[:, None] + sq[None, :] - 2.0 * (q @ matrix.T)
+        if excluded is not None:
+            d2[:, excluded] = np.inf
+        if self_index is not None:
+            own = self_index[start:start + chunk]
+            present = np.flatnonzero(own >= 0)
+            d2[present, own[present]] = np.inf
+        rows = np.argmin(d2, axis=1)
+        best[start:start + len(q)] = rows
+        dist[start:start + len(q)] = np.sqrt(np.maximum(d2[np.arange(len(q)), rows], 0.0))
+    return best, dist
+
+
+def identification_accuracy(gallery, query_rows, threshold, others=None, max_elements=1 << 25):
+    """
+    Part des requêtes dont l'échantillon le plus proche dans `gallery` appartient au bon
+    utilisateur, à une distance < threshold. `query_rows` : (embeddings, uuid de
+    l'utilisateur, id de ligne) ; une requête n'est jamais comparée à sa propre ligne.
+    others : (uuid, distance) du plus proche échantillon hors de `gallery` pour chaque
+    requête (autres utilisateurs, cf. evaluate), en concurrence avec ceux de `gallery`.
+    """
+    queries, owners, row_ids = query_rows
+    if len(queries) == 0:
+        return None
+    matrix = np.asarray(gallery.embeddings, dtype=np.float32)
+    if len(matrix) == 0 and others is None:
+        return 0.0
+    position = {rid: i for i, rid in enumerate(gallery.row_ids.tolist())}
+    self_index = np.array([position.get(rid, -1) for rid in row_ids.tolist()], dtype=np.int64)
+    best, dist = _nearest(matrix, queries, self_index, max_elements=max_elements)
+    users = gallery.user_ids[gallery.row_user[best]] if len(matrix) else np.full(len(queries), "", dtype=object)
+    if others is not None:
+        other_users, other_dist = others
+        closer = other_dist < dist
+        users = np.where(closer, other_users, users)
+        dist = np.where(closer, other_dist, dist)
+    return float(np.sum((users == owners) & (dist < threshold))) / len(queries)
+
+
+def evaluate(before, after, user_indices, threshold, reference=None):
+    """
+    Précision d'identification avant / après sur tous les échantillons des utilisateurs
+    compactés. reference : galerie des autres utilisateurs déjà en mémoire (ex. snapshot
+    du reconnaisseur), lorsque `before` ne contient que les utilisateurs compactés ; ses
+    lignes de ces utilisateurs (éventuellement périmées) sont ignorées.
+    """
+    mask = np.isin(before.row_user, user_indices)
+    query_rows = (
+        np.asarray(before.embeddings[mask], dtype=np.float32),
+        before.user_ids[before.row_user[mask]],
+        before.row_ids[mask],
+    )
+    others = None
+    if reference is not None and len(reference):
+        compacted_users = before.user_ids[np.asarray(user_indices, dtype=np.int64)]
+        excluded = np.isin(reference.user_ids, compacted_users)[reference.row_user]
+        rows, dist = _nearest(np.asarray(reference.embeddings, dtype=np.float32), query_rows[0], excluded=excluded)
+        others = (reference.user_ids[reference.row_user[rows]], dist)
+    return (
+        identification_accuracy(before, query_rows, threshold, others),
+        identification_accuracy(after, query_rows, threshold, others),
+    )
+
+
+def compact(gallery, k=DEFAULT_K, method="medoids", user_ids=None, threshold=None, reference=None):
+    """
+    Compactage en mémoire : retourne (galerie compactée, ids archivés, rapport).
+    La galerie d'origine n'est pas modifiée. reference : cf. evaluate.
+    """
+    threshold = recommended_threshold("euclidean") if threshold is None else threshold
+    archived, users = plan_compaction(gallery, k, method, user_ids)
+    compacted = gallery.updated(remove_row_ids=archived) if archived else gallery
+    before_acc, after_acc = evaluate(gallery, compacted, users, threshold, reference) if archived else (None, None)
+    report = {
+        "k": k,
+        "method": method,
+        "users_compacted": int(len(users)),
+        "rows_before": len(gallery),
+        "rows_after": len(compacted),
+        "archived": len(archived),
+        "bytes_before": int(gallery.nbytes),
+        "bytes_after": int(compacted.nbytes),
+        "shrinkage": round(1.0 - len(compacted) / len(gallery), 4) if len(gallery) else 0.0,
+        "threshold": threshold,
+        "reference_rows": None if reference is None else len(reference),
+        "accuracy_before": None if before_acc is None else round(before_acc, 4),
+        "accuracy_after": None if after_acc is None else round(after_acc, 4),
+        "accuracy_delta": None if before_acc is None else round(after_acc - before_acc, 4),
+    }
+    return compacted, archived, report
+
+
+class GalleryCompactor:
+    """
+    Compactage incrémental après les inscriptions : schedule(user_id) met l'utilisateur
+    en file, un thread de fond attend que ses embeddings soient écrits (db.flush() si le
+    backend est une WriteBehindQueue), puis ne lit et ne compacte que lui s'il dépasse
+    k lignes. Si des écritures sont encore en attente après `flush_timeout` secondes,
+    l'utilisateur est remis en file (au plus `max_retries` fois).
+
+    recognizer : FaceRecognizer dont la galerie en mémoire sert de référence (autres
+    utilisateurs) pour la mesure de précision, sans retélécharger la galerie.
+    """
+
+    def __init__(self, db=None, k=None, method="medoids", threshold=None, flush_timeout=30.0, max_retries=3,
+                 recognizer=None):
+        self.db = db if db is not None else get_database()
+        self.recognizer = recognizer
+        self.k = k or int(os.getenv("GALLERY_MAX_PER_USER") or DEFAULT_K)
+        self.method = method
+        self.threshold = threshold
+        self.flush_timeout = flush_timeout
+        self.max_retries = max_retries
+        self.reports = []
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def run(self, user_ids=None, apply=True):
+        """
+        Compacte tous les utilisateurs (galerie complète) ou seulement `user_ids` (leurs
+        lignes uniquement) ; archive si apply. Les écritures différées doivent déjà être
+        appliquées (cf. schedule). Retourne le rapport, ou None si la lecture échoue.
+        """
+        reference = None
+        if user_ids is None:
+            gallery, _ = self.db.get_gallery()
+            if gallery is None:
+                return None
+        else:
+            rows = self.db.get_embeddings_by_users(user_ids)
+            if rows is None:
+                return None
+            gallery = Gallery.from_rows(rows)
+            if self.recognizer is not None:
+                reference = self.recognizer.gallery
+        _, archived, report = compact(gallery, self.k, self.method, user_ids, self.threshold, reference)
+        if archived and apply:
+            if not self.db.archive_embeddings(archived):
+                print("❌ Compactage : archivage impossible")
+                return None
+            print(f"🗜️ Compactage : {report['archived']} embedding(s) archivé(s), "
+                  f"{report['rows_before']} → {report['rows_after']} lignes "
+                  f"(précision {report['accuracy_before']} → {report['accuracy_after']})")
+        self.reports.append(report)
+        return report
+
+    def _writes_applied(self):
+        """True si les écritures différées du backend sont appliquées (ou s'il n'en a pas)."""
+        flush = getattr(self.db, "flush", None)
+        if flush is None or flush(timeout=self.flush_timeout):
+            return True
+        print(f"⏳ Compactage : {self.db.pending()} écriture(s) encore en attente "
+              f"après {self.flush_timeout:.0f} s")
+        return False
+
+    def schedule(self, user_id):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="gallery-compaction", daemon=True)
+            self._thread.start()
+        self._queue.put((user_id, 0))
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                # Reports remis en file après la demande d'arrêt
+                skipped = [self._queue.get_nowait()[0] for _ in range(self._queue.qsize())]
+                if skipped:
+                    print(f"⚠️ Compactage non effectué (arrêt) : {', '.join(map(str, skipped))}")
+                return
+            user_id, retries = item
+            try:
+                if self._writes_applied():
+                    self.run(user_ids=[user_id])
+                elif retries < self.max_retries:
+                    print(f"🔁 Compactage de {user_id} reporté ({retries + 1}/{self.max_retries})")
+                    self._queue.put((user_id, retries + 1))
+                else:
+                    print(f"❌ Compactage de {user_id} abandonné : écritures toujours en attente")
+            except Exception as e:
+                print(f"❌ Erreur compactage ({user_id}) : {e}")
+
+    def close(self, timeout=30.0):
+        """Termine les compactages en file (avant la fermeture du backend)."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compactage de la galerie (K représentants par utilisateur)")
+    parser.add_argument("--k", type=int, default=None,
+                        help=f"Embeddings conservés par utilisateur (défaut : GALLERY_MAX_PER_USER ou {DEFAULT_K})")
+    parser.add_argument("--method", choices=METHODS, default="medoids")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Seuil euclidien pour la mesure de précision (défaut : calibration)")
+    parser.add_argument("--apply", action="store_true", help="Archive réellement les lignes (sinon simulation)")
+    parser.add_argument("--output", default=None, help="Rapport JSON")
+    args = parser.parse_args()
+
+    compactor = GalleryCompactor(k=args.k, method=args.method, threshold=args.threshold)
+    report = compactor.run(apply=args.apply)
+    if report is None:
+        raise SystemExit("Galerie indisponible ou écritures encore en attente.")
+    print(json.dumps(report, indent=2))
+    if not args.apply and report["archived"]:
+        print("ℹ️ Simulation : relancer avec --apply pour archiver.")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
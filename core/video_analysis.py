@@ -0,0 +1,236 @@
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.face_recognizer import FaceRecognizer
+from database.gallery import Gallery
+from database.storage import get_database
+from core.calibration import recommended_threshold
+
+
+# Reconnaisseur propre à chaque processus du pool (initialisé une seule fois)
+_worker_recognizer = None
+
+
+def _init_worker(gallery, threshold, metric):
+    global _worker_recognizer
+    cv2.setNumThreads(1)
+    _worker_recognizer = FaceRecognizer(threshold=threshold, metric=metric)
+    _worker_recognizer.load_gallery(gallery)
+
+
+def _thumbnail(frame):
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def _process_chunk(video_path, start, end, fps, motion_threshold, max_skip):
+    """
+    Traite les images [start, end) d'une vidéo.
+    Saut adaptatif : tant que l'image ne change pas (différence moyenne des miniatures
+    < motion_threshold), le pas double jusqu'à max_skip ; les images sautées sont
+    seulement "grab" (pas de décodage). Le pas revient à 1 dès qu'un changement est vu.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        return {"video": str(video_path), "start": start, "observations": [], "read": 0, "processed": 0}
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    observations = []
+    frames_read = 0
+    frames_processed = 0
+    previous_thumb = None
+    previous_count = -1
+    skip = 0
+    idx = start
+
+    while idx < end:
+        # Images sautées : grab sans decode
+        grabbed = True
+        for _ in range(skip):
+            if idx >= end - 1:
+                break
+            grabbed = cap.grab()
+            if not grabbed:
+                break
+            idx += 1
+            frames_read += 1
+        if not grabbed:
+            break
+
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames_read += 1
+
+        thumb = _thumbnail(frame)
+        changed = previous_thumb is None or float(np.mean(np.abs(thumb - previous_thumb))) >= motion_threshold
+
+        matches = _worker_recognizer.recognize_frame(frame)
+        frames_processed += 1
+
+        if changed or len(matches) != previous_count:
+            skip = 0
+        else:
+            skip = min(max(1, skip * 2), max_skip)
+        previous_thumb = thumb
+        previous_count = len(matches)
+
+        observations.append({
+            "frame": idx,
+            "time": idx / fps if fps else 0.0,
+            "faces": [(m["user_id"], m["name"], m["distance"]) for m in matches],
+        })
+        idx += 1
+
+    cap.release()
+    return {
+        "video": str(video_path),
+        "start": start,
+        "observations": observations,
+        "read": frames_read,
+        "processed": frames_processed,
+    }
+
+
+def _video_chunks(video_path, chunk_frames):
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        print(f"❌ Impossible d'ouvrir la vidéo : {video_path}")
+        return []
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+    return [(video_path, s, min(s + chunk_frames, total), fps) for s in range(0, total, chunk_frames)]
+
+
+def build_timeline(chunk_results, max_gap=2.0):
+    """
+    Fusionne les observations en segments (vidéo, identité) : deux apparitions séparées
+    de moins de max_gap secondes appartiennent au même segment.
+    """
+    segments = []
+    by_video = {}
+    for result in chunk_results:
+        by_video.setdefault(result["video"], []).extend(result["observations"])
+
+    for video, observations in by_video.items():
+        observations.sort(key=lambda o: o["frame"])
+        open_segments = {}
+        for obs in observations:
+            for user_id, name, distance in obs["faces"]:
+                key = user_id or "inconnu"
+                seg = open_segments.get(key)
+                if seg is not None and obs["time"] - seg["end"] <= max_gap:
+                    seg["end"] = obs["time"]
+                    seg["detections"] += 1
+                    seg["best_distance"] = min(seg["best_distance"], distance)
+                    continue
+                if seg is not None:
+                    segments.append(seg)
+                open_segments[key] = {
+                    "video": video,
+                    "user_id": user_id,
+                    "name": name or "inconnu",
+                    "start": obs["time"],
+                    "end": obs["time"],
+                    "detections": 1,
+                    "best_distance": distance,
+                }
+        segments.extend(open_segments.values())
+
+    segments.sort(key=lambda s: (s["video"], s["start"]))
+    for seg in segments:
+        seg["start"] = round(seg["start"], 2)
+        seg["end"] = round(seg["end"], 2)
+        seg["best_distance"] = round(float(seg["best_distance"]), 4)
+    return segments
+
+
+def analyze_videos(video_paths, workers=None, chunk_frames=300, motion_threshold=4.0, max_skip=8,
+                   threshold=None, metric="cosine", max_gap=2.0):
+    """
+    Analyse hors-ligne d'une ou plusieurs vidéos. Retourne (segments, stats).
+    threshold : défaut = seuil calibré de `metric` (core.calibration), comme le login.
+    """
+    if threshold is None:
+        threshold = recommended_threshold(metric)
+    gallery, _ = get_database().get_gallery()
+    if gallery is None:
+        gallery = Gallery.empty()
+    if len(gallery) == 0:
+        print("⚠️ Aucun embedding enregistré dans la base : tous les visages seront inconnus.")
+
+    tasks = []
+    for path in video_paths:
+        tasks.extend(_video_chunks(path, chunk_frames))
+
+    t0 = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(gallery, threshold, metric)
+    ) as pool:
+        futures = [pool.submit(_process_chunk, p, s, e, fps, motion_threshold, max_skip) for p, s, e, fps in tasks]
+        for future in as_completed(futures):
+            results.append(future.result())
+    elapsed = time.perf_counter() - t0
+
+    frames_read = sum(r["read"] for r in results)
+    frames_processed = sum(r["processed"] for r in results)
+    stats = {
+        "videos": len(video_paths),
+        "chunks": len(tasks),
+        "frames": frames_read,
+        "frames_processed": frames_processed,
+        "seconds": round(elapsed, 2),
+        "fps": round(frames_read / elapsed, 1) if elapsed > 0 else 0.0,
+        "processed_fps": round(frames_processed / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    return build_timeline(results, max_gap=max_gap), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconnaissance faciale hors-ligne sur fichiers vidéo")
+    parser.add_argument("videos", nargs="+", help="Fichiers vidéo à analyser")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : nb de cœurs)")
+    parser.add_argument("--chunk-frames", type=int, default=300, help="Images par tâche")
+    parser.add_argument("--motion-threshold", type=float, default=4.0,
+                        help="Différence moyenne (niveaux de gris) en dessous de laquelle l'image est jugée inchangée")
+    parser.add_argument("--max-skip", type=int, default=8,
+                        help="Nombre max d'images sautées d'affilée (précision temporelle ≈ max_skip / fps)")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Seuil de distance (défaut : seuil calibré de la métrique, sinon 0.45)")
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "euclidean"])
+    parser.add_argument("--max-gap", type=float, default=2.0, help="Écart max (s) pour fusionner deux apparitions")
+    parser.add_argument("--output", default="timeline.json", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    segments, stats = analyze_videos(
+        args.videos,
+        workers=args.workers,
+        chunk_frames=args.chunk_frames,
+        motion_threshold=args.motion_threshold,
+        max_skip=args.max_skip,
+        threshold=args.threshold,
+        metric=args.metric,
+        max_gap=args.max_gap,
+    )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"segments": segments, "stats": stats}, f, ensure_ascii=False, indent=2)
+
+    for seg in segments:
+        print(f"{Path(seg['video']).name} [{seg['start']:>8.2f}s → {seg['end']:>8.2f}s] {seg['name']}")
+    print(f"✅ {stats['frames']} images ({stats['frames_processed']} analysées) en {stats['seconds']} s "
+          f"→ {stats['fps']} img/s — timeline : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import os
 import json
 import numpy as np
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 try:
     from supabase import create_client, Client
@@ -12,8 +13,11 @@ load_dotenv()
 
 import requests
 
+from database.gallery import Gallery
+from database.storage import StorageBackend
 
-class DatabaseManager:
+
+class DatabaseManager(StorageBackend):
     def __init__(self):
         url = os.getenv("SUPABASE_URL")
         service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
@@ -40,9 +44,28 @@ class DatabaseManager:
         }
 
 
-    def create_user(self, name: str):
-        """Créer un utilisateur. Retourne l'id (uuid) ou None."""
+    def _upsert(self, table, payload):
+        """
+        Insertion idempotente (id fourni par le client) : rejouer la même écriture après
+        un timeout ne crée pas de doublon. `payload` : dict ou liste de dicts.
+
+        Les lignes déjà présentes sont ignorées (ON CONFLICT DO NOTHING, comme INSERT OR
+        IGNORE côté SQLite) : seule la politique RLS INSERT est nécessaire, alors qu'une
+        fusion (merge-duplicates) exigerait une politique UPDATE que les tables n'ont pas.
+        """
+        if _HAS_SUPABASE and self.supabase is not None:
+            self.supabase.table(table).upsert(payload, ignore_duplicates=True).execute()
+            return
+        headers = dict(self._headers, Prefer="return=minimal,resolution=ignore-duplicates")
+        resp = requests.post(f"{self.url}/rest/v1/{table}", headers=headers, json=payload, timeout=10)
+        resp.raise_for_status()
+
+    def create_user(self, name: str, user_id=None):
+        """Créer un utilisateur. Retourne l'id (uuid) ou None. `user_id` : uuid imposé (écriture idempotente)."""
         try:
+            if user_id is not None:
+                self._upsert("users", {"id": user_id, "name": name})
+                return user_id
             if _HAS_SUPABASE and self.supabase is not None:
                 response = self.supabase.table("users").insert({"name": name}).execute()
                 if response.data:
@@ -136,42 +159,202 @@ class DatabaseManager:
             print(f"❌ Erreur insertion embedding : {e}")
             return False
 
+    def save_face_embeddings(self, items):
+        """Insertion groupée [{id, user_id, embedding}] en une requête (ids fournis : idempotent)."""
+        try:
+            self._upsert("face_embeddings", [
+                {"id": item["id"], "user_id": item["user_id"], "embedding": np.asarray(item["embedding"]).tolist()}
+                for item in items
+            ])
+            return True
+        except Exception as e:
+            print(f"❌ Erreur insertion embeddings : {e}")
+            return False
+
+    def archive_embeddings(self, ids):
+        """
+        Copie les lignes dans face_embeddings_archive (upsert) puis les supprime de
+        face_embeddings : rejouable sans perte si la suppression échoue.
+        """
+        ids = list(ids)
+        try:
+            archived_at = datetime.now(timezone.utc).isoformat()
+            for i in range(0, len(ids), 200):
+                chunk = ids[i:i + 200]
+                rows = self._fetch_embeddings(ids=chunk) or []
+                if rows:
+                    self._upsert("face_embeddings_archive", [
+                        {"id": row["id"], "user_id": row["user_id"], "embedding": row["embedding"],
+                         "created_at": row.get("created_at"), "archived_at": archived_at}
+                        for row in rows
+                    ])
+                if _HAS_SUPABASE and self.supabase is not None:
+                    self.supabase.table("face_embeddings").delete().in_("id", chunk).execute()
+                else:
+                    resp = requests.delete(
+                        f"{self.url}/rest/v1/face_embeddings",
+                        headers=self._headers,
+                        params={"id": f"in.({','.join(chunk)})"},
+                        timeout=10,
+                    )
+                    resp.raise_for_status()
+            return True
+        except Exception as e:
+            print(f"❌ Erreur archivage embeddings : {e}")
+            return False
+
+    def log_unknown_attempts(self, items):
+        """Journalise des tentatives d'accès non reconnues [{id, image_path, distance, created_at}]."""
+        try:
+            self._upsert("unknown_attempts", list(items))
+            return True
+        except Exception as e:
+            print(f"❌ Erreur journalisation tentatives inconnues : {e}")
+            return False
+
+    def _parse_embedding_rows(self, data):
+        results = []
+        for item in data or []:
+            arr = np.array(item.get("embedding", []))
+            results.append({
+                "id": item.get("id"),
+                "user_id": item.get("user_id"),
+                "name": item.get("users", {}).get("name") if item.get("users") else None,
+                "embedding": arr,
+                "created_at": item.get("created_at"),
+            })
+        return results
+
+    def _fetch_embeddings(self, since=None, ids=None, user_ids=None):
+        """Lecture brute (JSON) de face_embeddings, filtrée par date de création (>= since), ids ou utilisateurs."""
+        columns = "id,user_id,embedding,created_at,users(name)"
+        if _HAS_SUPABASE and self.supabase is not None:
+            query = self.supabase.table("face_embeddings").select(columns)
+            if since is not None:
+                query = query.gte("created_at", since)
+            if ids is not None:
+                query = query.in_("id", list(ids))
+            if user_ids is not None:
+                query = query.in_("user_id", list(user_ids))
+            return query.execute().data
+
+        params = {"select": columns}
+        if since is not None:
+            params["created_at"] = f"gte.{since}"
+        if ids is not None:
+            params["id"] = f"in.({','.join(ids)})"
+        if user_ids is not None:
+            params["user_id"] = f"in.({','.join(user_ids)})"
+        resp = requests.get(
+            f"{self.url}/rest/v1/face_embeddings",
+            headers=self._headers,
+            params=params,
+            timeout=10,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def _select_embeddings(self, since=None, ids=None, user_ids=None):
+        return self._parse_embedding_rows(self._fetch_embeddings(since=since, ids=ids, user_ids=user_ids))
+
+    def get_gallery(self):
+        """
+        Galerie compacte (database.gallery.Gallery) : matrice d'embeddings + index entiers,
+        un seul nom par utilisateur. Retourne (gallery, synced_at), synced_at étant le
+        created_at le plus récent ; (None, None) en cas d'erreur.
+        """
+        try:
+            data = [item for item in self._fetch_embeddings() or [] if len(item.get("embedding") or []) == 128]
+            gallery = Gallery.from_records(
+                [item.get("id") for item in data],
+                [item.get("user_id") for item in data],
+                [(item.get("users") or {}).get("name") for item in data],
+                [item["embedding"] for item in data],
+            )
+            synced_at = max((item["created_at"] for item in data if item.get("created_at")), default=None)
+            return gallery, synced_at
+        except Exception as e:
+            print(f"❌ Erreur récupération galerie : {e}")
+            return None, None
+
     def get_all_embeddings(self):
         """Récupère tous les embeddings + noms"""
+        try:
+            return self._select_embeddings()
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings : {e}")
+            return []
+
+    def get_embeddings_since(self, since):
+        """Embeddings créés depuis `since` (timestamp ISO). Retourne None en cas d'erreur réseau."""
+        try:
+            return self._select_embeddings(since=since)
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings récents : {e}")
+            return None
+
+    def get_embeddings_by_ids(self, ids):
+        """Embeddings correspondant à une liste d'ids. Retourne None en cas d'erreur réseau."""
+        ids = list(ids)
+        if not ids:
+            return []
+        try:
+            results = []
+            for i in range(0, len(ids), 200):
+                results.extend(self._select_embeddings(ids=ids[i:i + 200]))
+            return results
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings par id : {e}")
+            return None
+
+    def get_embeddings_by_users(self, user_ids):
+        """Embeddings des utilisateurs `user_ids`. Retourne None en cas d'erreur réseau."""
+        user_ids = [str(uid) for uid in user_ids]
+        if not user_ids:
+            return []
+        try:
+            results = []
+            for i in range(0, len(user_ids), 200):
+                results.extend(self._select_embeddings(user_ids=user_ids[i:i + 200]))
+            return results
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings par utilisateur : {e}")
+            return None
+
+    def get_embedding_count(self):
+        """Nombre de lignes dans face_embeddings (sans télécharger les vecteurs)."""
+        try:
+            if _HAS_SUPABASE and self.supabase is not None:
+                response = self.supabase.table("face_embeddings").select("id", count="exact").limit(1).execute()
+                return response.count
+            headers = dict(self._headers, Prefer="count=exact")
+            resp = requests.head(
+                f"{self.url}/rest/v1/face_embeddings",
+                headers=headers,
+                params={"select": "id"},
+                timeout=10,
+            )
+            resp.raise_for_status()
+            content_range = resp.headers.get("Content-Range", "")
+            return int(content_range.split("/")[-1])
+        except Exception as e:
+            print(f"❌ Erreur comptage embeddings : {e}")
+            return None
+
+    def get_embedding_ids(self):
+        """Liste des ids de face_embeddings (pour détecter les suppressions). None en cas d'erreur."""
         try:
             if _HAS_SUPABASE and self.supabase is not None:
-                response = self.supabase.table("face_embeddings").select(
-                    "id, user_id, embedding, users(name)"
-                ).execute()
-
-                results = []
-                for item in response.data:
-                    arr = np.array(item["embedding"])
-                    results.append({
-                        "user_id": item["user_id"],
-                        "name": item["users"]["name"],
-                        "embedding": arr,
-                    })
-                return results
-
-            params = {"select": "id,user_id,embedding,users(name)"}
+                response = self.supabase.table("face_embeddings").select("id").execute()
+                return [item["id"] for item in response.data or []]
             resp = requests.get(
                 f"{self.url}/rest/v1/face_embeddings",
                 headers=self._headers,
-                params=params,
+                params={"select": "id"},
                 timeout=10,
             )
             resp.raise_for_status()
-            data = resp.json()
-            results = []
-            for item in data:
-                arr = np.array(item.get("embedding", []))
-                results.append({
-                    "user_id": item.get("user_id"),
-                    "name": item.get("users", {}).get("name") if item.get("users") else None,
-                    "embedding": arr,
-                })
-            return results
+            return [item["id"] for item in resp.json() or []]
         except Exception as e:
-            print(f"❌ Erreur récupération embeddings : {e}")
-            return []
+            print(f"❌ Erreur récupération ids embeddings : {e}")
+            return None
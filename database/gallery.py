@@ -0,0 +1,203 @@
+import numpy as np
+
+
+EMBEDDING_DIM = 128
+
+
+def _str_array(values):
+    """Tableau numpy de chaînes à largeur fixe (sérialisable sans pickle)."""
+    values = ["" if v is None else str(v) for v in values]
+    return np.array(values, dtype=f"U{max([1] + [len(v) for v in values])}")
+
+
+class Gallery:
+    """
+    Galerie compacte indexée par entiers :
+
+    - embeddings : (N, 128) float32 contigu, une ligne par échantillon
+    - row_user   : (N,) int32, index de l'utilisateur de chaque ligne
+    - row_ids    : (N,) ids des lignes face_embeddings
+    - user_ids   : (U,) uuid des utilisateurs, names : (U,) noms
+    - prototypes : (U, 128) float32, moyenne des échantillons de chaque utilisateur
+
+    Tous les champs sont des tableaux numpy : pas d'objet Python par ligne, et la
+    sérialisation (save / load) est une simple copie des buffers.
+    """
+
+    __slots__ = ("embeddings", "row_user", "row_ids", "user_ids", "names", "prototypes", "_user_index")
+
+    def __init__(self, embeddings, row_user, row_ids, user_ids, names, prototypes=None):
+        self.embeddings = embeddings if isinstance(embeddings, np.memmap) else np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.row_user = np.asarray(row_user, dtype=np.int32)
+        self.row_ids = np.asarray(row_ids)
+        self.user_ids = np.asarray(user_ids)
+        self.names = np.asarray(names)
+        self.prototypes = prototypes if prototypes is not None else self._compute_prototypes()
+        self._user_index = None
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, EMBEDDING_DIM), dtype=np.float32), [], _str_array([]), _str_array([]), _str_array([]))
+
+    @classmethod
+    def from_records(cls, row_ids, user_ids, names, embeddings):
+        """
+        Construit la galerie à partir de colonnes parallèles (une entrée par ligne) :
+        les noms répétés ne sont conservés qu'une fois par utilisateur.
+        """
+        if len(row_ids) == 0:
+            return cls.empty()
+        unique_users, row_user = np.unique(_str_array(user_ids), return_inverse=True)
+        user_names = [""] * len(unique_users)
+        for idx, name in zip(row_user, names):
+            if name and not user_names[idx]:
+                user_names[idx] = name
+        return cls(
+            np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM),
+            row_user,
+            _str_array(row_ids),
+            unique_users,
+            _str_array(user_names),
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Depuis la liste de dicts de DatabaseManager.get_all_embeddings()."""
+        rows = [r for r in rows if r.get("embedding") is not None and len(r["embedding"]) == EMBEDDING_DIM]
+        return cls.from_records(
+            [r.get("id") or f"local-{i}" for i, r in enumerate(rows)],
+            [r["user_id"] for r in rows],
+            [r.get("name") for r in rows],
+            np.array([r["embedding"] for r in rows], dtype=np.float32),
+        )
+
+    def __len__(self):
+        return len(self.row_user)
+
+    @property
+    def n_users(self):
+        return len(self.user_ids)
+
+    def _compute_prototypes(self):
+        n_users = len(self.user_ids)
+        if n_users == 0:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        order = np.argsort(self.row_user, kind="stable")
+        counts = np.bincount(self.row_user, minlength=n_users)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(np.asarray(self.embeddings)[order], starts[counts > 0], axis=0)
+        prototypes = np.zeros((n_users, EMBEDDING_DIM), dtype=np.float32)
+        prototypes[counts > 0] = sums / counts[counts > 0, None]
+        return prototypes
+
+    def user_index(self, user_id):
+        """Index entier d'un uuid (dictionnaire construit à la demande)."""
+        if self._user_index is None:
+            self._user_index = {uid: i for i, uid in enumerate(self.user_ids.tolist())}
+        return self._user_index.get(user_id)
+
+    def name_of(self, user_id):
+        idx = self.user_index(user_id)
+        if idx is None:
+            return None
+        return str(self.names[idx]) or None
+
+    def rows_of(self, user_id):
+        """Embeddings (vue) des lignes d'un utilisateur."""
+        idx = self.user_index(user_id)
+        if idx is None:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        return self.embeddings[self.row_user == idx]
+
+    def search_matrix(self, normalize=False):
+        """
+        Matrice de recherche : échantillons puis prototypes, avec l'index utilisateur de
+        chaque ligne. Normalisée L2 si demandé (métrique cosine).
+        """
+        matrix = np.concatenate([np.asarray(self.embeddings, dtype=np.float32), self.prototypes])
+        owners = np.concatenate([self.row_user, np.arange(self.n_users, dtype=np.int32)])
+        if normalize and len(matrix):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        return matrix, owners
+
+    def updated(self, add_row_ids=(), add_user_ids=(), add_names=(), add_embeddings=None, remove_row_ids=()):
+        """
+        Nouvelle galerie avec des lignes ajoutées / supprimées (l'instance courante n'est
+        pas modifiée). Les prototypes ne sont recalculés que pour les utilisateurs touchés.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if len(remove_row_ids):
+            keep = ~np.isin(self.row_ids, _str_array(remove_row_ids))
+
+        user_ids = self.user_ids.tolist()
+        names = self.names.tolist()
+        index = {uid: i for i, uid in enumerate(user_ids)}
+        new_row_user = []
+        for uid, name in zip(add_user_ids, add_names):
+            if uid not in index:
+                index[uid] = len(user_ids)
+                user_ids.append(uid)
+                names.append(name or "")
+            elif name and not names[index[uid]]:
+                names[index[uid]] = name
+            new_row_user.append(index[uid])
+
+        if add_embeddings is None:
+            add_embeddings = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        embeddings = np.concatenate([np.asarray(self.embeddings)[keep], np.asarray(add_embeddings, dtype=np.float32)])
+        row_user = np.concatenate([self.row_user[keep], np.array(new_row_user, dtype=np.int32)])
+        row_ids = np.concatenate([self.row_ids[keep].astype(str), np.array([str(r) for r in add_row_ids], dtype=str)])
+
+        # Utilisateurs touchés : lignes retirées ou ajoutées
+        touched = np.zeros(len(user_ids), dtype=bool)
+        touched[self.row_user[~keep]] = True
+        touched[np.array(new_row_user, dtype=np.int32)] = True
+
+        # Compactage : les utilisateurs sans plus aucune ligne disparaissent
+        counts = np.bincount(row_user, minlength=len(user_ids))
+        alive = counts > 0
+        remap = np.cumsum(alive) - 1
+        prototypes = np.zeros((len(user_ids), EMBEDDING_DIM), dtype=np.float32)
+        prototypes[:len(self.prototypes)] = self.prototypes
+        gallery = Gallery(
+            embeddings,
+            remap[row_user],
+            _str_array(row_ids),
+            _str_array(user_ids)[alive],
+            _str_array(names)[alive],
+            prototypes=prototypes[alive],
+        )
+        stale = touched[alive]
+        if stale.any():
+            gallery.prototypes[stale] = gallery._compute_prototypes()[stale]
+        return gallery
+
+    @property
+    def nbytes(self):
+        """Taille totale des tableaux (octets)."""
+        return sum(
+            np.asarray(a).nbytes
+            for a in (self.embeddings, self.row_user, self.row_ids, self.user_ids, self.names, self.prototypes)
+        )
+
+    def save(self, path):
+        """Sérialisation par copie des buffers (.npz non compressé, sans pickle)."""
+        np.savez(
+            path,
+            embeddings=np.asarray(self.embeddings),
+            row_user=self.row_user,
+            row_ids=self.row_ids,
+            user_ids=self.user_ids,
+            names=self.names,
+            prototypes=self.prototypes,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["embeddings"], data["row_user"], data["row_ids"],
+                data["user_ids"], data["names"], prototypes=data["prototypes"],
+            )
@@ -0,0 +1,298 @@
+import uuid
+import sqlite3
+import threading
+import numpy as np
+from pathlib import Path
+from datetime import datetime, timezone
+
+from database.gallery import Gallery, EMBEDDING_DIM
+from database.storage import StorageBackend
+
+
+DEFAULT_SQLITE_PATH = Path(__file__).resolve().parents[1] / "face_auth.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS face_embeddings (
+  id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  embedding BLOB NOT NULL,
+  created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS face_embeddings_archive (
+  id TEXT PRIMARY KEY,
+  user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  embedding BLOB NOT NULL,
+  created_at TEXT NOT NULL,
+  archived_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS unknown_attempts (
+  id TEXT PRIMARY KEY,
+  image_path TEXT,
+  distance REAL,
+  created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_face_embeddings_user_id ON face_embeddings(user_id);
+CREATE INDEX IF NOT EXISTS idx_face_embeddings_created_at ON face_embeddings(created_at);
+"""
+
+_EMBEDDING_QUERY = (
+    "SELECT e.id, e.user_id, u.name, e.embedding, e.created_at "
+    "FROM face_embeddings e JOIN users u ON u.id = e.user_id"
+)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SQLiteDatabaseManager(StorageBackend):
+    """
+    Backend local (un fichier SQLite) : même API que DatabaseManager, sans réseau.
+    Les embeddings sont stockés en BLOB float32 (512 octets), la galerie se charge
+    donc par une seule requête et une copie de buffer.
+
+    path : fichier de base (":memory:" pour une base éphémère, utile aux tests)
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path or DEFAULT_SQLITE_PATH)
+        # Connexion partagée entre threads (rafraîchissement de galerie), sérialisée par un verrou
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA foreign_keys = ON")
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def _execute(self, sql, params=(), commit=False):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall()
+            if commit:
+                self._conn.commit()
+            return rows, cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def create_user(self, name: str, user_id=None):
+        """Créer un utilisateur. Retourne l'id (uuid) ou None. `user_id` : uuid imposé (écriture idempotente)."""
+        try:
+            user_id = user_id or str(uuid.uuid4())
+            self._execute(
+                "INSERT OR IGNORE INTO users (id, name, created_at) VALUES (?, ?, ?)", (user_id, name, _now()), commit=True
+            )
+            return user_id
+        except Exception as e:
+            print(f"❌ Erreur création user : {e}")
+            return None
+
+    def get_all_users(self):
+        try:
+            rows, _ = self._execute("SELECT id, name, created_at FROM users ORDER BY created_at")
+            return [{"id": r[0], "name": r[1], "created_at": r[2]} for r in rows]
+        except Exception as e:
+            print("❌ Erreur get_all_users:", e)
+            return []
+
+    def get_user_by_id(self, user_id: str):
+        """Récupère un utilisateur par son ID"""
+        try:
+            rows, _ = self._execute("SELECT id, name, created_at FROM users WHERE id = ?", (user_id,))
+            if rows:
+                return {"id": rows[0][0], "name": rows[0][1], "created_at": rows[0][2]}
+            return None
+        except Exception as e:
+            print(f"❌ Erreur get_user_by_id: {e}")
+            return None
+
+    def delete_user(self, user_id: str):
+        try:
+            self._execute("DELETE FROM users WHERE id = ?", (user_id,), commit=True)
+            return True
+        except Exception as e:
+            print(f"❌ Erreur suppression user : {e}")
+            return False
+
+    def save_face_embedding(self, user_id: str, embedding: np.ndarray):
+        """Enregistrer l'embedding (BLOB float32)"""
+        try:
+            blob = np.asarray(embedding, dtype=np.float32).reshape(EMBEDDING_DIM).tobytes()
+            self._execute(
+                "INSERT INTO face_embeddings (id, user_id, embedding, created_at) VALUES (?, ?, ?, ?)",
+                (str(uuid.uuid4()), user_id, blob, _now()),
+                commit=True,
+            )
+            return True
+        except Exception as e:
+            print(f"❌ Erreur insertion embedding : {e}")
+            return False
+
+    def save_face_embeddings(self, items):
+        """Insertion groupée [{id, user_id, embedding}] dans une transaction (ids fournis : idempotent)."""
+        try:
+            now = _now()
+            params = [
+                (item["id"], item["user_id"],
+                 np.asarray(item["embedding"], dtype=np.float32).reshape(EMBEDDING_DIM).tobytes(), now)
+                for item in items
+            ]
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO face_embeddings (id, user_id, embedding, created_at) VALUES (?, ?, ?, ?)",
+                    params,
+                )
+            return True
+        except Exception as e:
+            print(f"❌ Erreur insertion embeddings : {e}")
+            return False
+
+    def archive_embeddings(self, ids):
+        """Déplace des lignes vers face_embeddings_archive, dans une transaction."""
+        ids = list(ids)
+        try:
+            now = _now()
+            with self._lock, self._conn:
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO face_embeddings_archive (id, user_id, embedding, created_at, archived_at) "
+                        f"SELECT id, user_id, embedding, created_at, ? FROM face_embeddings WHERE id IN ({placeholders})",
+                        [now] + chunk,
+                    )
+                    self._conn.execute(f"DELETE FROM face_embeddings WHERE id IN ({placeholders})", chunk)
+            return True
+        except Exception as e:
+            print(f"❌ Erreur archivage embeddings : {e}")
+            return False
+
+    def log_unknown_attempts(self, items):
+        """Journalise des tentatives d'accès non reconnues [{id, image_path, distance, created_at}]."""
+        try:
+            params = [(item["id"], item.get("image_path"), item.get("distance"), item.get("created_at") or _now())
+                      for item in items]
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO unknown_attempts (id, image_path, distance, created_at) VALUES (?, ?, ?, ?)",
+                    params,
+                )
+            return True
+        except Exception as e:
+            print(f"❌ Erreur journalisation tentatives inconnues : {e}")
+            return False
+
+    @staticmethod
+    def _parse_embedding_rows(rows):
+        return [
+            {
+                "id": row_id,
+                "user_id": user_id,
+                "name": name,
+                "embedding": np.frombuffer(blob, dtype=np.float32),
+                "created_at": created_at,
+            }
+            for row_id, user_id, name, blob, created_at in rows
+        ]
+
+    def get_all_embeddings(self):
+        """Récupère tous les embeddings + noms"""
+        try:
+            rows, _ = self._execute(_EMBEDDING_QUERY)
+            return self._parse_embedding_rows(rows)
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings : {e}")
+            return []
+
+    def get_embeddings_since(self, since):
+        """Embeddings créés depuis `since` (timestamp ISO). Retourne None en cas d'erreur."""
+        try:
+            rows, _ = self._execute(_EMBEDDING_QUERY + " WHERE e.created_at >= ?", (since,))
+            return self._parse_embedding_rows(rows)
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings récents : {e}")
+            return None
+
+    def get_embeddings_by_ids(self, ids):
+        """Embeddings correspondant à une liste d'ids. Retourne None en cas d'erreur."""
+        ids = list(ids)
+        if not ids:
+            return []
+        try:
+            results = []
+            # Limite SQLite sur le nombre de paramètres d'une requête
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows, _ = self._execute(
+                    _EMBEDDING_QUERY + f" WHERE e.id IN ({','.join('?' * len(chunk))})", chunk
+                )
+                results.extend(self._parse_embedding_rows(rows))
+            return results
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings par id : {e}")
+            return None
+
+    def get_embeddings_by_users(self, user_ids):
+        """Embeddings des utilisateurs `user_ids`. Retourne None en cas d'erreur."""
+        user_ids = [str(uid) for uid in user_ids]
+        if not user_ids:
+            return []
+        try:
+            results = []
+            for i in range(0, len(user_ids), 500):
+                chunk = user_ids[i:i + 500]
+                rows, _ = self._execute(
+                    _EMBEDDING_QUERY + f" WHERE e.user_id IN ({','.join('?' * len(chunk))})", chunk
+                )
+                results.extend(self._parse_embedding_rows(rows))
+            return results
+        except Exception as e:
+            print(f"❌ Erreur récupération embeddings par utilisateur : {e}")
+            return None
+
+    def get_embedding_count(self):
+        """Nombre de lignes dans face_embeddings."""
+        try:
+            rows, _ = self._execute("SELECT COUNT(*) FROM face_embeddings")
+            return int(rows[0][0])
+        except Exception as e:
+            print(f"❌ Erreur comptage embeddings : {e}")
+            return None
+
+    def get_embedding_ids(self):
+        """Liste des ids de face_embeddings. None en cas d'erreur."""
+        try:
+            rows, _ = self._execute("SELECT id FROM face_embeddings")
+            return [r[0] for r in rows]
+        except Exception as e:
+            print(f"❌ Erreur récupération ids embeddings : {e}")
+            return None
+
+    def get_gallery(self):
+        """
+        Galerie compacte en une requête : les BLOBs sont concaténés puis lus d'un bloc
+        (np.frombuffer), sans tableau intermédiaire par ligne.
+        Retourne (gallery, synced_at) ; (None, None) en cas d'erreur.
+        """
+        try:
+            rows, _ = self._execute(_EMBEDDING_QUERY)
+            if not rows:
+                return Gallery.empty(), None
+            row_ids, user_ids, names, blobs, created = zip(*rows)
+            embeddings = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+            return Gallery.from_records(row_ids, user_ids, names, embeddings), max(created)
+        except Exception as e:
+            print(f"❌ Erreur récupération galerie : {e}")
+            return None, None
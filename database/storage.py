@@ -0,0 +1,107 @@
+import os
+import uuid
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database.gallery import Gallery
+
+
+BACKENDS = ("supabase", "sqlite")
+
+
+class StorageBackend:
+    """
+    Interface commune des backends de stockage (utilisateurs + embeddings).
+
+    Conventions partagées par toutes les implémentations :
+    - les erreurs sont journalisées et converties en valeur neutre (None / [] / False),
+      jamais propagées à l'interface ;
+    - les lignes d'embeddings sont des dicts {id, user_id, name, embedding, created_at},
+      created_at étant un timestamp ISO comparable lexicographiquement.
+    """
+
+    def create_user(self, name: str, user_id=None):
+        """Créer un utilisateur. Retourne l'id (uuid) ou None. `user_id` : uuid imposé (écriture idempotente)."""
+        raise NotImplementedError
+
+    def get_all_users(self):
+        raise NotImplementedError
+
+    def get_user_by_id(self, user_id: str):
+        raise NotImplementedError
+
+    def delete_user(self, user_id: str):
+        raise NotImplementedError
+
+    def save_face_embedding(self, user_id: str, embedding):
+        raise NotImplementedError
+
+    def save_face_embeddings(self, items):
+        """Insertion groupée [{id, user_id, embedding}], idempotente sur id. Retourne True / False."""
+        raise NotImplementedError
+
+    def archive_embeddings(self, ids):
+        """
+        Déplace des lignes de face_embeddings vers face_embeddings_archive (compactage de
+        galerie) : elles ne sont plus chargées pour la reconnaissance mais restent
+        récupérables. Idempotent. Retourne True / False.
+        """
+        raise NotImplementedError
+
+    def log_unknown_attempts(self, items):
+        """Tentatives d'accès non reconnues [{id, image_path, distance, created_at}]. Retourne True / False."""
+        raise NotImplementedError
+
+    def log_unknown_attempt(self, image_path, distance=None):
+        """Journalise une tentative d'accès non reconnue (image sauvegardée, meilleure distance)."""
+        return self.log_unknown_attempts([{
+            "id": str(uuid.uuid4()),
+            "image_path": image_path,
+            "distance": None if distance is None else float(distance),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }])
+
+    def get_all_embeddings(self):
+        raise NotImplementedError
+
+    def get_embeddings_since(self, since):
+        raise NotImplementedError
+
+    def get_embeddings_by_ids(self, ids):
+        raise NotImplementedError
+
+    def get_embeddings_by_users(self, user_ids):
+        raise NotImplementedError
+
+    def get_embedding_count(self):
+        raise NotImplementedError
+
+    def get_embedding_ids(self):
+        raise NotImplementedError
+
+    def get_gallery(self):
+        """
+        Galerie compacte + created_at le plus récent. Implémentation par défaut à partir
+        de get_all_embeddings ; les backends peuvent la remplacer par une lecture directe.
+        """
+        rows = self.get_all_embeddings()
+        synced_at = max((r["created_at"] for r in rows if r.get("created_at")), default=None)
+        return Gallery.from_rows(rows), synced_at
+
+
+def get_database(backend=None, **kwargs):
+    """
+    Backend de stockage choisi par configuration : argument `backend`, sinon variable
+    d'environnement DB_BACKEND ("supabase" par défaut, ou "sqlite" avec SQLITE_PATH).
+    """
+    backend = (backend or os.getenv("DB_BACKEND") or "supabase").lower()
+    if backend == "sqlite":
+        from database.sqlite_manager import SQLiteDatabaseManager
+        kwargs.setdefault("path", os.getenv("SQLITE_PATH") or None)
+        return SQLiteDatabaseManager(**kwargs)
+    if backend == "supabase":
+        from database.database_manager import DatabaseManager
+        return DatabaseManager(**kwargs)
+    raise ValueError(f"DB_BACKEND doit être l'un de {BACKENDS} (reçu : {backend!r})")
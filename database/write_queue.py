@@ -0,0 +1,343 @@
+import os
+import json
+import uuid
+import random
+import threading
+from pathlib import Path
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+from database.storage import StorageBackend
+
+
+DEFAULT_JOURNAL_PATH = Path(__file__).resolve().parents[1] / "cache" / "write_journal.jsonl"
+
+
+class WriteBehindQueue(StorageBackend):
+    """
+    Écritures différées devant un backend (Supabase, SQLite) : create_user,
+    save_face_embedding(s), delete_user, archive_embeddings et log_unknown_attempt(s)
+    sont inscrits dans un journal local (JSON lines, fsync) et rendent la main
+    immédiatement ; un thread de fond les applique par lots, dans l'ordre, avec reprise
+    et backoff exponentiel.
+
+    - les ids (utilisateur, embedding, tentative) sont générés côté client : create_user
+      retourne l'uuid définitif tout de suite, et rejouer un lot est idempotent (lignes déjà présentes ignorées) ;
+    - une écriture n'est retirée du journal qu'après succès côté backend : celles encore
+      en attente à l'arrêt (ou après un crash) sont rejouées au démarrage suivant ;
+    - les lectures sont transmises directement au backend (les écritures en attente n'y
+      sont visibles qu'après application) ;
+    - une écriture rejetée seule (lot de 1) alors que le backend répond est comptée
+      comme tentative ; après `max_attempts` rejets elle est déplacée dans le journal
+      des rejets (<journal>.dead.jsonl) pour ne plus bloquer la file.
+    """
+
+    def __init__(self, backend, journal_path=None, batch_size=50, flush_interval=0.2,
+                 base_backoff=1.0, max_backoff=60.0, fsync=True, max_attempts=5):
+        self.backend = backend
+        self.journal_path = Path(journal_path or DEFAULT_JOURNAL_PATH)
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self.dead_letter_path = self.journal_path.with_suffix(".dead.jsonl")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+
+        self._pending = deque()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.failures = 0
+        self.dead_lettered = self._count_dead_letters()
+
+        self._replay()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    # ---- journal ----
+
+    def _replay(self):
+        """Recharge les écritures non acquittées, puis réécrit un journal compact."""
+        entries = {}
+        acked = set()
+        attempts = {}
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée par un arrêt brutal
+                        continue
+                    if "ack" in record:
+                        acked.update(record["ack"])
+                    elif "retry" in record:
+                        attempts[record["retry"]] = record["attempts"]
+                    else:
+                        entries[record["seq"]] = record
+        for seq in sorted(entries):
+            if seq not in acked:
+                if seq in attempts:
+                    entries[seq]["attempts"] = attempts[seq]
+                self._pending.append(entries[seq])
+        self._seq = max(entries, default=0)
+
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._pending:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        if self._pending:
+            print(f"📒 {len(self._pending)} écriture(s) en attente rechargée(s) depuis {self.journal_path}")
+
+    def _append(self, record):
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _enqueue(self, op, data):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WriteBehindQueue fermée")
+            self._seq += 1
+            entry = {"seq": self._seq, "op": op, "data": data}
+            self._append(entry)
+            self._pending.append(entry)
+            self._cond.notify_all()
+
+    def _ack(self, batch):
+        with self._cond:
+            for _ in batch:
+                self._pending.popleft()
+            if self._pending:
+                self._append({"ack": [entry["seq"] for entry in batch]})
+            else:
+                # File vide : le journal repart de zéro
+                self._journal.truncate(0)
+                self._journal.seek(0)
+            self._cond.notify_all()
+
+    def _count_dead_letters(self):
+        if not self.dead_letter_path.exists():
+            return 0
+        with open(self.dead_letter_path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+
+    def _dead_letter(self, entry):
+        """Déplace une écriture toujours rejetée dans le journal des rejets, puis l'acquitte."""
+        record = dict(entry, dead_at=datetime.now(timezone.utc).isoformat())
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += 1
+        print(f"☠️ Écriture {entry['op']} n°{entry['seq']} rejetée {entry['attempts']} fois : "
+              f"déplacée dans {self.dead_letter_path}")
+        self._ack([entry])
+
+    def _record_attempt(self, entry):
+        """
+        Compte un rejet de l'écriture isolée `entry`, sauf si le backend est lui-même
+        injoignable (panne : ce n'est pas l'écriture qui est en cause). Retourne True
+        si l'écriture a atteint max_attempts.
+        """
+        try:
+            reachable = self.backend.get_embedding_count() is not None
+        except Exception:
+            reachable = False
+        if not reachable:
+            return False
+        with self._cond:
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            self._append({"retry": entry["seq"], "attempts": entry["attempts"]})
+        return entry["attempts"] >= self.max_attempts
+
+    # ---- worker ----
+
+    def _apply(self, op, items):
+        try:
+            if op == "create_user":
+                return all(self.backend.create_user(d["name"], user_id=d["id"]) is not None for d in items)
+            if op == "save_face_embedding":
+                return bool(self.backend.save_face_embeddings(items))
+            if op == "log_unknown_attempt":
+                return bool(self.backend.log_unknown_attempts(items))
+            if op == "archive_embeddings":
+                return bool(self.backend.archive_embeddings([row_id for d in items for row_id in d["ids"]]))
+            if op == "delete_user":
+                return all(self.backend.delete_user(d["id"]) for d in items)
+            print(f"⚠️ Opération inconnue dans le journal ignorée : {op}")
+            return True
+        except Exception as e:
+            print(f"❌ Erreur écriture différée ({op}) : {e}")
+            return False
+
+    def _next_batch(self, limit):
+        """Lot d'opérations consécutives de même type en tête de file."""
+        op = self._pending[0]["op"]
+        batch = []
+        for entry in self._pending:
+            if entry["op"] != op or len(batch) >= limit:
+                break
+            batch.append(entry)
+        return op, batch
+
+    def _run(self):
+        limit = self.batch_size
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                # Laisse s'accumuler les écritures rapprochées pour former un lot
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= limit, timeout=self.flush_interval)
+                if self._closed:
+                    return
+                op, batch = self._next_batch(limit)
+
+            if self._apply(op, [entry["data"] for entry in batch]):
+                self._ack(batch)
+                self.failures = 0
+                limit = self.batch_size
+                continue
+
+            # Échec : lot divisé par deux (isole une écriture rejetée) et attente exponentielle ;
+            # une écriture isolée rejetée trop souvent part dans le journal des rejets
+            if len(batch) == 1 and self._record_attempt(batch[0]):
+                self._dead_letter(batch[0])
+                self.failures = 0
+                limit = self.batch_size
+                continue
+            self.failures += 1
+            limit = max(1, len(batch) // 2)
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (self.failures - 1))
+            delay *= random.uniform(0.5, 1.0)
+            print(f"⏳ Écritures différées : échec n°{self.failures}, nouvel essai dans {delay:.1f} s "
+                  f"({len(self._pending)} en attente)")
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed, timeout=delay)
+
+    # ---- contrôle ----
+
+    def pending(self):
+        """Nombre d'écritures pas encore appliquées au backend."""
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        """Écritures en attente, écritures abandonnées (journal des rejets) et échecs consécutifs."""
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "dead_lettered": self.dead_lettered,
+                "failures": self.failures,
+            }
+
+    def flush(self, timeout=None):
+        """Attend que toutes les écritures soient appliquées. Retourne True si la file est vide."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def close(self, timeout=5.0):
+        """
+        Tente de vider la file pendant `timeout` secondes puis arrête le worker ; le reste
+        demeure dans le journal et sera rejoué au prochain démarrage.
+        """
+        if self._closed:
+            return
+        self.flush(timeout=timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            # Worker encore dans _apply (backend lent) : il acquittera son lot dans le
+            # journal, qui reste donc ouvert (fermé à la fin du processus)
+            print("⚠️ Écritures différées : worker toujours actif, journal laissé ouvert")
+        else:
+            self._journal.close()
+        left = self.pending()
+        if left:
+            print(f"📒 {left} écriture(s) conservée(s) dans {self.journal_path}")
+        if self.dead_lettered:
+            print(f"☠️ {self.dead_lettered} écriture(s) abandonnée(s) dans {self.dead_letter_path}")
+
+    # ---- écritures (différées) ----
+
+    def create_user(self, name: str, user_id=None):
+        """Créer un utilisateur. Retourne immédiatement l'uuid attribué."""
+        user_id = user_id or str(uuid.uuid4())
+        self._enqueue("create_user", {"id": user_id, "name": name})
+        return user_id
+
+    def delete_user(self, user_id: str):
+        self._enqueue("delete_user", {"id": user_id})
+        return True
+
+    def save_face_embedding(self, user_id: str, embedding):
+        self._enqueue("save_face_embedding", {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "embedding": np.asarray(embedding, dtype=float).tolist(),
+        })
+        return True
+
+    def save_face_embeddings(self, items):
+        for item in items:
+            self._enqueue("save_face_embedding", {
+                "id": item.get("id") or str(uuid.uuid4()),
+                "user_id": item["user_id"],
+                "embedding": np.asarray(item["embedding"], dtype=float).tolist(),
+            })
+        return True
+
+    def archive_embeddings(self, ids):
+        self._enqueue("archive_embeddings", {"ids": [str(row_id) for row_id in ids]})
+        return True
+
+    def log_unknown_attempts(self, items):
+        for item in items:
+            self._enqueue("log_unknown_attempt", {
+                "id": item.get("id") or str(uuid.uuid4()),
+                "image_path": item.get("image_path"),
+                "distance": None if item.get("distance") is None else float(item["distance"]),
+                "created_at": item.get("created_at") or datetime.now(timezone.utc).isoformat(),
+            })
+        return True
+
+    # ---- lectures (directes) ----
+
+    def get_all_users(self):
+        return self.backend.get_all_users()
+
+    def get_user_by_id(self, user_id: str):
+        return self.backend.get_user_by_id(user_id)
+
+    def get_all_embeddings(self):
+        return self.backend.get_all_embeddings()
+
+    def get_embeddings_since(self, since):
+        return self.backend.get_embeddings_since(since)
+
+    def get_embeddings_by_ids(self, ids):
+        return self.backend.get_embeddings_by_ids(ids)
+
+    def get_embeddings_by_users(self, user_ids):
+        return self.backend.get_embeddings_by_users(user_ids)
+
+    def get_embedding_count(self):
+        return self.backend.get_embedding_count()
+
+    def get_embedding_ids(self):
+        return self.backend.get_embedding_ids()
+
+    def get_gallery(self):
+        return self.backend.get_gallery()
@@ -0,0 +1,170 @@
+import queue
+import threading
+import cv2
+import tkinter as tk
+from PIL import Image, ImageTk
+
+from core.frame_source import CameraSource
+
+
+class CameraWorker(threading.Thread):
+    """
+    Boucle caméra + traitement hors du thread Tk.
+
+    `session` fournit open(worker) (chargement des modèles, appels base), puis
+    process(worker, frame, command) pour chaque image (retourne l'image à afficher) et
+    close(). Ces méthodes s'exécutent dans le thread du worker.
+
+    Communication avec Tk (jamais d'appel Tk depuis ce thread) :
+    - Tk → worker : send(command), cancel() ;
+    - worker → Tk : post(kind, payload) dans une queue.Queue lue par CameraView via after().
+      Seule la dernière image à afficher est conservée : si Tk prend du retard, les images
+      intermédiaires sont abandonnées au lieu de s'accumuler.
+
+    `source` (core.frame_source) remplace la webcam : enregistrement d'une session ou
+    rejeu d'un enregistrement (dont les commandes sont alors rejouées). Avec
+    display_width=None, aucune image n'est préparée pour l'affichage (rejeu sans Tk).
+    """
+
+    def __init__(self, session, camera_index=0, display_width=560, source=None):
+        super().__init__(name="camera-worker", daemon=True)
+        self.session = session
+        self.camera_index = camera_index
+        self.display_width = display_width
+        self.source = source if source is not None else CameraSource(camera_index)
+        self.messages = queue.Queue()
+        self._commands = queue.Queue()
+        self._cancel = threading.Event()
+        self._frame = None
+        self._frame_lock = threading.Lock()
+
+    def send(self, command):
+        self._commands.put(command)
+
+    def cancel(self):
+        """Demande l'arrêt : pris en compte à la fin de l'image en cours."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def post(self, kind, payload=None):
+        self.messages.put((kind, payload))
+
+    def latest_frame(self):
+        """Dernière image RGB prête à afficher (ou None si rien de nouveau)."""
+        with self._frame_lock:
+            frame, self._frame = self._frame, None
+        return frame
+
+    def _publish(self, frame):
+        h, w = frame.shape[:2]
+        if w != self.display_width:
+            frame = cv2.resize(frame, (self.display_width, int(h * self.display_width / w)),
+                               interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with self._frame_lock:
+            self._frame = rgb
+
+    def run(self):
+        opened = False
+        try:
+            self.session.open(self)
+            if self.cancelled:
+                return
+            opened = True
+            if not self.source.open():
+                self.post("error", "Impossible d'ouvrir la caméra")
+                return
+            while not self.cancelled:
+                ret, frame = self.source.read()
+                if not ret:
+                    if self.source.finished:
+                        break
+                    continue
+                command = self.source.next_command()
+                if command is None:
+                    try:
+                        command = self._commands.get_nowait()
+                    except queue.Empty:
+                        command = None
+                if command is not None:
+                    self.source.record_command(command)
+                display = self.session.process(self, frame, command)
+                if display is not None and self.display_width:
+                    self._publish(display)
+        except Exception as e:
+            self.post("error", f"Erreur pendant le traitement : {e}")
+        finally:
+            if opened:
+                self.source.release()
+            try:
+                self.session.close()
+            finally:
+                self.post("done")
+
+
+class CameraView:
+    """
+    Zone vidéo Tk alimentée par un CameraWorker : interrogation périodique (after())
+    de l'image courante et des messages, distribués aux `handlers` {kind: callable(payload)}
+    dans le thread Tk.
+    """
+
+    def __init__(self, master, interval=15, **label_options):
+        self.label = tk.Label(master, bg="black", **label_options)
+        self.interval = interval
+        self.worker = None
+        self.handlers = {}
+        self._photo = None
+
+    @property
+    def running(self):
+        return self.worker is not None
+
+    def start(self, worker, handlers):
+        self.worker = worker
+        self.handlers = handlers
+        worker.start()
+        self.label.after(self.interval, self._poll)
+
+    def send(self, command):
+        if self.worker is not None:
+            self.worker.send(command)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def _poll(self):
+        worker = self.worker
+        if worker is None:
+            return
+        frame = worker.latest_frame()
+        if frame is not None:
+            # La référence doit être conservée, sinon Tk affiche une image vide
+            self._photo = ImageTk.PhotoImage(Image.fromarray(frame))
+            self.label.configure(image=self._photo)
+
+        done = False
+        while True:
+            try:
+                kind, payload = worker.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "done":
+                done = True
+                continue
+            handler = self.handlers.get(kind)
+            if handler is not None:
+                handler(payload)
+
+        if done:
+            self.worker = None
+            self._photo = None
+            self.label.configure(image="")
+            if "done" in self.handlers:
+                self.handlers["done"](None)
+            return
+        self.label.after(self.interval, self._poll)
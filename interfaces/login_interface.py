@@ -1,4 +1,5 @@
 import sys
+import argparse
 import cv2
 import re
 import numpy as np
@@ -12,24 +13,36 @@ sys.path.append(str(root))
 sys.path.append(str(root / "interfaces"))
 
 from welcome_interface import show_welcome_screen
+from camera_worker import CameraWorker, CameraView
 from models.face_encoder import FaceEncoder
 from models.face_detector import FaceDetector
+from models.face_recognizer import FaceRecognizer
+from models.face_pipeline import FrameContext
+from models.face_quality import FaceQualityScorer
+from core.continuous_auth import ContinuousAuthenticator
+from core.calibration import recommended_threshold
 from models.age_gender_model import AgeGenderPredictor
-from utils.preprocessing import crop_face
-from database.database_manager import DatabaseManager
+from database.storage import get_database
+from database.write_queue import WriteBehindQueue
+from core.frame_source import open_source
 
-encoder = FaceEncoder()
+# Écritures (tentatives inconnues) différées : la caméra n'attend jamais le réseau
+db = WriteBehindQueue(get_database())
+encoder = FaceEncoder(db=db)
 detector = FaceDetector(detector_type="haar")
-db = DatabaseManager()
+recognizer = FaceRecognizer(encoder=encoder, db=db, detector=detector,
+                            threshold=recommended_threshold("cosine"))
+# Chaque image est convertie, détectée et (si besoin) landmarkée une seule fois
+pipeline = recognizer.pipeline
 
-output_dir = root / "captured_faces"
-output_dir.mkdir(exist_ok=True)
+# Seuil de la capture manuelle (distance euclidienne brute), calibré si un rapport existe
+LOGIN_THRESHOLD = recommended_threshold("euclidean")
 
 unknown_dir = root / "unknown_users"
 unknown_dir.mkdir(exist_ok=True)
 
 
-def save_unknown_face(face_img):
+def save_unknown_face(face_img, distance=None):
     try:
         existing = list(unknown_dir.glob("face_*.jpg"))
         max_idx = 0
@@ -46,6 +59,7 @@ def save_unknown_face(face_img):
         success = cv2.imwrite(str(output_path), face_img)
         if success:
             print(f"💾 Visage non reconnu sauvegardé → {output_path}")
+            db.log_unknown_attempt(str(output_path), distance)
             return str(output_path)
         else:
             print(f"⚠️ Erreur lors de la sauvegarde du visage non reconnu")
@@ -55,200 +69,300 @@ def save_unknown_face(face_img):
         return None
 
 
-def recognize_user():
-    # Initialiser le prédicteur d'âge et genre
-    try:
-        age_gender_predictor = AgeGenderPredictor(model_path=str(root / "models" / "age_gender_model_final_complete.keras"))
-    except Exception as e:
-        print(f"⚠️ Impossible de charger le modèle d'âge/genre : {e}")
-        age_gender_predictor = None
-    
-    # Buffers pour stabiliser les prédictions
-    age_buffer = []
-    gender_buffer = []
-    BUFFER_SIZE = 10
-    
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        messagebox.showerror("Erreur", "Impossible d'ouvrir la caméra")
-        return
-
-    camera_active = True
-    frame_count = 0
-    prediction_finalized = False
-    final_prediction = None
-    no_face_count = 0
-    
-    while camera_active:
-        ret, frame = cap.read()
-        if not ret:
-            continue
-
-        faces, _ = detector.detect_faces(frame)
-        
+class LoginSession:
+    """
+    Session de reconnaissance exécutée dans le thread CameraWorker : détection,
+    âge/genre, mode continu et capture manuelle. Les résultats sont envoyés à Tk
+    par worker.post() ; aucun appel Tk (messagebox, fenêtres) n'est fait ici.
+    """
+
+    def __init__(self):
+        self.age_gender_predictor = None
+        self.age_buffer = []
+        self.gender_buffer = []
+        self.prediction_finalized = False
+        self.final_prediction = None
+        self.no_face_count = 0
+        # Mode continu (touche 'a') : reconnaissance mains libres des visages suivis
+        self.continuous = ContinuousAuthenticator(recognizer, quality=FaceQualityScorer())
+        self.continuous_mode = False
+
+    def open(self, worker):
+        # Initialiser le prédicteur d'âge et genre
+        worker.post("status", "Chargement des modèles…")
+        try:
+            self.age_gender_predictor = AgeGenderPredictor(model_path=str(root / "models" / "age_gender_model_final_complete.keras"))
+        except Exception as e:
+            print(f"⚠️ Impossible de charger le modèle d'âge/genre : {e}")
+            self.age_gender_predictor = None
+        worker.post("status", "Caméra active")
+
+    def close(self):
+        self.continuous.close()
+
+    def _update_age_gender(self, ctx):
+        faces = ctx.boxes
         # Gestion de la réinitialisation si aucun visage n'est détecté
         if len(faces) == 0:
-            no_face_count += 1
-            if no_face_count > 20:  # Environ 1-2 secondes sans visage
-                if prediction_finalized:
+            self.no_face_count += 1
+            if self.no_face_count > 20:  # Environ 1-2 secondes sans visage
+                if self.prediction_finalized:
                     print("🔄 Réinitialisation de la prédiction (plus de visage détecté)")
-                prediction_finalized = False
-                final_prediction = None
-                age_buffer = []
-                gender_buffer = []
-                no_face_count = 0
-        else:
-            no_face_count = 0
-
-        # Si la prédiction n'est pas encore finalisée et qu'on détecte un visage
-        if not prediction_finalized and len(faces) > 0:
-            # Prendre le premier visage détecté
-            x, y, w, h = faces[0]
-            
-            # Prédiction d'âge et genre
-            if age_gender_predictor and age_gender_predictor.model is not None:
-                try:
-                    face_img = crop_face(frame, (x, y, w, h), margin_pct=0.4)
-                    if face_img is not None:
-                        age, gender, _ = age_gender_predictor.predict(face_img)
-                        
-                        if age is not None and gender is not None:
-                            # Ajouter au buffer
-                            age_buffer.append(age)
-                            gender_buffer.append(gender)
-                            
-                            # Si on a atteint 5 échantillons, on fige le résultat
-                            if len(age_buffer) >= 5:
-                                # Calculer la moyenne pour l'âge
-                                avg_age = int(sum(age_buffer) / len(age_buffer))
-                                
-                                # Pour le genre, prendre le plus fréquent
-                                avg_gender = Counter(gender_buffer).most_common(1)[0][0]
-                                
-                                # Figer la prédiction
-                                final_prediction = (avg_age, avg_gender)
-                                prediction_finalized = True
-                                print(f"🔒 Prédiction finalisée : {avg_age} ans, {avg_gender}")
-                                
-                except Exception as e:
-                    print(f"⚠️ Erreur lors de la prédiction : {e}")
-        
-        # Afficher les rectangles et les prédictions pour tous les visages
+                self.prediction_finalized = False
+                self.final_prediction = None
+                self.age_buffer = []
+                self.gender_buffer = []
+                self.no_face_count = 0
+            return
+        self.no_face_count = 0
+
+        # Si la prédiction n'est pas encore finalisée, prendre le premier visage détecté
+        predictor = self.age_gender_predictor
+        if self.prediction_finalized or predictor is None or predictor.model is None:
+            return
+        try:
+            face_img = ctx.crop(0, margin_pct=0.4)
+            if face_img is None:
+                return
+            age, gender, _ = predictor.predict(face_img)
+            if age is None or gender is None:
+                return
+            self.age_buffer.append(age)
+            self.gender_buffer.append(gender)
+
+            # Si on a atteint 5 échantillons, on fige le résultat
+            if len(self.age_buffer) >= 5:
+                avg_age = int(sum(self.age_buffer) / len(self.age_buffer))
+                avg_gender = Counter(self.gender_buffer).most_common(1)[0][0]
+                self.final_prediction = (avg_age, avg_gender)
+                self.prediction_finalized = True
+                print(f"🔒 Prédiction finalisée : {avg_age} ans, {avg_gender}")
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la prédiction : {e}")
+
+    def _draw_faces(self, frame, faces):
         for (x, y, w, h) in faces:
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            
+
             # Afficher la prédiction finale si disponible
-            if final_prediction is not None:
-                avg_age, avg_gender = final_prediction
-                text = f"{avg_age} ans, {avg_gender}"
-                cv2.putText(frame, text, (x, y - 10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            if self.final_prediction is not None:
+                avg_age, avg_gender = self.final_prediction
+                cv2.putText(frame, f"{avg_age} ans, {avg_gender}", (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
             # Sinon afficher "Analyse..." si on est en cours
-            elif not prediction_finalized:
-                 cv2.putText(frame, "Analyse...", (x, y - 10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+            elif not self.prediction_finalized:
+                cv2.putText(frame, "Analyse...", (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+
+    def _continuous_step(self, worker, ctx, display):
+        granted = None
+        # Landmarks du predictor de l'encodeur (le détecteur Haar n'en calcule pas) :
+        # contrôle de pose du FaceQualityScorer, puis réutilisés pour le descripteur
+        pipeline.landmarks(ctx)
+        for track in self.continuous.process(ctx.frame, ctx.boxes, ctx.shapes, gray=ctx.gray):
+            x, y, w, h = track["box"]
+            if track["status"] == "granted":
+                label, color = track["name"] or "Reconnu", (0, 255, 0)
+            elif track["status"] == "denied":
+                label, color = "Non reconnu", (0, 0, 255)
+            else:
+                label, color = "Identification...", (0, 255, 255)
+            cv2.putText(display, label, (x, y + h + 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
 
-        cv2.putText(frame, "Appuyez sur 'c' pour capturer", (10, 30),
+        for _, state in self.continuous.pop_decisions():
+            if state["status"] == "granted":
+                granted = state
+                break
+            if state["crop"] is not None:
+                save_unknown_face(state["crop"], state["distance"])
+
+        if granted is not None:
+            print(f"✅ Accès accordé (mode continu) : {granted['name']} (distance={granted['distance']:.3f})")
+            worker.post("granted", granted["name"] or "Utilisateur inconnu")
+            worker.cancel()
+
+    def _capture(self, worker, ctx):
+        """Capture manuelle : encodage + comparaison à la galerie (dans le worker)."""
+        if not ctx.boxes:
+            worker.post("warning", "Aucun visage détecté !")
+            return
+
+        face_img = ctx.crop(0, margin=10)
+        if face_img is None:
+            worker.post("warning", "Impossible de découper le visage.")
+            return
+
+        worker.post("status", "Identification en cours…")
+
+        # Descripteur à partir de la détection de l'image (pas de relecture ni de HOG)
+        pipeline.describe(ctx, indices=[0])
+        if not ctx.described:
+            worker.post("error", "Impossible de lire le visage.")
+            worker.cancel()
+            return
+        emb = ctx.embeddings[0]
+
+        gallery, _ = db.get_gallery()
+        if gallery is None or len(gallery) == 0:
+            worker.post("error", "Aucun utilisateur enregistré.")
+            worker.cancel()
+            return
+        if worker.cancelled:
+            return
+
+        dists = np.linalg.norm(gallery.embeddings - np.asarray(emb, dtype=np.float32), axis=1)
+        best_row = int(np.argmin(dists))
+        best_score = float(dists[best_row])
+        best_user_id = str(gallery.user_ids[gallery.row_user[best_row]])
+
+        if best_user_id and best_score < LOGIN_THRESHOLD:
+            user_info = db.get_user_by_id(best_user_id)
+            if user_info and "name" in user_info:
+                username = user_info["name"]
+            else:
+                username = "Utilisateur inconnu"
+            worker.post("granted", username)
+        else:
+            save_unknown_face(face_img, best_score)
+            worker.post("denied", "Utilisateur non reconnu")
+        worker.cancel()
+
+    def process(self, worker, frame, command):
+        ctx = pipeline.detect(FrameContext(frame))
+        self._update_age_gender(ctx)
+        # Dessins sur une copie : crops et descripteurs lisent l'image d'origine
+        display = frame.copy()
+        self._draw_faces(display, ctx.boxes)
+
+        if command == "toggle_continuous":
+            self.continuous_mode = not self.continuous_mode
+            self.continuous.reset()
+            worker.post("status", "Mode continu activé" if self.continuous_mode else "Mode continu désactivé")
+
+        if self.continuous_mode:
+            self._continuous_step(worker, ctx, display)
+
+        hint = "Mode continu actif ('a' pour desactiver)" if self.continuous_mode else "'c' = capture, 'a' = mode continu, Echap = annuler"
+        cv2.putText(display, hint, (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
 
-        cv2.imshow("Login - Reconnaissance Faciale", frame)
-        key = cv2.waitKey(1) & 0xFF
+        if command == "capture" and not worker.cancelled:
+            self._capture(worker, ctx)
+        return display
 
-        if key == ord("c"):
 
-            if len(faces) == 0:
-                messagebox.showwarning("Attention", "Aucun visage détecté !")
-                continue
+DESCRIPTION = "Login par reconnaissance faciale"
 
-            x, y, w, h = faces[0]
-            face_img = crop_face(frame, (x, y, w, h), margin=10)
-            
-            if face_img is None:
-                messagebox.showerror("Erreur", "Impossible de découper le visage.")
-                continue
-
-            img_path = str(output_dir / "face_1.jpg")
-            try:
-                written = cv2.imwrite(img_path, face_img)
-            except Exception as e:
-                written = False
-                print(f"Erreur lors de l'écriture du fichier : {e}")
-
-            if not written:
-                messagebox.showerror("Erreur", f"Impossible de sauvegarder l'image : {img_path}")
-                print(f" cv2.imwrite a échoué pour {img_path}")
-                continue
-
-            print(f" Visage capturé et sauvegardé → {img_path}")
-
-            emb = encoder.encode_face(img_path, user_id=None)
-            if emb is None:
-                messagebox.showerror("Erreur", "Impossible de lire le visage.")
-                camera_active = False
-                break
 
-            rows = db.get_all_embeddings()
-            if not rows:
-                messagebox.showerror("Erreur", "Aucun utilisateur enregistré.")
-                camera_active = False
-                break
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--camera", type=int, default=0, help="Index de la webcam")
+    parser.add_argument("--record", help="Enregistre chaque session (images, horodatages, touches) dans ce fichier .npz")
+    parser.add_argument("--replay", help="Rejoue un enregistrement au lieu de la webcam")
+    args = parser.parse_args(argv)
 
-            best_score = 9999
-            best_user_id = None
+    root_tk = tk.Tk()
+    root_tk.title("🔑 Login - Face Authentication")
+    root_tk.geometry("700x760")
+    root_tk.configure(bg="#f0f0f5")
 
-            for user in rows:
-                try:
-                    db_emb = np.array(user["embedding"])
-                    uid = user["user_id"]
+    style = ttk.Style()
+    style.configure("TButton", font=("Segoe UI", 12, "bold"), padding=10)
+    style.configure("Title.TLabel", font=("Segoe UI", 18, "bold"), background="#f0f0f5")
+    style.configure("Normal.TLabel", font=("Segoe UI", 11), background="#f0f0f5")
 
-                    dist = np.linalg.norm(emb - db_emb)
-                    if dist < best_score:
-                        best_score = dist
-                        best_user_id = uid
-                except Exception as e:
-                    print("[ERREUR]", e)
-                    continue
+    ttk.Label(root_tk, text="Login via Reconnaissance Faciale", style="Title.TLabel").pack(pady=15)
 
-            if best_user_id and best_score < 0.45:
+    # Vidéo affichée dans la fenêtre : la caméra tourne dans un CameraWorker
+    video = CameraView(root_tk)
+    video.label.pack(pady=5)
 
-                user_info = db.get_user_by_id(best_user_id)
+    status_label = ttk.Label(root_tk, text="En attente…", style="Normal.TLabel")
+    status_label.pack(pady=5)
 
-                if user_info and "name" in user_info:
-                    username = user_info["name"]
-                else:
-                    username = "Utilisateur inconnu"
-                show_welcome_screen(username)
+    buttons = tk.Frame(root_tk, bg="#f0f0f5")
+    buttons.pack(pady=10)
 
-            else:
-                save_unknown_face(face_img)
-                messagebox.showerror("Accès Refusé", "Utilisateur non reconnu")
-            camera_active = False
-            break
 
-        elif key == 27: 
-            camera_active = False
-            break
+    # Issue de la session en cours (un résultat final ne doit pas être effacé à l'arrêt)
+    session_outcome = {"final": False}
+
+
+    def set_status(text):
+        status_label.configure(text=text)
+
+
+    def on_granted(username):
+        session_outcome["final"] = True
+        set_status(f"Accès accordé : {username}")
+        show_welcome_screen(username, parent=root_tk)
+
+
+    def on_denied(message):
+        session_outcome["final"] = True
+        set_status("Accès refusé")
+        messagebox.showerror("Accès Refusé", message)
+
+
+    def on_error(message):
+        session_outcome["final"] = True
+        set_status("Erreur")
+        messagebox.showerror("Erreur", message)
+
+
+    def on_done(_):
+        start_button.state(["!disabled"])
+        if not session_outcome["final"]:
+            set_status("En attente…")
+
+
+    def recognize_user():
+        if video.running:
+            return
+        start_button.state(["disabled"])
+        session_outcome["final"] = False
+        video.start(CameraWorker(LoginSession(), source=open_source(args.camera, record=args.record, replay=args.replay)), {
+            "status": set_status,
+            "warning": lambda message: messagebox.showwarning("Attention", message),
+            "error": on_error,
+            "granted": on_granted,
+            "denied": on_denied,
+            "done": on_done,
+        })
+
+
+    def cancel_recognition(_event=None):
+        if video.running:
+            set_status("Annulation…")
+            video.cancel()
+
 
-    cap.release()
-    cv2.destroyAllWindows()
-    cv2.waitKey(1)  # Permet à OpenCV de traiter la fermeture
+    def quit_app():
+        video.cancel()
+        root_tk.quit()
 
 
-root_tk = tk.Tk()
-root_tk.title("🔑 Login - Face Authentication")
-root_tk.geometry("700x600")
-root_tk.configure(bg="#f0f0f5")
+    start_button = ttk.Button(buttons, text="🔍 Lancer la Reconnaissance", command=recognize_user)
+    start_button.grid(row=0, column=0, padx=5)
+    ttk.Button(buttons, text="📸 Capturer (C)", command=lambda: video.send("capture")).grid(row=0, column=1, padx=5)
+    ttk.Button(buttons, text="🔁 Mode continu (A)", command=lambda: video.send("toggle_continuous")).grid(row=0, column=2, padx=5)
+    ttk.Button(buttons, text="⏹ Annuler (Échap)", command=cancel_recognition).grid(row=1, column=0, columnspan=3, pady=8)
 
-style = ttk.Style()
-style.configure("TButton", font=("Segoe UI", 12, "bold"), padding=10)
-style.configure("Title.TLabel", font=("Segoe UI", 18, "bold"), background="#f0f0f5")
+    root_tk.bind("<KeyPress-c>", lambda _event: video.send("capture"))
+    root_tk.bind("<KeyPress-a>", lambda _event: video.send("toggle_continuous"))
+    root_tk.bind("<Escape>", cancel_recognition)
+    root_tk.protocol("WM_DELETE_WINDOW", quit_app)
 
-ttk.Label(root_tk, text="Login via Reconnaissance Faciale", style="Title.TLabel").pack(pady=20)
+    tk.Button(root_tk, text="❌ Quitter", bg="#D9534F", fg="white",
+              font=("Segoe UI", 13, "bold"), command=quit_app).pack(pady=10)
 
-ttk.Button(root_tk, text="🔍 Lancer la Reconnaissance",
-           command=recognize_user).pack(pady=30)
+    root_tk.mainloop()
+    if video.worker is not None:
+        video.worker.join(timeout=5)
+    detector.close()
+    db.close()
 
-tk.Button(root_tk, text="❌ Quitter", bg="#D9534F", fg="white",
-          font=("Segoe UI", 13, "bold"), command=root_tk.quit).pack(pady=20)
 
-root_tk.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import sys
+import uuid
+import argparse
 from pathlib import Path
 import cv2
+import numpy as np
 import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
@@ -9,197 +12,327 @@ from collections import Counter
 
 root = Path(__file__).resolve().parents[1]
 sys.path.append(str(root))
+sys.path.append(str(root / "interfaces"))
 
 from models.face_encoder import FaceEncoder
 from models.face_detector import FaceDetector
+from models.face_recognizer import FaceRecognizer
+from models.face_pipeline import FrameContext
+from core.calibration import recommended_threshold
 from models.age_gender_model import AgeGenderPredictor
-from utils.preprocessing import crop_face
-from database.database_manager import DatabaseManager
+from database.storage import get_database
+from database.write_queue import WriteBehindQueue
+from core.frame_source import open_source
+from core.gallery_compaction import GalleryCompactor
+from camera_worker import CameraWorker, CameraView
 
-encoder = FaceEncoder()
+# Création d'utilisateur et embeddings différés : ni l'ouverture de la caméra ni la
+# capture n'attendent l'aller-retour réseau (journal local rejoué en cas de coupure)
+db_manager = WriteBehindQueue(get_database())
+encoder = FaceEncoder(db=db_manager)
 detector = FaceDetector(detector_type="haar")
-db_manager = DatabaseManager()
-
-output_dir = root / "captured_faces"
-output_dir.mkdir(exist_ok=True)
-face_count = len(list(output_dir.glob("face_*"))) + 1
-
-def open_camera_and_capture(username=None):
-    global face_count
-    
-    if not username or username.strip() == "":
-        messagebox.showerror("Erreur", "Veuillez entrer votre nom")
-        return
-    
-    user_id = db_manager.create_user(username.strip())
-    if not user_id:
-        messagebox.showerror("Erreur", "Impossible de créer l'utilisateur")
-        return
-    
-    
-    # Initialiser le prédicteur d'âge et genre
-    try:
-        age_gender_predictor = AgeGenderPredictor(model_path=str(root / "models" / "age_gender_model_final_complete.keras"))
-    except Exception as e:
-        print(f"⚠️ Impossible de charger le modèle d'âge/genre : {e}")
-        age_gender_predictor = None
-    
-    # Buffers pour stabiliser les prédictions
-    age_buffer = []
-    gender_buffer = []
-    BUFFER_SIZE = 10
-    
-    cap = cv2.VideoCapture(0)
-
-    if not cap.isOpened():
-        messagebox.showerror("Erreur", "Impossible d'ouvrir la caméra")
-        return
-
-    camera_active = True
-    frame_count = 0
-    prediction_finalized = False
-    final_prediction = None
-    no_face_count = 0
-    
-    while camera_active:
-        ret, frame = cap.read()
-        if not ret:
-            continue
-
-        faces, _ = detector.detect_faces(frame)
+# Recherche des doublons : un visage déjà inscrit n'entraîne pas la création d'un nouvel utilisateur
+recognizer = FaceRecognizer(encoder=encoder, db=db_manager, detector=detector,
+                            threshold=recommended_threshold("cosine"))
+# Chaque image est convertie, détectée et landmarkée une seule fois
+pipeline = recognizer.pipeline
+# Après chaque inscription, l'utilisateur est ramené à K embeddings représentatifs
+compactor = GalleryCompactor(db=db_manager, recognizer=recognizer)
 
+# Embeddings inscrits par ce processus et pas encore dans la galerie en mémoire (file
+# d'écriture ou prochain rafraîchissement) : comparés en plus de la galerie à la
+# capture, qui n'attend ainsi ni la file ni un rechargement
+local_rows = []
+
+
+def unsynced_rows():
+    """Inscriptions locales absentes de la galerie en mémoire (les autres sont oubliées)."""
+    gallery = recognizer.gallery
+    if gallery is not None and local_rows:
+        synced = np.isin([row["id"] for row in local_rows], gallery.row_ids)
+        local_rows[:] = [row for row, done in zip(local_rows, synced) if not done]
+    return list(local_rows)
+
+
+class RegisterSession:
+    """
+    Session d'inscription exécutée dans le thread CameraWorker : détection, âge/genre
+    et capture des embeddings. L'utilisateur n'est créé qu'à la capture, et seulement si
+    le visage n'est pas déjà dans la galerie (sinon les embeddings sont rattachés à
+    l'utilisateur existant) : ni doublon d'identité, ni utilisateur sans embedding.
+    Les résultats sont envoyés à Tk par worker.post().
+    """
+
+    def __init__(self, username):
+        self.username = username
+        self.user_id = None
+        self.age_gender_predictor = None
+        self.age_buffer = []
+        self.gender_buffer = []
+        self.prediction_finalized = False
+        self.final_prediction = None
+        self.no_face_count = 0
+
+    def open(self, worker):
+        # Galerie chargée puis synchronisée en tâche de fond (sans effet si déjà lancé)
+        recognizer.start_auto_refresh()
+        # Initialiser le prédicteur d'âge et genre
+        worker.post("status", "Chargement des modèles…")
+        try:
+            self.age_gender_predictor = AgeGenderPredictor(model_path=str(root / "models" / "age_gender_model_final_complete.keras"))
+        except Exception as e:
+            print(f"⚠️ Impossible de charger le modèle d'âge/genre : {e}")
+            self.age_gender_predictor = None
+        worker.post("status", f"Caméra active — inscription de {self.username}")
+
+    def close(self):
+        pass
+
+    def _update_age_gender(self, ctx):
+        faces = ctx.boxes
         # Gestion de la réinitialisation si aucun visage n'est détecté
         if len(faces) == 0:
-            no_face_count += 1
-            if no_face_count > 20:  # Environ 1-2 secondes sans visage
-                if prediction_finalized:
+            self.no_face_count += 1
+            if self.no_face_count > 20:  # Environ 1-2 secondes sans visage
+                if self.prediction_finalized:
                     print("🔄 Réinitialisation de la prédiction (plus de visage détecté)")
-                prediction_finalized = False
-                final_prediction = None
-                age_buffer = []
-                gender_buffer = []
-                no_face_count = 0
-        else:
-            no_face_count = 0
-
-        # Si la prédiction n'est pas encore finalisée et qu'on détecte un visage
-        if not prediction_finalized and len(faces) > 0:
-            # Prendre le premier visage détecté
-            x, y, w, h = faces[0]
-            
-            # Prédiction d'âge et genre
-            if age_gender_predictor and age_gender_predictor.model is not None:
-                try:
-                    face_img = crop_face(frame, (x, y, w, h), margin_pct=0.4)
-                    if face_img is not None:
-                        age, gender, _ = age_gender_predictor.predict(face_img)
-                        
-                        if age is not None and gender is not None:
-                            # Ajouter au buffer
-                            age_buffer.append(age)
-                            gender_buffer.append(gender)
-                            
-                            # Si on a atteint 5 échantillons, on fige le résultat
-                            if len(age_buffer) >= 5:
-                                # Calculer la moyenne pour l'âge
-                                avg_age = int(sum(age_buffer) / len(age_buffer))
-                                
-                                # Pour le genre, prendre le plus fréquent
-                                avg_gender = Counter(gender_buffer).most_common(1)[0][0]
-                                
-                                # Figer la prédiction
-                                final_prediction = (avg_age, avg_gender)
-                                prediction_finalized = True
-                                print(f"🔒 Prédiction finalisée : {avg_age} ans, {avg_gender}")
-                                
-                except Exception as e:
-                    print(f"⚠️ Erreur lors de la prédiction : {e}")
-        
-        # Afficher les rectangles et les prédictions pour tous les visages
+                self.prediction_finalized = False
+                self.final_prediction = None
+                self.age_buffer = []
+                self.gender_buffer = []
+                self.no_face_count = 0
+            return
+        self.no_face_count = 0
+
+        # Si la prédiction n'est pas encore finalisée, prendre le premier visage détecté
+        predictor = self.age_gender_predictor
+        if self.prediction_finalized or predictor is None or predictor.model is None:
+            return
+        try:
+            face_img = ctx.crop(0, margin_pct=0.4)
+            if face_img is None:
+                return
+            age, gender, _ = predictor.predict(face_img)
+            if age is None or gender is None:
+                return
+            self.age_buffer.append(age)
+            self.gender_buffer.append(gender)
+
+            # Si on a atteint 5 échantillons, on fige le résultat
+            if len(self.age_buffer) >= 5:
+                avg_age = int(sum(self.age_buffer) / len(self.age_buffer))
+                avg_gender = Counter(self.gender_buffer).most_common(1)[0][0]
+                self.final_prediction = (avg_age, avg_gender)
+                self.prediction_finalized = True
+                print(f"🔒 Prédiction finalisée : {avg_age} ans, {avg_gender}")
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la prédiction : {e}")
+
+    def _draw_faces(self, frame, faces):
         for (x, y, w, h) in faces:
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            
+
             # Afficher la prédiction finale si disponible
-            if final_prediction is not None:
-                avg_age, avg_gender = final_prediction
-                text = f"{avg_age} ans, {avg_gender}"
-                cv2.putText(frame, text, (x, y - 10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            if self.final_prediction is not None:
+                avg_age, avg_gender = self.final_prediction
+                cv2.putText(frame, f"{avg_age} ans, {avg_gender}", (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
             # Sinon afficher "Analyse..." si on est en cours
-            elif not prediction_finalized:
-                 cv2.putText(frame, "Analyse...", (x, y - 10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+            elif not self.prediction_finalized:
+                cv2.putText(frame, "Analyse...", (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
 
-        cv2.putText(frame, f"Visages detectes: {len(faces)}  | 'c'=capture, ESC=quit",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,0,0), 2)
+    def _capture(self, worker, ctx):
+        """Encodage, recherche dans la galerie puis enregistrement (dans le worker)."""
+        if not ctx.boxes:
+            worker.post("warning", "Aucun visage détecté !")
+            return
 
-        cv2.imshow("Authentification Caméra", frame)
+        worker.post("status", "Enregistrement en cours…")
+        # Descripteurs à partir de la détection de l'image (aucune écriture en base)
+        pipeline.describe(ctx)
+        embeddings = [ctx.embeddings[i] for i in ctx.described]
+        if not embeddings:
+            worker.post("enrolled", {"saved": 0, "name": self.username, "existing": False})
+            worker.cancel()
+            return
 
-        key = cv2.waitKey(1) & 0xFF
+        # Galerie en mémoire + inscriptions locales pas encore synchronisées
+        matches = recognizer.match_embeddings(np.array(embeddings), extra_rows=unsynced_rows())
 
-        if key == ord("c"):
-            if len(faces) == 0:
-                messagebox.showwarning("Attention", "Aucun visage détecté !")
+        saved = 0
+        owners = set()
+        existing = []
+        for embedding, match in zip(embeddings, matches):
+            if match["recognized"]:
+                user_id = match["user_id"]
+                existing.append(match["name"] or self.username)
+                print(f"ℹ️ Visage déjà inscrit ({existing[-1]}, distance={match['distance']:.3f}) : embedding rattaché")
             else:
-                for (x, y, w, h) in faces:
-                    face_img = crop_face(frame, (x, y, w, h), margin=10)
-                    if face_img is not None:
-                        file_path = output_dir / "face_1.jpg"
-                        try:
-                            written = cv2.imwrite(str(file_path), face_img)
-                        except Exception as e:
-                            written = False
-                            print(f"❌ Erreur lors de l'écriture du fichier : {e}")
+                if self.user_id is None:
+                    self.user_id = db_manager.create_user(self.username)
+                    if not self.user_id:
+                        worker.post("error", "Impossible de créer l'utilisateur")
+                        break
+                user_id = self.user_id
+            row_id = str(uuid.uuid4())
+            if db_manager.save_face_embeddings([{"id": row_id, "user_id": user_id, "embedding": embedding}]):
+                local_rows.append({
+                    "id": row_id,
+                    "user_id": user_id,
+                    "name": match["name"] if match["recognized"] else self.username,
+                    "embedding": embedding,
+                })
+                saved += 1
+                owners.add(user_id)
+                print("Embedding généré et enregistré dans la base de données !")
+
+        for user_id in owners:
+            compactor.schedule(user_id)
+        # "existing" : tous les visages étaient déjà inscrits, aucun utilisateur créé
+        worker.post("enrolled", {
+            "saved": saved,
+            "name": existing[0] if existing and self.user_id is None else self.username,
+            "existing": bool(existing) and self.user_id is None,
+        })
+        worker.cancel()
+
+    def process(self, worker, frame, command):
+        ctx = pipeline.detect(FrameContext(frame))
+        self._update_age_gender(ctx)
+        # Dessins sur une copie : les descripteurs lisent l'image d'origine
+        display = frame.copy()
+        self._draw_faces(display, ctx.boxes)
+
+        cv2.putText(display, f"Visages detectes: {len(ctx.boxes)}  | 'c'=capture, Echap=annuler",
+                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+
+        if command == "capture" and not worker.cancelled:
+            self._capture(worker, ctx)
+        return display
+
+
+DESCRIPTION = "Inscription par reconnaissance faciale"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--camera", type=int, default=0, help="Index de la webcam")
+    parser.add_argument("--record", help="Enregistre chaque session (images, horodatages, touches) dans ce fichier .npz")
+    parser.add_argument("--replay", help="Rejoue un enregistrement au lieu de la webcam")
+    args = parser.parse_args(argv)
+
+    root_tk = tk.Tk()
+    root_tk.title("🔐 Face Authentication AI")
+    root_tk.geometry("700x820")
+    root_tk.configure(bg="#f0f0f5")
+
+    style = ttk.Style()
+    style.configure("TButton", font=("Segoe UI", 12, "bold"), padding=10)
+    style.configure("Title.TLabel", font=("Segoe UI", 18, "bold"), background="#f0f0f5")
+    style.configure("Normal.TLabel", font=("Segoe UI", 11), background="#f0f0f5")
+
+
+    ttk.Label(root_tk, text="FACE SECURITY", style="Title.TLabel").pack(pady=15)
+
+    ttk.Label(root_tk, text="Entrez votre nom et lancez la capture", style="Normal.TLabel").pack(pady=5)
+
+    username_label = ttk.Label(root_tk, text="Nom d'utilisateur :", style="Normal.TLabel")
+    username_label.pack(pady=5)
+    username_entry = ttk.Entry(root_tk, width=30, font=("Segoe UI", 11))
+    username_entry.pack(pady=5, padx=20)
+
+    # Vidéo affichée dans la fenêtre : la caméra tourne dans un CameraWorker
+    video = CameraView(root_tk)
+    video.label.pack(pady=5)
+
+    # Issue de la session en cours (un résultat final ne doit pas être effacé à l'arrêt)
+    session_outcome = {"final": False}
+
+
+    def set_status(text):
+        status_label.configure(text=text)
+
+
+    def on_enrolled(result):
+        session_outcome["final"] = True
+        if result["existing"]:
+            set_status(f"✅ Visage déjà inscrit : {result['saved']} embedding(s) ajouté(s) à {result['name']}")
+            messagebox.showinfo("Déjà inscrit", f"Ce visage est déjà inscrit sous le nom « {result['name']} ».\n"
+                                                "Les captures ont été ajoutées à ce compte.")
+        elif result["saved"]:
+            set_status(f"✅ {result['saved']} embedding(s) enregistré(s)")
+        else:
+            set_status("Aucun embedding enregistré")
+            messagebox.showerror("Erreur", "Impossible de lire le visage.")
+
+
+    def on_error(message):
+        session_outcome["final"] = True
+        set_status("Erreur")
+        messagebox.showerror("Erreur", message)
+
 
-                        if written:
-                            print(f"[DEBUG] Image écrite avec succès: {file_path}")
+    def on_done(_):
+        start_button.state(["!disabled"])
+        if not session_outcome["final"]:
+            set_status("En attente…")
 
-                            embedding = encoder.encode_face(str(file_path), user_id=user_id)
-                            if embedding is not None:
-                                print( "Embedding généré et enregistré dans la base de données !")
-                        else:
-                            messagebox.showerror("Erreur", "La capture n'a pas pu être sauvegardée (cv2.imwrite a renvoyé False)")
-                            print("[DEBUG] cv2.imwrite a renvoyé False — vérifiez les permissions du dossier ou le format de l'image")
-            camera_active = False
-            break
 
-        elif key == 27:
-            camera_active = False
-            break
+    def start_capture():
+        if video.running:
+            return
+        username = username_entry.get()
+        if not username or username.strip() == "":
+            messagebox.showerror("Erreur", "Veuillez entrer votre nom")
+            return
+        start_button.state(["disabled"])
+        session_outcome["final"] = False
+        video.start(CameraWorker(RegisterSession(username.strip()), source=open_source(args.camera, record=args.record, replay=args.replay)), {
+            "status": set_status,
+            "warning": lambda message: messagebox.showwarning("Attention", message),
+            "error": on_error,
+            "enrolled": on_enrolled,
+            "done": on_done,
+        })
 
-    cap.release()
-    cv2.destroyAllWindows()
-    cv2.waitKey(1)
 
-root_tk = tk.Tk()
-root_tk.title("🔐 Face Authentication AI")
-root_tk.geometry("700x600")
-root_tk.configure(bg="#f0f0f5")
+    def cancel_capture(_event=None):
+        if video.running:
+            set_status("Annulation…")
+            video.cancel()
 
-style = ttk.Style()
-style.configure("TButton", font=("Segoe UI", 12, "bold"), padding=10)
-style.configure("Title.TLabel", font=("Segoe UI", 18, "bold"), background="#f0f0f5")
-style.configure("Normal.TLabel", font=("Segoe UI", 11), background="#f0f0f5")
 
+    def quit_app():
+        video.cancel()
+        root_tk.quit()
 
-ttk.Label(root_tk, text="FACE SECURITY", style="Title.TLabel").pack(pady=15)
 
-ttk.Label(root_tk, text="Entrez votre nom et lancez la capture", style="Normal.TLabel").pack(pady=5)
+    buttons = tk.Frame(root_tk, bg="#f0f0f5")
+    buttons.pack(pady=10)
+    start_button = ttk.Button(buttons, text="📸 Lancer la Capture", command=start_capture)
+    start_button.grid(row=0, column=0, padx=5)
+    ttk.Button(buttons, text="📷 Capturer (C)", command=lambda: video.send("capture")).grid(row=0, column=1, padx=5)
+    ttk.Button(buttons, text="⏹ Annuler (Échap)", command=cancel_capture).grid(row=0, column=2, padx=5)
 
-username_label = ttk.Label(root_tk, text="Nom d'utilisateur :", style="Normal.TLabel")
-username_label.pack(pady=5)
-username_entry = ttk.Entry(root_tk, width=30, font=("Segoe UI", 11))
-username_entry.pack(pady=5, padx=20)
+    # Raccourcis clavier hors du champ de saisie (sinon 'c' serait tapé dans le nom)
+    root_tk.bind("<KeyPress-c>", lambda event: video.send("capture") if event.widget is not username_entry else None)
+    root_tk.bind("<Escape>", cancel_capture)
+    root_tk.protocol("WM_DELETE_WINDOW", quit_app)
 
-def start_capture():
-    username = username_entry.get()
-    open_camera_and_capture(username)
+    status_label = ttk.Label(root_tk, text="En attente…", style="Normal.TLabel")
+    status_label.pack(pady=10)
 
-ttk.Button(root_tk, text="📸 Lancer la Capture", command=start_capture).pack(pady=25)
+    ttk.Label(root_tk, text="© 2025 - Secure AI Systems", style="Normal.TLabel").pack(side="bottom", pady=10)
 
-status_label = ttk.Label(root_tk, text="En attente…", style="Normal.TLabel")
-status_label.pack(pady=10)
+    root_tk.mainloop()
+    if video.worker is not None:
+        video.worker.join(timeout=5)
+    compactor.close()
+    recognizer.close()
+    detector.close()
+    db_manager.close()
 
-ttk.Label(root_tk, text="© 2025 - Secure AI Systems", style="Normal.TLabel").pack(side="bottom", pady=10)
 
-root_tk.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
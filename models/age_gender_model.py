@@ -1,8 +1,11 @@
-import cv2
-import numpy as np
-import random
+import sys
+from pathlib import Path
 from keras.models import load_model
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.preprocessing import PreprocessBuffer
+
 class AgeGenderPredictor:
     def __init__(self, model_path="age_gender_model_final_complete.keras"):
         if model_path:
@@ -16,18 +19,31 @@ class AgeGenderPredictor:
             self.model = None
 
         self.input_shape = (224, 224, 3)
+
+        # Buffers de prétraitement réutilisés d'une image à l'autre (pas d'allocation par frame)
+        self._buffer = PreprocessBuffer(size=self.input_shape[:2][::-1], batch_size=1)
         
         # Seuil de confiance pour inverser la prédiction (ex: 45%)
         self.confidence_threshold = 0.45
 
     def preprocess_face(self, face_img):
-        if face_img is None:
+        """Lot (1, 224, 224, 3) float32 RGB ; vue sur un buffer réécrit à l'appel suivant."""
+        if face_img is None or face_img.size == 0:
             return None
-        face_img = cv2.resize(face_img, (224, 224))
-        face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-        face_img = face_img.astype('float32') / 255.0
-        face_img = np.expand_dims(face_img, axis=0)
-        return face_img
+        return self._buffer.fill([face_img])
+
+    def preprocess_faces(self, face_imgs):
+        """Lot (N, 224, 224, 3) pour plusieurs visages (crops vides ignorés), dans le même buffer réutilisable."""
+        face_imgs = [f for f in face_imgs if f is not None and f.size > 0]
+        if not face_imgs:
+            return None
+        return self._buffer.fill(face_imgs)
+
+    def _decode(self, age_pred, gender_pred, i=0):
+        age = max(0, min(116, int(age_pred[i][0] * 116)))
+        gender_prob = float(gender_pred[i][0])
+        gender = "Femme" if gender_prob > 0.5 else "Homme"
+        return age, gender, gender_prob
 
     def predict(self, face_img):
         if self.model is None:
@@ -38,9 +54,23 @@ class AgeGenderPredictor:
             return None, None, None
 
         age_pred, gender_pred = self.model.predict(face_pixels, verbose=0)
-        age = max(0, min(116, int(age_pred[0][0] * 116)))
-        gender_prob = float(gender_pred[0][0])
+        return self._decode(age_pred, gender_pred)
 
-        gender = "Femme" if gender_prob > 0.5 else "Homme"
+    def predict_batch(self, face_imgs):
+        """
+        Prédit âge/genre de plusieurs visages en un seul appel au modèle.
+        Un résultat par crop, dans l'ordre reçu : (None, None, None) pour un crop vide.
+        """
+        if self.model is None:
+            raise ValueError("Aucun modèle chargé !")
 
-        return age, gender, gender_prob
\ No newline at end of file
+        results = [(None, None, None)] * len(face_imgs)
+        kept = [i for i, f in enumerate(face_imgs) if f is not None and f.size > 0]
+        face_pixels = self.preprocess_faces([face_imgs[i] for i in kept])
+        if face_pixels is None:
+            return results
+
+        age_pred, gender_pred = self.model.predict(face_pixels, verbose=0)
+        for j, i in enumerate(kept):
+            results[i] = self._decode(age_pred, gender_pred, j)
+        return results
\ No newline at end of file
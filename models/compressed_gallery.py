@@ -0,0 +1,182 @@
+import tempfile
+import numpy as np
+from pathlib import Path
+
+
+COMPRESSION_DTYPES = ("float16", "int8")
+
+# Taille des blocs lors du balayage de la matrice compressée
+# (évite de décompresser toute la galerie en float32 d'un coup)
+SCAN_BLOCK = 65536
+
+
+def quantize(vectors, dtype="float16"):
+    """
+    Compresse une matrice (N, D) de descripteurs.
+    - float16 : conversion directe, scales = None
+    - int8    : une échelle par vecteur (max|x| / 127), codes arrondis dans [-127, 127]
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"dtype de compression inconnu : {dtype} (attendu : {COMPRESSION_DTYPES})")
+
+
+def dequantize(codes, scales=None):
+    """Inverse de quantize (approximation float32)."""
+    out = codes.astype(np.float32)
+    if scales is not None:
+        out *= scales[:, None]
+    return out
+
+
+class CompressedGallery:
+    """
+    Galerie compressée : matrice float16/int8 balayée en premier, puis re-classement
+    exact en float32 des meilleurs candidats.
+
+    Les vecteurs exacts (bruts) sont conservés dans un fichier mappé en mémoire
+    (np.memmap) : seules les lignes re-classées sont lues, le reste reste sur disque /
+    dans le cache du système, ce qui réduit l'empreinte RAM à la matrice compressée.
+
+    vectors : (M, D) descripteurs bruts (normalisés ici si metric == "cosine")
+    owners  : (M,) index de l'utilisateur propriétaire de chaque ligne
+    """
+
+    __slots__ = ("dtype", "metric", "owners", "codes", "scales", "sq_norms", "_file", "exact")
+
+    def __init__(self, vectors, owners, dtype="float16", metric="cosine", cache_dir=None):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.dtype = dtype
+        self.metric = metric
+        self.owners = np.asarray(owners, dtype=np.int32)
+        self.codes, self.scales = quantize(self._prepare(vectors), dtype)
+
+        # Normes au carré (euclidienne) : ||q - x||² = ||q||² + ||x||² - 2 q·x
+        self.sq_norms = None
+        if metric != "cosine":
+            self.sq_norms = np.empty(len(vectors), dtype=np.float32)
+            for start in range(0, len(vectors), SCAN_BLOCK):
+                block = dequantize(*self._block(start))
+                self.sq_norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+
+        if cache_dir is not None:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self._file = tempfile.TemporaryFile(dir=cache_dir)
+        if len(vectors):
+            self._file.truncate(vectors.nbytes)
+            self.exact = np.memmap(self._file, dtype=np.float32, mode="r+", shape=vectors.shape)
+            self.exact[:] = vectors
+            self.exact.flush()
+        else:
+            self.exact = np.zeros((0, vectors.shape[1] if vectors.ndim == 2 else 128), dtype=np.float32)
+
+    def _prepare(self, vectors):
+        if self.metric != "cosine" or len(vectors) == 0:
+            return vectors
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _block(self, start):
+        end = start + SCAN_BLOCK
+        scales = self.scales[start:end] if self.scales is not None else None
+        return self.codes[start:end], scales
+
+    def nbytes(self):
+        """Mémoire résidente de la galerie compressée (hors fichier mappé)."""
+        total = self.codes.nbytes + self.owners.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        if self.sq_norms is not None:
+            total += self.sq_norms.nbytes
+        return total
+
+    def _exact_distances(self, query, rows):
+        cand = self._prepare(np.asarray(self.exact[np.sort(rows)], dtype=np.float32))
+        order = np.argsort(rows)
+        dist = np.empty(len(rows), dtype=np.float32)
+        if self.metric == "cosine":
+            dist[order] = 1.0 - cand @ query
+        else:
+            dist[order] = np.linalg.norm(cand - query, axis=1)
+        return dist
+
+    def approximate_distances(self, query):
+        """Distances approchées de la requête vers toutes les lignes (balayage par blocs)."""
+        query = np.asarray(query, dtype=np.float32)
+        dist = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_BLOCK):
+            codes, scales = self._block(start)
+            dots = codes.astype(np.float32) @ query
+            if scales is not None:
+                dots *= scales
+            end = start + len(codes)
+            if self.metric == "cosine":
+                dist[start:end] = 1.0 - dots
+            else:
+                sq = self.sq_norms[start:end] + float(query @ query) - 2.0 * dots
+                dist[start:end] = np.sqrt(np.maximum(sq, 0.0))
+        return dist
+
+    def search(self, query, rerank_k=32):
+        """
+        Retourne (rows, distances) des `rerank_k` meilleures lignes, distances exactes
+        recalculées en float32 et triées par ordre croissant.
+        """
+        return self.search_batch(np.asarray(query)[None, :], rerank_k)[0]
+
+    def search_batch(self, queries, rerank_k=32):
+        """Version batch de search : une passe matricielle par bloc pour toutes les requêtes."""
+        queries = np.asarray(queries, dtype=np.float32)
+        if len(self.codes) == 0:
+            empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+            return [empty for _ in range(len(queries))]
+
+        approx = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        q_sq = np.einsum("ij,ij->i", queries, queries)
+        for start in range(0, len(self.codes), SCAN_BLOCK):
+            codes, scales = self._block(start)
+            dots = queries @ codes.astype(np.float32).T
+            if scales is not None:
+                dots *= scales[None, :]
+            end = start + len(codes)
+            if self.metric == "cosine":
+                approx[:, start:end] = 1.0 - dots
+            else:
+                sq = self.sq_norms[None, start:end] + q_sq[:, None] - 2.0 * dots
+                approx[:, start:end] = np.sqrt(np.maximum(sq, 0.0))
+
+        k = min(rerank_k, len(self.codes))
+        candidates = np.argpartition(approx, k - 1, axis=1)[:, :k]
+        results = []
+        for q, rows in zip(queries, candidates):
+            dist = self._exact_distances(q, rows)
+            order = np.argsort(dist)
+            results.append((rows[order], dist[order]))
+        return results
+
+    def measure_recall(self, queries, rerank_k=32):
+        """
+        Impact de la compression sur l'identification : proportion des requêtes pour
+        lesquelles la meilleure ligne après re-classement est la même qu'en recherche
+        exacte float32, et écart maximal de distance sur ce meilleur candidat.
+        """
+        hits = 0
+        max_gap = 0.0
+        for q in np.asarray(queries, dtype=np.float32):
+            rows, dist = self.search(q, rerank_k)
+            exact = self._exact_distances(q, np.arange(len(self.codes)))
+            best = int(np.argmin(exact))
+            hits += int(rows[0] == best or np.isclose(dist[0], exact[best]))
+            max_gap = max(max_gap, float(abs(dist[0] - exact[best])))
+        n = max(len(queries), 1)
+        return {"recall@1": hits / n, "max_distance_gap": max_gap}
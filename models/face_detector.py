@@ -1,49 +1,163 @@
 import cv2
 import dlib
 import os
+import threading
+import numpy as np
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
 
+def non_max_suppression(boxes, iou_threshold=0.3):
+    """Fusionne les boîtes (x, y, w, h) qui se recouvrent : garde la plus grande de chaque groupe."""
+    if len(boxes) == 0:
+        return []
+    arr = np.array(boxes, dtype=np.float32)
+    x1, y1 = arr[:, 0], arr[:, 1]
+    x2, y2 = x1 + arr[:, 2], y1 + arr[:, 3]
+    areas = arr[:, 2] * arr[:, 3]
+    order = np.argsort(areas)[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0, xx2 - xx1) * np.maximum(0, yy2 - yy1)
+        iou = inter / (areas[i] + areas[order[1:]] - inter)
+        order = order[1:][iou <= iou_threshold]
+    return [tuple(int(v) for v in boxes[i]) for i in keep]
+
+
+def _max_iou(box, boxes):
+    """IoU maximal entre `box` et une liste de boîtes (x, y, w, h)."""
+    arr = np.array(boxes, dtype=np.float32)
+    x, y, w, h = (float(v) for v in box)
+    xx1 = np.maximum(x, arr[:, 0])
+    yy1 = np.maximum(y, arr[:, 1])
+    xx2 = np.minimum(x + w, arr[:, 0] + arr[:, 2])
+    yy2 = np.minimum(y + h, arr[:, 1] + arr[:, 3])
+    inter = np.maximum(0, xx2 - xx1) * np.maximum(0, yy2 - yy1)
+    return float((inter / (w * h + arr[:, 2] * arr[:, 3] - inter)).max())
+
+
+def tile_grid(height, width, tile_size, overlap):
+    """Tuiles (x1, y1, x2, y2) de côté tile_size couvrant l'image, se recouvrant de `overlap` pixels."""
+    stride = max(1, tile_size - overlap)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
 class FaceDetector:
-    def __init__(self, detector_type="haar", landmark_path=None):
+    def __init__(self, detector_type="haar", landmark_path=None, predictor=None,
+                 cascade_scale=0.5, cascade_padding=0.3,
+                 tile_size=None, tile_overlap=None, tile_workers=None, tile_global=True):
         self.detector_type = detector_type
+
+        # Mode tuilé (caméras haute résolution) : les images plus grandes que tile_size
+        # sont découpées en tuiles qui se recouvrent, traitées en parallèle dans un pool
+        # de threads (dlib et OpenCV relâchent le GIL), puis fusionnées par NMS.
+        # tile_overlap (défaut : tile_size // 4) doit dépasser la taille des visages
+        # cherchés dans les tuiles ; les plus grands sont trouvés par une passe globale
+        # sur l'image réduite à tile_size (tile_global).
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap if tile_overlap is not None else (tile_size or 0) // 4
+        self.tile_workers = tile_workers or os.cpu_count() or 1
+        self.tile_global = tile_global
+        self._pool = None
+        self._local = threading.local()
         
         if detector_type == "haar":
-            local_haar = Path(__file__).resolve().parent / "haarcascade_frontalface_default.xml"
-            tried = []
-
-            if local_haar.exists():
-                tried.append(str(local_haar))
-                self.detector = cv2.CascadeClassifier(str(local_haar))
-            else:
-                self.detector = None
-
-            if self.detector is None or self.detector.empty():
-                cv_detector = Path(cv2.data.haarcascades) / "haarcascade_frontalface_default.xml"
-                tried.append(str(cv_detector))
-                self.detector = cv2.CascadeClassifier(str(cv_detector))
-
-            if self.detector.empty():
-                raise ValueError(f"Impossible de charger haarcascade.\nChemins testés : {tried}")
+            self.detector = self._load_haar()
 
         elif detector_type == "dlib":
             self.detector = dlib.get_frontal_face_detector()
 
+        elif detector_type == "cascade":
+            # Grossier → fin : Haar sur image réduite pour proposer des régions,
+            # dlib HOG pleine résolution uniquement sur ces régions
+            self.detector = self._load_haar()
+            self.dlib_detector = dlib.get_frontal_face_detector()
+            self.cascade_scale = cascade_scale
+            self.cascade_padding = cascade_padding
+
         else:
-            raise ValueError("detector_type doit être 'haar' ou 'dlib'.")
+            raise ValueError("detector_type doit être 'haar', 'dlib' ou 'cascade'.")
 
-        self.predictor = None
-        if landmark_path and os.path.exists(landmark_path):
+        # Un shape_predictor déjà chargé (ex. celui de FaceEncoder) peut être partagé
+        self.predictor = predictor
+        if self.predictor is None and landmark_path and os.path.exists(landmark_path):
             self.predictor = dlib.shape_predictor(landmark_path)
 
-    def detect_faces(self, image):
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def _load_haar(self):
+        local_haar = Path(__file__).resolve().parent / "haarcascade_frontalface_default.xml"
+        tried = []
+
+        detector = None
+        if local_haar.exists():
+            tried.append(str(local_haar))
+            detector = cv2.CascadeClassifier(str(local_haar))
+
+        if detector is None or detector.empty():
+            cv_detector = Path(cv2.data.haarcascades) / "haarcascade_frontalface_default.xml"
+            tried.append(str(cv_detector))
+            detector = cv2.CascadeClassifier(str(cv_detector))
+
+        if detector.empty():
+            raise ValueError(f"Impossible de charger haarcascade.\nChemins testés : {tried}")
+        return detector
+
+    def _detect_cascade(self, gray, detector=None, dlib_detector=None):
+        """
+        Haar sur l'image réduite (cascade_scale) → régions candidates agrandies de
+        cascade_padding → confirmation et ajustement par dlib HOG à pleine résolution.
+        """
+        detector = detector or self.detector
+        dlib_detector = dlib_detector or self.dlib_detector
+        scale = self.cascade_scale
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_side = max(12, int(30 * scale))
+        proposals = detector.detectMultiScale(
+            small,
+            scaleFactor=1.1,
+            minNeighbors=3,
+            minSize=(min_side, min_side)
+        )
+
+        img_h, img_w = gray.shape[:2]
         faces = []
-        landmarks = []
+        for (px, py, pw, ph) in proposals:
+            x, y, w, h = int(px / scale), int(py / scale), int(pw / scale), int(ph / scale)
+            pad = int(max(w, h) * self.cascade_padding)
+            x1, y1 = max(x - pad, 0), max(y - pad, 0)
+            x2, y2 = min(x + w + pad, img_w), min(y + h + pad, img_h)
+            roi = np.ascontiguousarray(gray[y1:y2, x1:x2])
+            # HOG dlib ne voit pas les visages < ~80 px : suréchantillonner seulement ces régions
+            upsample = 1 if min(w, h) < 80 else 0
+            for d in dlib_detector(roi, upsample):
+                faces.append((d.left() + x1, d.top() + y1, d.width(), d.height()))
+
+        return non_max_suppression(faces)
 
+    def _detect(self, gray, detector, dlib_detector=None):
+        """Détection sur une image entière (ou une tuile) avec les détecteurs fournis."""
+        faces = []
         if self.detector_type == "haar":
-            detected = self.detector.detectMultiScale(
+            detected = detector.detectMultiScale(
                 gray,
                 scaleFactor=1.1,
                 minNeighbors=5,
@@ -52,15 +166,91 @@ class FaceDetector:
             for (x, y, w, h) in detected:
                 faces.append((x, y, w, h))
 
+        elif self.detector_type == "cascade":
+            faces = self._detect_cascade(gray, detector, dlib_detector)
+
         else:
-            detected = self.detector(gray, 1)
+            detected = detector(gray, 1)
             for d in detected:
                 faces.append((d.left(), d.top(), d.width(), d.height()))
+        return faces
+
+    def _thread_detectors(self):
+        """Détecteurs propres au thread du pool (CascadeClassifier n'est pas sûr entre threads)."""
+        local = self._local
+        if not hasattr(local, "detector"):
+            if self.detector_type == "dlib":
+                local.detector = dlib.get_frontal_face_detector()
+            else:
+                local.detector = self._load_haar()
+            local.dlib_detector = dlib.get_frontal_face_detector() if self.detector_type == "cascade" else None
+        return local.detector, local.dlib_detector
+
+    def _detect_tile(self, gray, tile):
+        x1, y1, x2, y2 = tile
+        height, width = gray.shape[:2]
+        roi = np.ascontiguousarray(gray[y1:y2, x1:x2])
+        faces = []
+        for (x, y, w, h) in self._detect(roi, *self._thread_detectors()):
+            # Visage coupé par un bord intérieur : la tuile voisine le contient en entier
+            if (x <= 1 and x1 > 0) or (y <= 1 and y1 > 0) \
+                    or (x + w >= x2 - x1 - 1 and x2 < width) or (y + h >= y2 - y1 - 1 and y2 < height):
+                continue
+            faces.append((int(x) + x1, int(y) + y1, int(w), int(h)))
+        return faces
+
+    def _detect_global(self, gray):
+        """Passe sur l'image réduite à tile_size : visages plus grands que le recouvrement."""
+        scale = self.tile_size / max(gray.shape[:2])
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return [
+            (int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+            for (x, y, w, h) in self._detect(small, *self._thread_detectors())
+        ]
+
+    def _detect_tiled(self, gray):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.tile_workers, thread_name_prefix="face-tile")
+        height, width = gray.shape[:2]
+        tiles = tile_grid(height, width, self.tile_size, self.tile_overlap)
+        coarse = self._pool.submit(self._detect_global, gray) if self.tile_global else None
+        futures = [self._pool.submit(self._detect_tile, gray, tile) for tile in tiles]
+        faces = []
+        for future in futures:
+            faces.extend(future.result())
+        faces = non_max_suppression(faces)
+        if coarse is None:
+            return faces
+
+        # Les boîtes des tuiles (pleine résolution) priment ; la passe globale n'ajoute
+        # que les visages qu'aucune tuile n'a trouvés
+        for box in coarse.result():
+            if not faces or _max_iou(box, faces) <= 0.3:
+                faces.append(box)
+        return faces
+
+    def close(self):
+        """Arrête le pool de threads du mode tuilé."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def detect_faces(self, image, gray=None):
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        landmarks = []
+
+        if self.tile_size and max(gray.shape[:2]) > self.tile_size:
+            faces = self._detect_tiled(gray)
+        else:
+            faces = self._detect(gray, self.detector, getattr(self, "dlib_detector", None))
 
         if self.predictor:
-            for (x, y, w, h) in faces:
-                rect = dlib.rectangle(x, y, x + w, y + h)
-                shape = self.predictor(gray, rect)
-                landmarks.append(shape)
+            landmarks = self.landmarks(gray, faces)
+
+        return faces, landmarks
 
-        return faces, landmarks
\ No newline at end of file
+    def landmarks(self, gray, faces, predictor=None):
+        """Landmarks des boîtes (x, y, w, h) avec `predictor` (défaut : celui du détecteur)."""
+        predictor = predictor or self.predictor
+        return [predictor(gray, dlib.rectangle(int(x), int(y), int(x + w), int(y + h))) for (x, y, w, h) in faces]
\ No newline at end of file
@@ -1,4 +1,7 @@
+import os
 import sys
+import json
+import threading
 import cv2
 import dlib
 import numpy as np
@@ -6,40 +9,170 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from database.database_manager import DatabaseManager
+from database.storage import get_database
+
+
+# Profils latence / précision du descripteur dlib (même réseau ResNet, donc embeddings
+# comparables entre profils ; seuls l'alignement et le moyennage changent) :
+# - predictor   : landmarks utilisés pour aligner le visage (5 points : plus rapide)
+# - points      : nombre de points de ce predictor (des landmarks fournis avec un autre
+#                 nombre de points sont recalculés, cf. encode_faces)
+# - num_jitters : nombre de tirages (recadrages / miroirs) moyennés, 0 = un seul passage
+# - padding     : marge autour du visage aligné (le réseau prend des chips 150×150 fixes)
+ENCODER_PROFILES = {
+    "fast": {
+        "predictor": "models/shape_predictor_5_face_landmarks.dat",
+        "points": 5,
+        "num_jitters": 0,
+        "padding": 0.25,
+    },
+    "balanced": {
+        "predictor": "models/shape_predictor_68_face_landmarks.dat",
+        "points": 68,
+        "num_jitters": 0,
+        "padding": 0.25,
+    },
+    "accurate": {
+        "predictor": "models/shape_predictor_68_face_landmarks.dat",
+        "points": 68,
+        "num_jitters": 10,
+        "padding": 0.25,
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+# Rapport écrit par benchmarks/bench_encoder_profiles.py (mesures sur le jeu de l'installation)
+DEFAULT_PROFILE_REPORT = Path(__file__).resolve().parents[1] / "encoder_profiles.json"
+
+
+def profile_measurements(path=DEFAULT_PROFILE_REPORT):
+    """Latence et précision mesurées par profil (dict vide si le benchmark n'a pas été lancé)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["profiles"]
+    except Exception:
+        return {}
+
 
 class FaceEncoder:
-    def __init__(self, model_path="models/dlib_face_recognition_resnet_model_v1.dat"):
+    def __init__(self, model_path="models/dlib_face_recognition_resnet_model_v1.dat", db=None, profile=None):
+        """
+        profile : profil par défaut de l'installation ("fast", "balanced", "accurate"),
+        sinon variable d'environnement FACE_ENCODER_PROFILE, sinon "balanced".
+        Chaque appel peut choisir un autre profil (argument `profile`).
+        """
+        self.profile = profile or os.getenv("FACE_ENCODER_PROFILE") or DEFAULT_PROFILE
+        if self.profile not in ENCODER_PROFILES:
+            raise ValueError(f"profile doit être l'un de {tuple(ENCODER_PROFILES)} (reçu : {self.profile!r})")
         self.detector = dlib.get_frontal_face_detector()
-        self.sp = dlib.shape_predictor("models/shape_predictor_68_face_landmarks.dat")
+        # Predictors chargés à la demande, un seul exemplaire par fichier
+        self._predictors = {}
+        self.sp = self._predictor(self.profile)
         self.facerec = dlib.face_recognition_model_v1(model_path)
-        self.db_manager = DatabaseManager()
+        # Détecteur HOG, predictors et ResNet dlib ne sont pas sûrs entre threads : tout
+        # appel (thread caméra, reconnaissance en tâche de fond) passe par ce verrou
+        self.lock = threading.RLock()
+        self.db_manager = db if db is not None else get_database()
+
+    def _profile(self, profile=None):
+        name = profile or self.profile
+        if name not in ENCODER_PROFILES:
+            raise ValueError(f"profile doit être l'un de {tuple(ENCODER_PROFILES)} (reçu : {name!r})")
+        return ENCODER_PROFILES[name]
+
+    def _predictor(self, profile=None):
+        path = self._profile(profile)["predictor"]
+        if path not in self._predictors:
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"Modèle de landmarks introuvable : {path} (profil {profile or self.profile!r}). "
+                    f"Télécharger http://dlib.net/files/{Path(path).name}.bz2 et le décompresser dans models/."
+                )
+            self._predictors[path] = dlib.shape_predictor(path)
+        return self._predictors[path]
+
+    def shapes_match(self, shapes, profile=None):
+        """True si les landmarks `shapes` ont le nombre de points du predictor du profil."""
+        points = self._profile(profile)["points"]
+        return all(shape.num_parts == points for shape in shapes)
+
+    def landmarks(self, gray, boxes, profile=None):
+        """Landmarks (predictor du profil) des boîtes (x, y, w, h), sous le verrou de l'encodeur."""
+        if not len(boxes):
+            return []
+        with self.lock:
+            predictor = self._predictor(profile)
+            return [
+                predictor(gray, dlib.rectangle(int(x), int(y), int(x + w), int(y + h)))
+                for (x, y, w, h) in boxes
+            ]
 
-    def encode_face(self, img_path, user_id=None):
+    def encode_face(self, img_path, user_id=None, profile=None):
         """Prend une image et retourne l'embedding. Si user_id est fourni, sauvegarde dans Supabase via DatabaseManager."""
         img = cv2.imread(img_path)
         if img is None:
             return None
         
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.detector(gray)
-
-        if len(faces) == 0:
-            print("❌ Aucun visage détecté !")
-            return None
-
-        shape = self.sp(gray, faces[0])
-        face_descriptor = self.facerec.compute_face_descriptor(img, shape)
+        settings = self._profile(profile)
+        with self.lock:
+            faces = self.detector(gray)
+            if len(faces) == 0:
+                print("❌ Aucun visage détecté !")
+                return None
+            shape = self._predictor(profile)(gray, faces[0])
+            face_descriptor = self.facerec.compute_face_descriptor(
+                img, shape, num_jitters=settings["num_jitters"], padding=settings["padding"]
+            )
         
         embedding = np.array(face_descriptor)
 
         if user_id:
             success = self.db_manager.save_face_embedding(user_id, embedding)
             if success:
-                print(f"✅ Embedding enregistré dans Supabase pour user_id: {user_id}")
+                print(f"✅ Embedding enregistré pour user_id: {user_id}")
             else:
                 print(f"❌ Erreur lors de l'enregistrement de l'embedding")
 
         if not user_id:
             print("ℹ️ Embedding calculé (non sauvegardé localement, user_id non fourni)")
         return embedding
+
+    def encode_faces(self, img, boxes=None, gray=None, shapes=None, profile=None):
+        """
+        Encode tous les visages d'une image en un seul appel batch dlib.
+        boxes  : liste de (x, y, w, h) déjà détectés (sinon détection dlib sur l'image).
+        shapes : landmarks déjà calculés pour ces boîtes (évite de relancer le shape_predictor) ;
+                 ignorés et recalculés s'ils n'ont pas le nombre de points du profil
+                 (ex. landmarks 68 points avec le profil "fast").
+        profile : profil de l'appel (défaut : celui de l'encodeur)
+        Retourne (rects, embeddings) avec embeddings de forme (N, 128).
+        """
+        if img is None:
+            return [], np.zeros((0, 128))
+        if boxes is None and gray is None:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+        settings = self._profile(profile)
+        with self.lock:
+            if boxes is None:
+                rects = list(self.detector(gray))
+            else:
+                rects = [dlib.rectangle(int(x), int(y), int(x + w), int(y + h)) for (x, y, w, h) in boxes]
+            if not rects:
+                return [], np.zeros((0, 128))
+
+            detections = dlib.full_object_detections()
+            if shapes is not None and len(shapes) == len(rects) and self.shapes_match(shapes, profile):
+                for shape in shapes:
+                    detections.append(shape)
+            else:
+                if gray is None:
+                    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                predictor = self._predictor(profile)
+                for rect in rects:
+                    detections.append(predictor(gray, rect))
+            descriptors = self.facerec.compute_face_descriptor(
+                img, detections, num_jitters=settings["num_jitters"], padding=settings["padding"]
+            )
+        return rects, np.array([np.array(d) for d in descriptors])
@@ -0,0 +1,147 @@
+import sys
+import cv2
+import numpy as np
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.face_detector import FaceDetector
+from models.face_encoder import FaceEncoder
+from utils.preprocessing import crop_face
+
+
+class FrameContext:
+    """
+    Contexte d'une image traversant le pipeline : chaque étape lit ce que les
+    précédentes ont déjà produit au lieu de le recalculer.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.gray = None
+        self.boxes = []
+        # Landmarks (predictor de l'encodeur), calculés à la demande par FacePipeline.landmarks
+        self.shapes = None
+        self.embeddings = None
+        self.quality = None
+        self.described = []
+        self.age_gender = []
+        self.matches = []
+        self._crops = {}
+
+    def crop(self, index, margin=10, margin_pct=None):
+        """Découpe du visage `index`, mise en cache par marge."""
+        key = (index, margin, margin_pct)
+        if key not in self._crops:
+            self._crops[key] = crop_face(self.frame, self.boxes[index], margin=margin, margin_pct=margin_pct)
+        return self._crops[key]
+
+
+class FacePipeline:
+    """
+    Détection → landmarks → descripteurs → âge/genre (→ reconnaissance) sur une seule
+    image en niveaux de gris : les landmarks sont calculés au plus une fois par image
+    avec le predictor de l'encodeur (et seulement si une étape en a besoin), réutilisés
+    pour la qualité et les descripteurs, et les crops mis en cache dans le FrameContext.
+
+    `report()` compte les images, visages, descripteurs évités par le contrôle qualité
+    et visages dont les landmarks ont dû être calculés.
+    """
+
+    def __init__(self, detector=None, encoder=None, age_gender=None, recognizer=None, quality=None):
+        self.encoder = encoder if encoder is not None else FaceEncoder()
+        self.detector = detector if detector is not None else FaceDetector(detector_type="haar")
+        self.stats = Counter()
+        self.age_gender = age_gender
+        self.recognizer = recognizer
+        self.quality = quality
+
+    def detect(self, ctx):
+        ctx.gray = cv2.cvtColor(ctx.frame, cv2.COLOR_BGR2GRAY)
+        faces, shapes = self.detector.detect_faces(ctx.frame, gray=ctx.gray)
+        ctx.boxes = [tuple(int(v) for v in box) for box in faces]
+        # Landmarks du détecteur gardés seulement s'ils viennent du même modèle que l'encodeur
+        if ctx.boxes and len(shapes) == len(ctx.boxes) and self.encoder.shapes_match(shapes):
+            ctx.shapes = list(shapes)
+        self.stats["frames"] += 1
+        self.stats["faces"] += len(ctx.boxes)
+        return ctx
+
+    def landmarks(self, ctx):
+        """Landmarks de tous les visages de l'image, calculés une seule fois."""
+        if ctx.shapes is None:
+            ctx.shapes = self.encoder.landmarks(ctx.gray, ctx.boxes)
+            self.stats["landmarks_computed"] += len(ctx.boxes)
+        return ctx
+
+    def score_quality(self, ctx):
+        """Qualité de tous les visages (taille, netteté, exposition, pose) en une passe."""
+        if self.quality is not None and ctx.quality is None:
+            self.landmarks(ctx)
+            ctx.quality = self.quality.score(ctx.gray, ctx.boxes, ctx.shapes)
+        return ctx
+
+    def describe(self, ctx, indices=None):
+        """
+        Descripteurs 128D des visages `indices` (défaut : tous) qui passent le contrôle
+        qualité, à partir des landmarks de l'image. Les autres lignes restent à NaN.
+        """
+        if ctx.embeddings is None:
+            ctx.embeddings = np.full((len(ctx.boxes), 128), np.nan)
+        indices = list(range(len(ctx.boxes))) if indices is None else list(indices)
+        if self.quality is not None and indices:
+            self.score_quality(ctx)
+            kept = [i for i in indices if ctx.quality["passed"][i]]
+            self.stats["descriptors_skipped_low_quality"] += len(indices) - len(kept)
+            indices = kept
+        ctx.described = sorted(set(ctx.described) | set(indices))
+        if not indices:
+            return ctx
+
+        self.landmarks(ctx)
+        boxes = [ctx.boxes[i] for i in indices]
+        shapes = [ctx.shapes[i] for i in indices]
+        _, embeddings = self.encoder.encode_faces(ctx.frame, boxes=boxes, gray=ctx.gray, shapes=shapes)
+        ctx.embeddings[indices] = embeddings
+        return ctx
+
+    def predict_age_gender(self, ctx, margin_pct=0.4):
+        ctx.age_gender = []
+        if self.age_gender is None or self.age_gender.model is None:
+            return ctx
+        crops = [ctx.crop(i, margin_pct=margin_pct) for i in range(len(ctx.boxes))]
+        if crops:
+            # Un résultat par boîte, (None, None, None) pour un crop vide (visage en bord d'image)
+            ctx.age_gender = self.age_gender.predict_batch(crops)
+        return ctx
+
+    def recognize(self, ctx):
+        if self.recognizer is None or ctx.embeddings is None:
+            return ctx
+        ctx.matches = [
+            {"box": box, "user_id": None, "name": None, "distance": float("inf"),
+             "recognized": False, "candidate_id": None, "quality_rejected": True}
+            for box in ctx.boxes
+        ]
+        if ctx.described:
+            found = self.recognizer.match_embeddings(ctx.embeddings[ctx.described])
+            for i, match in zip(ctx.described, found):
+                match["box"] = ctx.boxes[i]
+                match["quality_rejected"] = False
+                ctx.matches[i] = match
+        return ctx
+
+    def process(self, frame, describe=True, age_gender=True, recognize=False):
+        ctx = self.detect(FrameContext(frame))
+        if describe or recognize:
+            self.describe(ctx)
+        if age_gender:
+            self.predict_age_gender(ctx)
+        if recognize:
+            self.recognize(ctx)
+        return ctx
+
+    def report(self):
+        """Compteurs : images, visages, descripteurs évités (qualité), landmarks calculés."""
+        return dict(self.stats)
@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+
+
+def shapes_to_array(shapes):
+    """Landmarks dlib (full_object_detection) → tableau (N, P, 2)."""
+    if not shapes:
+        return None
+    return np.array([[(p.x, p.y) for p in shape.parts()] for shape in shapes], dtype=np.float32)
+
+
+def _box_sums(integral, x1, y1, x2, y2):
+    """Sommes sur des rectangles [x1, x2) × [y1, y2) à partir d'une image intégrale (vectorisé)."""
+    return integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+
+
+class FaceQualityScorer:
+    """
+    Score de qualité peu coûteux, calculé pour tous les visages d'une image à la fois,
+    avant le descripteur ResNet :
+
+    - taille   : plus petit côté de la boîte (px)
+    - netteté  : variance du Laplacien dans la boîte
+    - exposition : luminosité moyenne dans la boîte
+    - pose     : asymétrie nez / coins externes des yeux (landmarks 68 points), 0 = de face ;
+                 NaN sans landmarks 68 points, le contrôle de pose n'est alors pas appliqué
+
+    Laplacien et luminosité sont calculés une seule fois sur l'image, puis agrégés par
+    boîte via des images intégrales : le coût ne dépend pas du nombre de visages.
+    """
+
+    def __init__(self, min_size=60, min_sharpness=60.0, exposure_range=(50, 205), max_yaw=0.45):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.exposure_range = exposure_range
+        self.max_yaw = max_yaw
+        self._pose_skip_logged = False
+
+    def _clip_boxes(self, boxes, shape):
+        arr = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        img_h, img_w = shape[:2]
+        x1 = np.clip(arr[:, 0], 0, img_w)
+        y1 = np.clip(arr[:, 1], 0, img_h)
+        x2 = np.clip(arr[:, 0] + arr[:, 2], 0, img_w)
+        y2 = np.clip(arr[:, 1] + arr[:, 3], 0, img_h)
+        return arr, x1, y1, x2, y2
+
+    def _yaw(self, landmarks):
+        # 30 : bout du nez, 36 / 45 : coins externes des yeux
+        nose = landmarks[:, 30]
+        left = np.linalg.norm(nose - landmarks[:, 36], axis=1)
+        right = np.linalg.norm(nose - landmarks[:, 45], axis=1)
+        return np.abs(left - right) / np.maximum(left + right, 1e-6)
+
+    def score(self, gray, boxes, shapes=None):
+        """
+        Retourne un dict de tableaux (N,) : size, sharpness, exposure, yaw,
+        score (0..1, produit des sous-scores) et passed (bool).
+        """
+        n = len(boxes)
+        if n == 0:
+            empty = np.zeros(0, dtype=np.float32)
+            return {"size": empty, "sharpness": empty, "exposure": empty, "yaw": empty,
+                    "score": empty, "passed": np.zeros(0, dtype=bool)}
+
+        arr, x1, y1, x2, y2 = self._clip_boxes(boxes, gray.shape)
+        # Boîte entièrement hors de l'image après découpage : aucun pixel, score le plus bas
+        visible = (x2 > x1) & (y2 > y1)
+        size = np.where(visible, np.minimum(arr[:, 2], arr[:, 3]), 0).astype(np.float32)
+        sharpness = np.zeros(n, dtype=np.float32)
+        exposure = np.zeros(n, dtype=np.float32)
+
+        if visible.any():
+            x1, y1, x2, y2 = x1[visible], y1[visible], x2[visible], y2[visible]
+            area = ((x2 - x1) * (y2 - y1)).astype(np.float64)
+
+            # Union des boîtes : Laplacien / intégrales calculés seulement sur cette zone
+            ux1, uy1, ux2, uy2 = x1.min(), y1.min(), x2.max(), y2.max()
+            roi = gray[uy1:uy2, ux1:ux2]
+            lap = cv2.Laplacian(roi, cv2.CV_32F)
+            lap_sum, lap_sq = cv2.integral2(lap, sdepth=cv2.CV_64F)
+            gray_sum = cv2.integral(roi, sdepth=cv2.CV_64F)
+
+            bx1, by1, bx2, by2 = x1 - ux1, y1 - uy1, x2 - ux1, y2 - uy1
+            lap_mean = _box_sums(lap_sum, bx1, by1, bx2, by2) / area
+            sharpness[visible] = _box_sums(lap_sq, bx1, by1, bx2, by2) / area - lap_mean ** 2
+            exposure[visible] = _box_sums(gray_sum, bx1, by1, bx2, by2) / area
+
+        landmarks = shapes_to_array(shapes) if shapes is not None and len(shapes) == n else None
+        if landmarks is not None and landmarks.shape[1] >= 68:
+            yaw = self._yaw(landmarks).astype(np.float32)
+            pose_ok = yaw <= self.max_yaw
+        else:
+            # Pose inconnue : yaw à NaN et contrôle de pose explicitement ignoré
+            yaw = np.full(n, np.nan, dtype=np.float32)
+            pose_ok = np.ones(n, dtype=bool)
+            if not self._pose_skip_logged:
+                print("⚠️ Qualité : pas de landmarks 68 points, contrôle de pose ignoré")
+                self._pose_skip_logged = True
+
+        low, high = self.exposure_range
+        mid, half = (low + high) / 2.0, (high - low) / 2.0
+        size_score = np.clip(size / (2.0 * self.min_size), 0, 1)
+        sharp_score = np.clip(sharpness / (2.0 * self.min_sharpness), 0, 1)
+        exposure_score = np.clip(1.0 - np.abs(exposure - mid) / (2.0 * half), 0, 1)
+        pose_score = np.where(np.isnan(yaw), 1.0, np.clip(1.0 - yaw / (2.0 * self.max_yaw), 0, 1))
+
+        passed = (
+            visible
+            & (size >= self.min_size)
+            & (sharpness >= self.min_sharpness)
+            & (exposure >= low) & (exposure <= high)
+            & pose_ok
+        )
+        return {
+            "size": size,
+            "sharpness": sharpness,
+            "exposure": exposure,
+            "yaw": yaw,
+            "score": np.where(visible, size_score * sharp_score * exposure_score * pose_score, 0.0).astype(np.float32),
+            "passed": passed,
+        }
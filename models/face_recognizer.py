@@ -1,27 +1,80 @@
 import sys
 import cv2
 import re
+import threading
 import numpy as np
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from models.face_encoder import FaceEncoder
-from database.database_manager import DatabaseManager
-from utils.preprocessing import crop_face
+from database.storage import get_database
 from models.face_detector import FaceDetector
+from models.face_pipeline import FacePipeline, FrameContext
+from models.compressed_gallery import CompressedGallery, COMPRESSION_DTYPES
+from models.sharded_gallery import ShardedGallerySearch
+from database.gallery import Gallery
+
+
+class _GallerySnapshot:
+    """Galerie + structures de recherche dérivées ; jamais modifié une fois publié."""
+
+    __slots__ = ("gallery", "synced_at", "matrix", "owners", "user_starts", "compressed", "sharded")
+
+    def __init__(self, gallery, synced_at=None):
+        self.gallery = gallery
+        self.synced_at = synced_at
+        self.matrix = None
+        self.owners = None
+        self.user_starts = None
+        self.compressed = None
+        self.sharded = None
+
+
+# Erreurs de la recherche partitionnée : shards fermés (snapshot remplacé) ou worker
+# arrêté / pipe rompu
+_SHARD_ERRORS = (RuntimeError, EOFError, OSError)
+
+# _swap_gallery : installation sans condition sur le snapshot courant
+_ANY = object()
+
 
 class FaceRecognizer:
-    def __init__(self, threshold=0.45, metric="cosine"):
-        self.encoder = FaceEncoder()
-        self.db = DatabaseManager()
-        self.detector = FaceDetector(detector_type="haar")
+    def __init__(self, threshold=0.45, metric="cosine", compression=None, rerank_k=32,
+                 encoder=None, db=None, detector=None, quality_gate=None, n_shards=None):
+        # Les interfaces peuvent partager leurs instances (évite de recharger les modèles dlib)
+        self.encoder = encoder if encoder is not None else FaceEncoder()
+        self.db = db if db is not None else get_database()
+        self.detector = detector if detector is not None else FaceDetector(detector_type="haar")
         self.threshold = threshold
         self.metric = metric
+        # FaceQualityScorer optionnel : les visages flous / trop petits / de profil ne
+        # passent pas par le descripteur (et ne sont pas enregistrés comme inconnus)
+        self.quality_gate = quality_gate
+        # Détection, landmarks et descripteurs une seule fois par image
+        self.pipeline = FacePipeline(
+            detector=self.detector, encoder=self.encoder, recognizer=self, quality=quality_gate
+        )
+
+        # Galerie compressée optionnelle ("float16" ou "int8") + re-classement float32
+        if compression is not None and compression not in COMPRESSION_DTYPES:
+            raise ValueError(f"compression doit être None ou l'une de {COMPRESSION_DTYPES}")
+        self.compression = compression
+        self.rerank_k = rerank_k
+        self.cache_dir = Path(__file__).resolve().parents[1] / "cache"
+
+        # Recherche répartie sur n_shards processus (galerie en mémoire partagée)
+        self.n_shards = n_shards
+
+        # Galerie en mémoire : snapshot immuable remplacé d'un seul bloc
+        # (les appels à recognize ne voient jamais un état à moitié mis à jour)
+        self._gallery = None
+        self._gallery_lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._shard_rebuild = None
+        self._refresh_thread = None
+        self._refresh_stop = threading.Event()
 
-        self.user_embeddings = None
-        self.user_prototypes = None
-        
         self.unknown_dir = Path(__file__).resolve().parents[1] / "unknown_users"
         self.unknown_dir.mkdir(exist_ok=True)
 
@@ -66,31 +119,446 @@ class FaceRecognizer:
         else:
             return float(np.linalg.norm(emb1 - emb2))
 
+    @property
+    def gallery(self):
+        """Galerie compacte courante (database.gallery.Gallery) ou None si non chargée."""
+        snapshot = self._gallery
+        return snapshot.gallery if snapshot is not None else None
+
+    @property
+    def user_embeddings(self):
+        """Vue {user_id: [embeddings]} construite à la demande (compatibilité)."""
+        gallery = self.gallery
+        if gallery is None:
+            return None
+        return {uid: list(gallery.embeddings[gallery.row_user == i]) for i, uid in enumerate(gallery.user_ids.tolist())}
+
+    @property
+    def user_prototypes(self):
+        """Vue {user_id: prototype} construite à la demande (compatibilité)."""
+        gallery = self.gallery
+        if gallery is None:
+            return None
+        return dict(zip(gallery.user_ids.tolist(), gallery.prototypes))
+
+    def _build_snapshot(self, gallery, synced_at=None):
+        """Structures de recherche (matrice, compression, shards) d'une galerie."""
+        snapshot = _GallerySnapshot(gallery, synced_at)
+        if len(gallery) == 0:
+            return snapshot
+        if self.compression is not None:
+            snapshot.compressed, snapshot.gallery = self._compress_gallery(gallery)
+            return snapshot
+        matrix, owners = gallery.search_matrix(normalize=self.metric == "cosine")
+        # Lignes regroupées par utilisateur : minimum par utilisateur en un reduceat (identify)
+        order = np.argsort(owners, kind="stable")
+        snapshot.matrix, snapshot.owners = matrix[order], owners[order]
+        snapshot.user_starts = np.searchsorted(snapshot.owners, np.arange(gallery.n_users))
+        if self.n_shards:
+            snapshot.sharded = ShardedGallerySearch(snapshot.matrix, metric=self.metric, n_shards=self.n_shards)
+        return snapshot
+
+    def _compress_gallery(self, gallery):
+        """
+        Empile échantillons + prototypes dans une CompressedGallery, puis remplace les
+        matrices de la galerie par des vues sur le stockage float32 mappé (plus de copie
+        float32 en RAM).
+        """
+        vectors, owners = gallery.search_matrix()
+        compressed = CompressedGallery(
+            vectors, owners, dtype=self.compression, metric=self.metric, cache_dir=self.cache_dir
+        )
+        n = len(gallery)
+        store = compressed.exact
+        mapped = Gallery(
+            store[:n], gallery.row_user, gallery.row_ids, gallery.user_ids, gallery.names, prototypes=store[n:]
+        )
+        return compressed, mapped
+
     def _load_embeddings_from_db(self, force_reload=False):
-     
-        if self.user_embeddings is not None and not force_reload:
+
+        if self._gallery is not None and not force_reload:
             return
 
-        all_embeddings = self.db.get_all_embeddings()
-        if not all_embeddings:
-            self.user_embeddings = {}
-            self.user_prototypes = {}
+        gallery, synced_at = self.db.get_gallery()
+        snapshot = self._build_snapshot(gallery if gallery is not None else Gallery.empty(), synced_at)
+        # Chargement initial concurrent : le premier snapshot installé est gardé
+        self._swap_gallery(snapshot, expected=_ANY if force_reload else None)
+
+    def _swap_gallery(self, snapshot, expected=None):
+        """
+        Installe `snapshot` (construit hors verrou) en une affectation, sauf si le snapshot
+        courant n'est plus `expected` (_ANY : sans condition). Les workers du snapshot
+        écarté sont libérés après le verrou. Retourne True si `snapshot` a été installé.
+        """
+        with self._gallery_lock:
+            installed = expected is _ANY or self._gallery is expected
+            if installed:
+                discarded, self._gallery = self._gallery, snapshot
+            else:
+                discarded = snapshot
+        if discarded is not None and discarded.sharded is not None:
+            discarded.sharded.close()
+        return installed
+
+    def close(self):
+        """Arrête le rafraîchissement et les processus de recherche éventuels."""
+        self.stop_auto_refresh()
+        snapshot = self._gallery
+        if snapshot is not None and snapshot.sharded is not None:
+            snapshot.sharded.close()
+
+    def load_gallery(self, gallery, synced_at=None):
+        """Installe une galerie déjà chargée (Gallery, par ex. Gallery.load ou db.get_gallery)."""
+        self._swap_gallery(self._build_snapshot(gallery, synced_at), expected=_ANY)
+
+    def load_gallery_rows(self, all_embeddings):
+        """Construit la galerie à partir de lignes déjà chargées (même format que get_all_embeddings)."""
+        synced_at = max((r["created_at"] for r in all_embeddings if r.get("created_at")), default=None)
+        self.load_gallery(Gallery.from_rows(all_embeddings), synced_at)
+
+    def refresh_gallery(self):
+        """
+        Synchronisation incrémentale : récupère uniquement les embeddings créés depuis
+        la dernière synchro et retire ceux supprimés côté base. Le nouveau snapshot (et
+        ses shards) est construit hors verrou puis installé s'il part toujours du snapshot
+        courant ; sinon (galerie remplacée entre-temps) il est abandonné.
+        Retourne True si la galerie a changé.
+        """
+        if self._gallery is None:
+            self._load_embeddings_from_db()
+            return True
+
+        # Un rafraîchissement à la fois (les lectures et load_gallery ne prennent pas ce verrou)
+        with self._refresh_lock:
+            current = self._gallery
+            gallery = current.gallery
+            known = set(gallery.row_ids.tolist())
+
+            # Ajouts : fenêtre >= synced_at, dédoublonnée par id
+            if current.synced_at is not None:
+                recent = self.db.get_embeddings_since(current.synced_at)
+            else:
+                recent = self.db.get_all_embeddings()
+            if recent is None:
+                return False
+            added = [r for r in recent if r.get("id") not in known and len(r["embedding"]) == 128]
+            synced_at = max((r["created_at"] for r in recent if r.get("created_at")), default=None)
+            known.update(r.get("id") for r in added)
+
+            # Suppressions (et insertions validées en retard) : diff des ids,
+            # uniquement si le nombre de lignes côté base ne correspond plus
+            removed = []
+            count = self.db.get_embedding_count()
+            if count is not None and count != len(known):
+                remote_ids = self.db.get_embedding_ids()
+                if remote_ids is not None:
+                    remote_ids = set(remote_ids)
+                    removed = [r for r in known if r not in remote_ids]
+                    added = [r for r in added if r["id"] in remote_ids]
+                    missing = self.db.get_embeddings_by_ids(remote_ids - known)
+                    added.extend(r for r in missing or [] if len(r["embedding"]) == 128)
+
+            if not added and not removed:
+                return False
+
+            gallery = gallery.updated(
+                add_row_ids=[r["id"] for r in added],
+                add_user_ids=[r["user_id"] for r in added],
+                add_names=[r.get("name") for r in added],
+                add_embeddings=np.array([r["embedding"] for r in added], dtype=np.float32).reshape(-1, 128),
+                remove_row_ids=removed,
+            )
+            if synced_at is None or (current.synced_at is not None and synced_at < current.synced_at):
+                synced_at = current.synced_at
+            if not self._swap_gallery(self._build_snapshot(gallery, synced_at), expected=current):
+                print("ℹ️ Galerie remplacée pendant le rafraîchissement : mise à jour abandonnée")
+                return False
+            print(f"🔄 Galerie mise à jour : {len(gallery)} embeddings, "
+                  f"{len(added)} ajout(s), {len(removed)} suppression(s)")
+            return True
+
+    def _refresh_loop(self, interval):
+        # Première synchro immédiate : la galerie est chargée avant la première requête
+        while True:
+            try:
+                self.refresh_gallery()
+            except Exception as e:
+                print(f"⚠️ Erreur rafraîchissement galerie : {e}")
+            if self._refresh_stop.wait(interval):
+                return
+
+    def start_auto_refresh(self, interval=30.0):
+        """Lance un thread de fond qui charge la galerie puis la synchronise toutes les `interval` secondes."""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
             return
+        self._refresh_stop.clear()
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop, args=(interval,), name="gallery-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+
+    def stop_auto_refresh(self):
+        self._refresh_stop.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
 
-        user_map = {}
-        for row in all_embeddings:
-            uid = row["user_id"]
-            emb = np.array(row["embedding"], dtype=float)
-            user_map.setdefault(uid, []).append(emb)
+    def _distance_matrix(self, snapshot, queries):
+        """Distances (Q, M) entre les requêtes et toutes les lignes de la galerie."""
+        matrix = snapshot.matrix
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.metric == "cosine":
+            return 1.0 - queries @ matrix.T
+        sq = (
+            np.einsum("ij,ij->i", queries, queries)[:, None]
+            + np.einsum("ij,ij->i", matrix, matrix)[None, :]
+            - 2.0 * (queries @ matrix.T)
+        )
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def _sharded_search(self, snapshot, queries, k):
+        """
+        Top-k via les shards du snapshot, ou None (repli sur la matrice locale) : shards
+        absents, fermés parce que le snapshot a été remplacé pendant la requête, ou hors
+        service (worker arrêté, pipe rompu) ; dans ce dernier cas ils sont reconstruits.
+        """
+        sharded = snapshot.sharded
+        if sharded is None:
+            return None
+        try:
+            return sharded.search(queries, k=k)
+        except _SHARD_ERRORS as e:
+            if self._gallery is snapshot:
+                self._start_shard_rebuild(snapshot, e)
+            return None
+
+    def _start_shard_rebuild(self, snapshot, error):
+        with self._gallery_lock:
+            if self._shard_rebuild is not None:
+                return
+            print(f"⚠️ Recherche partitionnée indisponible ({error!r}) : reconstruction des shards")
+            self._shard_rebuild = threading.Thread(
+                target=self._rebuild_shards, args=(snapshot,), name="shard-rebuild", daemon=True
+            )
+            self._shard_rebuild.start()
+
+    def _rebuild_shards(self, snapshot):
+        """Nouveaux processus de recherche pour `snapshot`, construits hors verrou puis installés."""
+        try:
+            with self._refresh_lock:
+                rebuilt = _GallerySnapshot(snapshot.gallery, snapshot.synced_at)
+                rebuilt.matrix, rebuilt.owners = snapshot.matrix, snapshot.owners
+                rebuilt.user_starts = snapshot.user_starts
+                rebuilt.sharded = ShardedGallerySearch(rebuilt.matrix, metric=self.metric, n_shards=self.n_shards)
+                if self._swap_gallery(rebuilt, expected=snapshot):
+                    print("✅ Shards de recherche reconstruits")
+        except Exception as e:
+            print(f"❌ Reconstruction des shards impossible : {e}")
+        finally:
+            self._shard_rebuild = None
 
-        prototypes = {}
-        for uid, embs in user_map.items():
-            mat = np.vstack(embs)
-            mean = np.mean(mat, axis=0)
-            prototypes[uid] = self._l2_normalize(mean) if self.metric == "cosine" else mean
+    def _match_batch(self, snapshot, queries):
+        """
+        Meilleur utilisateur par requête : min sur les échantillons et le prototype de
+        chaque utilisateur, pour toutes les requêtes à la fois.
+        Retourne (index utilisateurs (Q,) int32, distances).
+        """
+        if len(queries) == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+        compressed = snapshot.compressed
+        if compressed is not None:
+            results = compressed.search_batch(queries, self.rerank_k)
+            users = np.array([compressed.owners[rows[0]] for rows, _ in results], dtype=np.int32)
+            return users, np.array([float(dists[0]) for _, dists in results])
 
-        self.user_embeddings = user_map
-        self.user_prototypes = prototypes
+        found = self._sharded_search(snapshot, queries, 1)
+        if found is not None:
+            rows, dists = found
+            return snapshot.owners[rows[:, 0]], dists[:, 0].astype(float)
+
+        dist = self._distance_matrix(snapshot, queries)
+        best_rows = np.argmin(dist, axis=1)
+        best_dist = dist[np.arange(len(queries)), best_rows]
+        return snapshot.owners[best_rows], best_dist.astype(float)
+
+    def _best_match(self, snapshot, query_emb):
+        """Meilleur utilisateur et distance : min(distance au prototype, distance min aux échantillons)."""
+        users, dists = self._match_batch(snapshot, np.asarray(query_emb)[None, :])
+        return str(snapshot.gallery.user_ids[users[0]]), float(dists[0])
+
+    def user_name(self, user_id):
+        """Nom d'un utilisateur d'après la galerie en mémoire (sans appel réseau)."""
+        gallery = self.gallery
+        return gallery.name_of(user_id) if gallery is not None else None
+
+    def _prepare_queries(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, 128)
+        if self.metric == "cosine" and len(embeddings):
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            embeddings = embeddings / norms
+        return embeddings
+
+    @staticmethod
+    def _distinct_users(owners, dists, k):
+        """
+        Lignes candidates (Q, R) triées par distance → k premiers utilisateurs distincts
+        par requête (première occurrence = distance minimale). Complété par -1 / inf.
+        """
+        n_queries, n_rows = owners.shape
+        by_owner = np.argsort(owners, axis=1, kind="stable")
+        sorted_owners = np.take_along_axis(owners, by_owner, axis=1)
+        first = np.ones_like(sorted_owners, dtype=bool)
+        first[:, 1:] = sorted_owners[:, 1:] != sorted_owners[:, :-1]
+        distinct = np.zeros_like(first)
+        np.put_along_axis(distinct, by_owner, first, axis=1)
+
+        # Positions des k premières occurrences, dans l'ordre des distances
+        positions = np.argsort(~distinct, axis=1, kind="stable")[:, :k]
+        valid = np.take_along_axis(distinct, positions, axis=1)
+        users = np.where(valid, np.take_along_axis(owners, positions, axis=1), -1).astype(np.int32)
+        dists = np.where(valid, np.take_along_axis(dists, positions, axis=1), np.inf)
+        if positions.shape[1] < k:
+            pad = k - positions.shape[1]
+            users = np.pad(users, ((0, 0), (0, pad)), constant_values=-1)
+            dists = np.pad(dists, ((0, 0), (0, pad)), constant_values=np.inf)
+        return users, dists
+
+    def _identify_batch(self, snapshot, queries, k, max_elements=1 << 24):
+        """Top-k utilisateurs (Q, k) et distances, triés par distance croissante."""
+        candidate_rows = max(self.rerank_k, 4 * k)
+        compressed = snapshot.compressed
+        if compressed is not None:
+            results = compressed.search_batch(queries, max(candidate_rows, k))
+            owners = np.array([compressed.owners[rows] for rows, _ in results], dtype=np.int32)
+            dists = np.array([d for _, d in results], dtype=float)
+            return self._distinct_users(owners, dists, k)
+
+        found = self._sharded_search(snapshot, queries, candidate_rows)
+        if found is not None:
+            rows, dists = found
+            return self._distinct_users(snapshot.owners[rows], dists.astype(float), k)
+
+        # Distance par utilisateur = min sur ses lignes (échantillons + prototype), puis
+        # sélection partielle (argpartition) des k plus proches : seuls ces k sont triés
+        users_out, dists_out = [], []
+        chunk = max(1, max_elements // len(snapshot.matrix))
+        for start in range(0, len(queries), chunk):
+            dist = self._distance_matrix(snapshot, queries[start:start + chunk])
+            per_user = np.minimum.reduceat(dist, snapshot.user_starts, axis=1)
+            if k < per_user.shape[1]:
+                top = np.argpartition(per_user, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(per_user.shape[1]), per_user.shape)
+            top_dists = np.take_along_axis(per_user, top, axis=1)
+            order = np.argsort(top_dists, axis=1)
+            users_out.append(np.take_along_axis(top, order, axis=1).astype(np.int32))
+            dists_out.append(np.take_along_axis(top_dists, order, axis=1).astype(float))
+        return np.concatenate(users_out), np.concatenate(dists_out)
+
+    def identify(self, embeddings, k=5):
+        """
+        Identification top-k pour un lot de requêtes (N, 128), en une passe vectorisée.
+        Chaque utilisateur est classé par sa distance minimale (échantillons et prototype).
+
+        Retourne un dict de tableaux (N, k') avec k' = min(k, nombre d'utilisateurs) :
+        user_ids, names, distances (croissantes), recognized (distance < seuil), et margin
+        (N,) : écart entre le 1er et le 2e candidat (inf s'il n'y en a qu'un).
+        Avec une galerie compressée ou répartie, les candidats sont tirés des
+        max(rerank_k, 4k) lignes les plus proches : les colonnes sans candidat valent
+        user_id "" et distance inf.
+        """
+        self._load_embeddings_from_db()
+        snapshot = self._gallery
+        queries = self._prepare_queries(embeddings)
+        gallery = snapshot.gallery
+        k = max(0, min(int(k), gallery.n_users))
+        if k == 0 or len(queries) == 0:
+            empty = np.zeros((len(queries), 0))
+            return {
+                "user_ids": empty.astype(str), "names": empty.astype(str), "distances": empty,
+                "recognized": empty.astype(bool), "margin": np.full(len(queries), np.inf),
+            }
+
+        users, dists = self._identify_batch(snapshot, queries, k)
+        found = users >= 0
+        safe = np.where(found, users, 0)
+        margin = dists[:, 1] - dists[:, 0] if k > 1 else np.full(len(queries), np.inf)
+        return {
+            "user_ids": np.where(found, gallery.user_ids[safe], ""),
+            "names": np.where(found, gallery.names[safe], ""),
+            "distances": dists,
+            "recognized": dists < self.threshold,
+            "margin": margin,
+        }
+
+    def _match_snapshot(self, snapshot, queries):
+        """Meilleur utilisateur de `snapshot` pour chaque requête (déjà normalisée)."""
+        if snapshot.gallery.n_users == 0 or len(queries) == 0:
+            return [
+                {"user_id": None, "name": None, "distance": float("inf"), "recognized": False, "candidate_id": None}
+                for _ in range(len(queries))
+            ]
+        users, dists = self._match_batch(snapshot, queries)
+        user_ids = snapshot.gallery.user_ids[users].tolist()
+        names = snapshot.gallery.names[users].tolist()
+        results = []
+        for uid, name, d in zip(user_ids, names, dists):
+            recognized = bool(d < self.threshold)
+            results.append({
+                "user_id": uid if recognized else None,
+                "name": (name or None) if recognized else None,
+                "distance": float(d),
+                "recognized": recognized,
+                "candidate_id": uid,
+            })
+        return results
+
+    def match_embeddings(self, embeddings, extra_rows=None):
+        """
+        Compare un lot d'embeddings (N, 128) à la galerie en une passe.
+        extra_rows : lignes {id, user_id, name, embedding} pas encore dans la galerie en
+        mémoire (ex. inscriptions locales en attente d'écriture ou du prochain
+        rafraîchissement), comparées en plus sans recharger la galerie.
+        Retourne une liste de dicts {user_id, name, distance, recognized, candidate_id},
+        candidate_id étant l'utilisateur le plus proche même si la distance dépasse le seuil.
+        """
+        self._load_embeddings_from_db()
+        queries = self._prepare_queries(np.asarray(embeddings, dtype=float).reshape(-1, 128))
+        results = self._match_snapshot(self._gallery, queries)
+        if extra_rows:
+            extra = _GallerySnapshot(Gallery.from_rows(extra_rows))
+            extra.matrix, extra.owners = extra.gallery.search_matrix(normalize=self.metric == "cosine")
+            for i, found in enumerate(self._match_snapshot(extra, queries)):
+                if found["distance"] < results[i]["distance"]:
+                    results[i] = found
+        return results
+
+    def recognize_frame(self, frame):
+        """
+        Identifie tous les visages d'une image via le pipeline : une conversion en gris,
+        une détection, des landmarks + descripteurs en un appel batch dlib, puis
+        comparaison de toutes les requêtes à la galerie en une seule opération matricielle.
+        Retourne une liste de dicts {box, user_id, name, distance, recognized, quality_rejected}.
+        """
+        if frame is None:
+            return []
+        return self.pipeline.process(frame, age_gender=False, recognize=True).matches
+
+    def gallery_memory(self):
+        """Empreinte approximative de la galerie en mémoire (octets)."""
+        snapshot = self._gallery
+        if snapshot is None:
+            return 0
+        if snapshot.compressed is not None:
+            gallery = snapshot.gallery
+            ids = gallery.row_user.nbytes + gallery.row_ids.nbytes + gallery.user_ids.nbytes + gallery.names.nbytes
+            return snapshot.compressed.nbytes() + ids
+        total = snapshot.gallery.nbytes
+        if snapshot.matrix is not None:
+            total += snapshot.matrix.nbytes + snapshot.owners.nbytes
+        return total
 
     def recognize(self, img_path):
         img = cv2.imread(img_path)
@@ -98,52 +566,31 @@ class FaceRecognizer:
             print("❌ Impossible de charger l'image capturée.")
             return None
 
-        faces, _ = self.detector.detect_faces(img)
-        if len(faces) == 0:
+        ctx = self.pipeline.detect(FrameContext(img))
+        if not ctx.boxes:
             print("❌ Aucun visage détecté pour la reconnaissance.")
             return None
 
-        (x, y, w, h) = faces[0]
-        face_img = crop_face(img, (x, y, w, h), margin=10)
-
+        face_img = ctx.crop(0, margin=10)
         if face_img is None:
             print("❌ Impossible de découper le visage.")
             return None
 
-        temp_path = Path("captured_faces/face_rec_temp.jpg")
-        cv2.imwrite(str(temp_path), face_img)
-
-        embedding = self.encoder.encode_face(str(temp_path))
-        if embedding is None:
-            print("❌ Embedding non généré.")
+        # Descripteur du premier visage, à partir de la détection ci-dessus
+        self.pipeline.describe(ctx, indices=[0])
+        if not ctx.described:
+            print(f"⚠️ Qualité du visage insuffisante (score={ctx.quality['score'][0]:.2f}) - reconnaissance ignorée")
             return None
+        embedding = ctx.embeddings[0]
 
         self._load_embeddings_from_db()
-        if not self.user_prototypes:
+        snapshot = self._gallery
+        if snapshot.gallery.n_users == 0:
             print("⚠️ Aucun embedding enregistré dans la base.")
             return None
 
         query_emb = self._l2_normalize(embedding) if self.metric == "cosine" else embedding
-
-        best_user = None
-        best_score = float("inf")
-
-        for uid, proto in self.user_prototypes.items():
-            d_proto = self.compare_embeddings(query_emb, proto)
-
-            embs = self.user_embeddings.get(uid, [])
-            d_min = float("inf")
-            for db_emb in embs:
-                db_emb_cmp = self._l2_normalize(db_emb) if self.metric == "cosine" else db_emb
-                d = self.compare_embeddings(query_emb, db_emb_cmp)
-                if d < d_min:
-                    d_min = d
-
-            d_use = min(d_proto, d_min)
-
-            if d_use < best_score:
-                best_score = d_use
-                best_user = uid
+        best_user, best_score = self._best_match(snapshot, query_emb)
 
         print(f"→ Meilleure distance trouvée : {best_score} (metric={self.metric})")
 
@@ -0,0 +1,76 @@
+def iou(box_a, box_b):
+    """Intersection sur union de deux boîtes (x, y, w, h)."""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    x1 = max(ax, bx)
+    y1 = max(ay, by)
+    x2 = min(ax + aw, bx + bw)
+    y2 = min(ay + ah, by + bh)
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Suivi très simple des visages d'une image à l'autre par recouvrement (IoU glouton).
+    Chaque piste garde un identifiant stable tant que le visage reste visible.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=10):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = {}
+        self._next_id = 1
+
+    def update(self, boxes):
+        """
+        Associe les boîtes détectées aux pistes existantes.
+        Retourne une liste de (track_id, box) dans l'ordre des boîtes, et la liste des
+        pistes supprimées (disparues depuis plus de max_missed images).
+        """
+        boxes = [tuple(int(v) for v in b) for b in boxes]
+        track_ids = list(self.tracks.keys())
+
+        pairs = []
+        for i, box in enumerate(boxes):
+            for tid in track_ids:
+                score = iou(box, self.tracks[tid]["box"])
+                if score >= self.iou_threshold:
+                    pairs.append((score, i, tid))
+        pairs.sort(reverse=True)
+
+        assigned = {}
+        used_tracks = set()
+        for score, i, tid in pairs:
+            if i in assigned or tid in used_tracks:
+                continue
+            assigned[i] = tid
+            used_tracks.add(tid)
+
+        result = []
+        for i, box in enumerate(boxes):
+            tid = assigned.get(i)
+            if tid is None:
+                tid = self._next_id
+                self._next_id += 1
+                self.tracks[tid] = {"box": box, "missed": 0, "age": 0}
+                used_tracks.add(tid)
+            track = self.tracks[tid]
+            track["box"] = box
+            track["missed"] = 0
+            track["age"] += 1
+            result.append((tid, box))
+
+        removed = []
+        for tid in track_ids:
+            if tid in used_tracks:
+                continue
+            self.tracks[tid]["missed"] += 1
+            if self.tracks[tid]["missed"] > self.max_missed:
+                del self.tracks[tid]
+                removed.append(tid)
+        return result, removed
+
+    def reset(self):
+        self.tracks = {}
@@ -0,0 +1,164 @@
+import os
+import threading
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+
+def _attach(name):
+    # Processus "spawn" : le resource_tracker est celui du parent, seul responsable de l'unlink
+    return shared_memory.SharedMemory(name=name)
+
+
+def _shard_worker(conn, shard_name, shard_shape, query_name, query_shape, metric, row_offset):
+    """
+    Processus de recherche d'un shard : la matrice du shard et le buffer de requêtes
+    sont en mémoire partagée, seuls (nb de requêtes, k) et les top-k transitent par le pipe.
+    """
+    shard_shm = _attach(shard_name)
+    query_shm = _attach(query_name)
+    shard = np.ndarray(shard_shape, dtype=np.float32, buffer=shard_shm.buf)
+    queries_buf = np.ndarray(query_shape, dtype=np.float32, buffer=query_shm.buf)
+    sq_norms = np.einsum("ij,ij->i", shard, shard) if metric != "cosine" else None
+
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            n_queries, k = msg
+            queries = queries_buf[:n_queries]
+            dots = queries @ shard.T
+            if metric == "cosine":
+                dist = 1.0 - dots
+            else:
+                sq = sq_norms[None, :] + np.einsum("ij,ij->i", queries, queries)[:, None] - 2.0 * dots
+                dist = np.sqrt(np.maximum(sq, 0.0))
+            k = min(k, shard.shape[0])
+            top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            conn.send((top + row_offset, np.take_along_axis(dist, top, axis=1)))
+    finally:
+        del shard, queries_buf
+        shard_shm.close()
+        query_shm.close()
+
+
+class ShardedGallerySearch:
+    """
+    Galerie partitionnée en `n_shards` blocs de lignes contigus, chacun tenu en mémoire
+    partagée et balayé par son propre processus. Les top-k partiels sont fusionnés dans
+    le processus appelant : coût fixe par lot de requêtes (un message par shard).
+
+    matrix : (M, D) float32, déjà normalisée L2 si metric == "cosine"
+    """
+
+    __slots__ = ("metric", "n_rows", "dim", "max_queries", "_lock", "_closed", "_failed", "_query_shm", "_queries",
+                 "_shards")
+
+    def __init__(self, matrix, metric="cosine", n_shards=None, max_queries=64):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.metric = metric
+        self.n_rows, self.dim = matrix.shape
+        self.max_queries = max_queries
+        n_shards = max(1, min(n_shards or os.cpu_count() or 1, self.n_rows))
+        self._lock = threading.Lock()
+        self._closed = False
+        # Worker mort en cours de recherche : les pipes des autres shards peuvent contenir
+        # des réponses non lues, l'instance n'est plus utilisable
+        self._failed = False
+
+        self._query_shm = shared_memory.SharedMemory(create=True, size=max_queries * self.dim * 4)
+        self._queries = np.ndarray((max_queries, self.dim), dtype=np.float32, buffer=self._query_shm.buf)
+
+        ctx = mp.get_context("spawn")
+        self._shards = []
+        bounds = np.linspace(0, self.n_rows, n_shards + 1).astype(int)
+        # Un seul thread BLAS par worker : le parallélisme vient des shards
+        saved_env = {v: os.environ.get(v) for v in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({v: "1" for v in saved_env})
+        try:
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                shm = shared_memory.SharedMemory(create=True, size=max(1, (end - start) * self.dim * 4))
+                shard = np.ndarray((end - start, self.dim), dtype=np.float32, buffer=shm.buf)
+                shard[:] = matrix[start:end]
+                del shard
+                parent_conn, child_conn = ctx.Pipe()
+                proc = ctx.Process(
+                    target=_shard_worker,
+                    args=(child_conn, shm.name, (end - start, self.dim), self._query_shm.name,
+                          (max_queries, self.dim), metric, int(start)),
+                    daemon=True,
+                )
+                proc.start()
+                self._shards.append((shm, parent_conn, proc))
+        finally:
+            for var, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+    def __len__(self):
+        return self.n_rows
+
+    def search(self, queries, k=1):
+        """
+        Top-k sur toute la galerie. Retourne (rows (Q, k), distances (Q, k)) triés par
+        distance croissante ; rows sont des indices de lignes de la matrice d'origine.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, self.n_rows)
+        all_rows, all_dists = [], []
+        for start in range(0, len(queries), self.max_queries):
+            chunk = queries[start:start + self.max_queries]
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("ShardedGallerySearch fermé")
+                if self._failed:
+                    raise RuntimeError("ShardedGallerySearch hors service (worker arrêté)")
+                self._queries[:len(chunk)] = chunk
+                try:
+                    for _, conn, _ in self._shards:
+                        conn.send((len(chunk), k))
+                    partial = [conn.recv() for _, conn, _ in self._shards]
+                except (EOFError, OSError):
+                    self._failed = True
+                    raise
+
+            rows = np.concatenate([p[0] for p in partial], axis=1)
+            dists = np.concatenate([p[1] for p in partial], axis=1)
+            top = np.argpartition(dists, k - 1, axis=1)[:, :k]
+            rows = np.take_along_axis(rows, top, axis=1)
+            dists = np.take_along_axis(dists, top, axis=1)
+            order = np.argsort(dists, axis=1)
+            all_rows.append(np.take_along_axis(rows, order, axis=1))
+            all_dists.append(np.take_along_axis(dists, order, axis=1))
+        return np.concatenate(all_rows), np.concatenate(all_dists)
+
+    def close(self):
+        """Arrête les workers et libère la mémoire partagée (attend la recherche en cours)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for shm, conn, proc in self._shards:
+                try:
+                    conn.send(None)
+                except Exception:
+                    pass
+            for shm, conn, proc in self._shards:
+                proc.join(timeout=5)
+                if proc.is_alive():
+                    proc.terminate()
+                conn.close()
+                shm.close()
+                shm.unlink()
+            del self._queries
+            self._query_shm.close()
+            self._query_shm.unlink()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
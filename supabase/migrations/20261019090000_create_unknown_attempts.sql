@@ -0,0 +1,22 @@
+-- TABLE DES TENTATIVES D'ACCÈS NON RECONNUES
+CREATE TABLE IF NOT EXISTS unknown_attempts (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  image_path text,
+  distance double precision,
+  created_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE unknown_attempts ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read unknown attempts"
+  ON unknown_attempts FOR SELECT
+  TO authenticated
+  USING (true);
+
+CREATE POLICY "Users can insert unknown attempts"
+  ON unknown_attempts FOR INSERT
+  TO authenticated
+  WITH CHECK (true);
+
+CREATE INDEX IF NOT EXISTS idx_unknown_attempts_created_at
+  ON unknown_attempts(created_at);
@@ -0,0 +1,28 @@
+-- ARCHIVE DES EMBEDDINGS RETIRÉS PAR LE COMPACTAGE DE GALERIE
+CREATE TABLE IF NOT EXISTS face_embeddings_archive (
+  id uuid PRIMARY KEY,
+  user_id uuid NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  embedding jsonb NOT NULL,
+  created_at timestamptz,
+  archived_at timestamptz DEFAULT now()
+);
+
+ALTER TABLE face_embeddings_archive ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read archived embeddings"
+  ON face_embeddings_archive FOR SELECT
+  TO authenticated
+  USING (true);
+
+CREATE POLICY "Users can insert archived embeddings"
+  ON face_embeddings_archive FOR INSERT
+  TO authenticated
+  WITH CHECK (true);
+
+CREATE POLICY "Users can update archived embeddings"
+  ON face_embeddings_archive FOR UPDATE
+  TO authenticated
+  USING (true);
+
+CREATE INDEX IF NOT EXISTS idx_face_embeddings_archive_user_id
+  ON face_embeddings_archive(user_id);
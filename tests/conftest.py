@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def make_rows(rng, n_users, per_user, spread=0.02):
+    """Lignes {id, user_id, name, embedding} : un centre par utilisateur + bruit."""
+    rows = []
+    for u in range(n_users):
+        center = rng.normal(size=128) * 0.1
+        for j in range(per_user):
+            rows.append({
+                "id": f"row-{u}-{j}",
+                "user_id": f"user-{u}",
+                "name": f"Nom {u}",
+                "embedding": (center + rng.normal(size=128) * spread).tolist(),
+            })
+    return rows
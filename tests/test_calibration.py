@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+import pytest
+
+from core import calibration
+from core.calibration import MAX_DISTANCE, N_BINS, roc_from_histograms
+
+
+def histogram(distances):
+    """Histogramme aux bins de la calibration."""
+    return np.bincount(calibration._bin(np.asarray(distances, dtype=np.float64)), minlength=N_BINS)
+
+
+def test_separated_distributions_give_zero_eer():
+    genuine = histogram(np.linspace(0.1, 0.4, 500))
+    impostor = histogram(np.linspace(0.8, 1.2, 5000))
+
+    report = roc_from_histograms(genuine, impostor, target_far=1e-3)
+
+    assert report["eer"] == 0.0
+    assert 0.4 <= report["eer_threshold"] <= 0.8
+    assert report["far_at_recommended"] == 0.0
+    assert report["tar_at_recommended"] == 1.0
+    # Seuil recommandé : le plus grand dont le FAR reste sous la cible
+    assert report["recommended_threshold"] == pytest.approx(0.8, abs=2 * MAX_DISTANCE / N_BINS)
+    assert report["genuine_pairs"] == 500 and report["impostor_pairs"] == 5000
+
+
+def test_overlapping_distributions_eer():
+    # Genuine uniforme sur [0.3, 0.7), impostor sur [0.5, 0.9) : EER = 25 % à 0.6
+    genuine = histogram(np.linspace(0.3, 0.7, 4000, endpoint=False))
+    impostor = histogram(np.linspace(0.5, 0.9, 4000, endpoint=False))
+
+    report = roc_from_histograms(genuine, impostor)
+
+    assert report["eer"] == pytest.approx(0.25, abs=0.01)
+    assert report["eer_threshold"] == pytest.approx(0.6, abs=0.01)
+    assert report["far_at_recommended"] <= report["target_far"]
+
+
+def test_curves_are_monotonic_and_downsampled():
+    rng = np.random.default_rng(0)
+    report = roc_from_histograms(histogram(rng.uniform(0.2, 0.6, 1000)), histogram(rng.uniform(0.5, 1.2, 1000)))
+    curve = report["curve"]
+
+    assert len(curve["threshold"]) == len(curve["far"]) == len(curve["frr"]) <= 201
+    assert np.all(np.diff(curve["far"]) >= 0)
+    assert np.all(np.diff(curve["frr"]) <= 0)
+
+
+def test_empty_histograms_do_not_divide_by_zero():
+    empty = np.zeros(N_BINS, dtype=np.int64)
+    report = roc_from_histograms(empty, empty)
+
+    assert report["genuine_pairs"] == 0
+    assert np.isfinite(report["eer"])
+
+
+def test_pair_histograms_match_brute_force():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(150, 128)).astype(np.float32) * 0.1
+    labels = np.repeat(np.arange(30), 5)
+
+    # Budget minuscule : tuiles de 64, donc tuiles diagonales et hors diagonale
+    totals, tile, n_tiles = calibration.pair_histograms(embeddings, labels, memory_mb=0.01, workers=1)
+
+    assert tile == 64 and n_tiles == 6
+    i, j = np.triu_indices(len(embeddings), k=1)
+    same = labels[i] == labels[j]
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    expected = {
+        "euclidean": np.linalg.norm(embeddings[i] - embeddings[j], axis=1),
+        "cosine": 1.0 - np.einsum("ij,ij->i", unit[i], unit[j]),
+    }
+    for metric, distances in expected.items():
+        genuine, impostor = totals[metric]
+        assert genuine.sum() == same.sum() and impostor.sum() == (~same).sum()
+        # Arrondis flottants : une paire peut tomber dans le bin voisin
+        assert np.abs(genuine - histogram(distances[same])).sum() <= 2
+        assert np.abs(impostor - histogram(distances[~same])).sum() <= 2
+
+
+def test_recommended_threshold_reads_report(tmp_path):
+    path = tmp_path / "calibration.json"
+    assert calibration.recommended_threshold("cosine", path=path, default=0.5) == 0.5
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"metrics": {"cosine": {"recommended_threshold": 0.37}}}, f)
+    assert calibration.recommended_threshold("cosine", path=path) == 0.37
+    assert calibration.recommended_threshold("euclidean", path=path, default=0.6) == 0.6
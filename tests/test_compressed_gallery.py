@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from models.compressed_gallery import CompressedGallery, quantize, dequantize
+
+
+def test_quantize_float16_roundtrip(rng):
+    vectors = rng.normal(size=(20, 128)).astype(np.float32)
+    codes, scales = quantize(vectors, "float16")
+
+    assert codes.dtype == np.float16
+    assert scales is None
+    np.testing.assert_allclose(dequantize(codes), vectors, rtol=1e-3, atol=1e-3)
+
+
+def test_quantize_int8_per_vector_scales(rng):
+    vectors = rng.normal(size=(20, 128)).astype(np.float32)
+    vectors[3] = 0.0
+    codes, scales = quantize(vectors, "int8")
+
+    assert codes.dtype == np.int8
+    assert scales.shape == (20,)
+    assert np.abs(codes).max() <= 127
+    # Vecteur nul : échelle 1, pas de division par zéro
+    assert scales[3] == 1.0 and not codes[3].any()
+    # Erreur bornée par un demi-pas de quantification
+    error = np.abs(dequantize(codes, scales) - vectors)
+    assert np.all(error <= scales[:, None] / 2 + 1e-6)
+
+
+def test_quantize_rejects_unknown_dtype(rng):
+    with pytest.raises(ValueError):
+        quantize(rng.normal(size=(2, 128)), "int4")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+def test_measure_recall_with_reranking(tmp_path, rng, dtype, metric):
+    vectors = rng.normal(size=(500, 128)).astype(np.float32)
+    owners = np.arange(500) // 5
+    gallery = CompressedGallery(vectors, owners, dtype=dtype, metric=metric, cache_dir=tmp_path)
+    queries = vectors[:40] + rng.normal(size=(40, 128)).astype(np.float32) * 0.05
+
+    report = gallery.measure_recall(queries, rerank_k=16)
+
+    # Re-classement float32 : le meilleur candidat est celui de la recherche exacte
+    assert report["recall@1"] == 1.0
+    assert report["max_distance_gap"] < 1e-4
+
+
+def test_search_returns_exact_distances_sorted(tmp_path, rng):
+    vectors = rng.normal(size=(100, 128)).astype(np.float32)
+    gallery = CompressedGallery(vectors, np.arange(100), dtype="int8", metric="euclidean", cache_dir=tmp_path)
+
+    rows, dist = gallery.search(vectors[7], rerank_k=8)
+
+    assert rows[0] == 7
+    assert dist[0] == pytest.approx(0.0, abs=1e-4)
+    assert np.all(np.diff(dist) >= 0)
+    np.testing.assert_allclose(dist, np.linalg.norm(vectors[rows] - vectors[7], axis=1), rtol=1e-5, atol=1e-5)
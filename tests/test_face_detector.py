@@ -0,0 +1,51 @@
+import pytest
+
+# face_detector importe dlib au chargement du module
+pytest.importorskip("dlib")
+
+from models.face_detector import non_max_suppression, tile_grid
+
+
+def test_nms_empty():
+    assert non_max_suppression([]) == []
+
+
+def test_nms_keeps_largest_of_overlapping_group():
+    boxes = [(12, 10, 50, 50), (10, 10, 60, 60), (14, 12, 48, 48)]
+
+    assert non_max_suppression(boxes) == [(10, 10, 60, 60)]
+
+
+def test_nms_keeps_separate_faces_largest_first():
+    boxes = [(300, 40, 40, 40), (10, 10, 80, 80), (15, 12, 78, 78), (150, 200, 60, 60)]
+
+    assert non_max_suppression(boxes) == [(10, 10, 80, 80), (150, 200, 60, 60), (300, 40, 40, 40)]
+
+
+def test_nms_threshold():
+    # IoU de 50 / 150 entre les deux boîtes
+    boxes = [(0, 0, 10, 10), (5, 0, 10, 10)]
+
+    assert len(non_max_suppression(boxes, iou_threshold=0.3)) == 1
+    assert len(non_max_suppression(boxes, iou_threshold=0.4)) == 2
+
+
+def test_nms_returns_int_tuples():
+    (box,) = non_max_suppression([[10.0, 20.0, 30.0, 40.0]])
+
+    assert box == (10, 20, 30, 40)
+    assert all(isinstance(v, int) for v in box)
+
+
+def test_tile_grid_covers_image_with_overlap():
+    tiles = tile_grid(1080, 1920, tile_size=640, overlap=160)
+
+    assert all(x2 - x1 == 640 and y2 - y1 == 640 for x1, y1, x2, y2 in tiles)
+    assert max(x2 for _, _, x2, _ in tiles) == 1920
+    assert max(y2 for _, _, _, y2 in tiles) == 1080
+    xs = sorted({x1 for x1, _, _, _ in tiles})
+    assert all(b - a <= 640 - 160 for a, b in zip(xs, xs[1:]))
+
+
+def test_tile_grid_small_image_is_one_tile():
+    assert tile_grid(480, 640, tile_size=640, overlap=160) == [(0, 0, 640, 480)]
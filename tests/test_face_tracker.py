@@ -0,0 +1,73 @@
+import pytest
+
+from models.face_tracker import FaceTracker, iou
+
+
+def test_iou():
+    assert iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert iou((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
+    assert iou((0, 0, 10, 10), (5, 0, 10, 10)) == pytest.approx(50 / 150)
+    assert iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+
+def test_tracks_keep_ids_while_boxes_move():
+    tracker = FaceTracker()
+    first, _ = tracker.update([(10, 10, 50, 50), (200, 10, 50, 50)])
+    moved, removed = tracker.update([(205, 12, 50, 50), (14, 10, 50, 50)])
+
+    ids = {box[0] // 100: tid for tid, box in first}
+    assert removed == []
+    # Résultat dans l'ordre des boîtes reçues
+    assert [box for _, box in moved] == [(205, 12, 50, 50), (14, 10, 50, 50)]
+    assert [tid for tid, _ in moved] == [ids[2], ids[0]]
+
+
+def test_new_face_gets_new_id():
+    tracker = FaceTracker()
+    (first, _), = tracker.update([(10, 10, 50, 50)])[0]
+    tracks, _ = tracker.update([(10, 10, 50, 50), (300, 300, 40, 40)])
+
+    assert tracks[0][0] == first
+    assert tracks[1][0] != first
+
+
+def test_greedy_matching_prefers_best_overlap():
+    tracker = FaceTracker(iou_threshold=0.1)
+    (tid, _), = tracker.update([(0, 0, 100, 100)])[0]
+    # Deux boîtes recouvrent la piste : la plus proche la garde, l'autre devient une nouvelle piste
+    tracks, _ = tracker.update([(40, 0, 100, 100), (5, 0, 100, 100)])
+
+    assert tracks[1][0] == tid
+    assert tracks[0][0] != tid
+
+
+def test_track_removed_after_max_missed():
+    tracker = FaceTracker(max_missed=2)
+    (tid, _), = tracker.update([(10, 10, 50, 50)])[0]
+
+    for _ in range(2):
+        tracks, removed = tracker.update([])
+        assert tracks == [] and removed == []
+    _, removed = tracker.update([])
+    assert removed == [tid]
+
+    # Réapparition après suppression : nouvelle piste
+    (new_tid, _), = tracker.update([(10, 10, 50, 50)])[0]
+    assert new_tid != tid
+
+
+def test_brief_occlusion_keeps_id():
+    tracker = FaceTracker(max_missed=3)
+    (tid, _), = tracker.update([(10, 10, 50, 50)])[0]
+    tracker.update([])
+    tracks, _ = tracker.update([(12, 10, 50, 50)])
+
+    assert tracks[0][0] == tid
+
+
+def test_reset():
+    tracker = FaceTracker()
+    tracker.update([(10, 10, 50, 50)])
+    tracker.reset()
+
+    assert tracker.tracks == {}
@@ -0,0 +1,89 @@
+import numpy as np
+
+from database.gallery import Gallery
+from conftest import make_rows
+
+
+def test_from_rows_indexes_users_once(rng):
+    rows = make_rows(rng, n_users=3, per_user=4)
+    gallery = Gallery.from_rows(rows)
+
+    assert len(gallery) == 12
+    assert gallery.n_users == 3
+    assert gallery.embeddings.dtype == np.float32
+    assert gallery.name_of("user-1") == "Nom 1"
+    assert gallery.name_of("inconnu") is None
+    assert gallery.rows_of("user-2").shape == (4, 128)
+
+
+def test_from_rows_skips_malformed_embeddings(rng):
+    rows = make_rows(rng, n_users=1, per_user=2)
+    rows.append({"id": "bad", "user_id": "user-0", "name": "Nom 0", "embedding": [0.0] * 10})
+    rows.append({"id": "none", "user_id": "user-0", "name": "Nom 0", "embedding": None})
+
+    assert len(Gallery.from_rows(rows)) == 2
+
+
+def test_prototypes_are_per_user_means(rng):
+    rows = make_rows(rng, n_users=2, per_user=3)
+    gallery = Gallery.from_rows(rows)
+
+    for uid in ("user-0", "user-1"):
+        expected = gallery.rows_of(uid).mean(axis=0)
+        np.testing.assert_allclose(gallery.prototypes[gallery.user_index(uid)], expected, rtol=1e-5, atol=1e-6)
+
+
+def test_empty_gallery():
+    gallery = Gallery.empty()
+
+    assert len(gallery) == 0
+    assert gallery.n_users == 0
+    matrix, owners = gallery.search_matrix(normalize=True)
+    assert matrix.shape == (0, 128)
+    assert len(owners) == 0
+
+
+def test_search_matrix_appends_prototypes_and_normalizes(rng):
+    gallery = Gallery.from_rows(make_rows(rng, n_users=2, per_user=3))
+    matrix, owners = gallery.search_matrix(normalize=True)
+
+    assert matrix.shape == (6 + 2, 128)
+    assert owners.tolist()[-2:] == [0, 1]
+    np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+    # La galerie n'est pas modifiée par la normalisation
+    assert not np.allclose(np.linalg.norm(gallery.embeddings, axis=1), 1.0)
+
+
+def test_updated_adds_and_removes_without_touching_original(rng):
+    rows = make_rows(rng, n_users=2, per_user=2)
+    gallery = Gallery.from_rows(rows)
+    new = rng.normal(size=(1, 128)).astype(np.float32)
+
+    updated = gallery.updated(
+        add_row_ids=["row-new"], add_user_ids=["user-9"], add_names=["Nouveau"], add_embeddings=new,
+        remove_row_ids=["row-0-0", "row-0-1"],
+    )
+
+    assert len(gallery) == 4 and gallery.n_users == 2
+    assert len(updated) == 3
+    # user-0 n'a plus de ligne : il disparaît
+    assert updated.user_index("user-0") is None
+    assert updated.name_of("user-9") == "Nouveau"
+    np.testing.assert_allclose(updated.prototypes[updated.user_index("user-9")], new[0])
+    np.testing.assert_allclose(
+        updated.prototypes[updated.user_index("user-1")],
+        gallery.prototypes[gallery.user_index("user-1")],
+    )
+
+
+def test_save_load_roundtrip(tmp_path, rng):
+    gallery = Gallery.from_rows(make_rows(rng, n_users=3, per_user=2))
+    path = tmp_path / "gallery.npz"
+    gallery.save(path)
+    loaded = Gallery.load(path)
+
+    np.testing.assert_array_equal(loaded.embeddings, gallery.embeddings)
+    np.testing.assert_array_equal(loaded.row_ids, gallery.row_ids)
+    np.testing.assert_array_equal(loaded.user_ids, gallery.user_ids)
+    np.testing.assert_array_equal(loaded.prototypes, gallery.prototypes)
+    assert loaded.name_of("user-2") == "Nom 2"
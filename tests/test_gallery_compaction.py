@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from core.gallery_compaction import (
+    GalleryCompactor, compact, farthest_point, k_medoids, plan_compaction, select_representatives,
+)
+from database.gallery import Gallery
+from conftest import make_rows
+
+
+def clusters(rng, n_clusters=3, per_cluster=6, spread=0.01):
+    centers = rng.normal(size=(n_clusters, 128)).astype(np.float32)
+    points = np.repeat(centers, per_cluster, axis=0)
+    points += rng.normal(size=points.shape).astype(np.float32) * spread
+    return points, np.repeat(np.arange(n_clusters), per_cluster)
+
+
+@pytest.mark.parametrize("select", [k_medoids, farthest_point])
+def test_small_sets_are_kept_whole(rng, select):
+    embeddings = rng.normal(size=(3, 128)).astype(np.float32)
+
+    assert select(embeddings, 5).tolist() == [0, 1, 2]
+    assert select(embeddings, 3).tolist() == [0, 1, 2]
+
+
+@pytest.mark.parametrize("method", ["medoids", "farthest"])
+def test_one_representative_per_cluster(rng, method):
+    embeddings, labels = clusters(rng)
+    chosen = select_representatives(embeddings, 3, method)
+
+    assert len(chosen) == 3
+    assert sorted(labels[chosen].tolist()) == [0, 1, 2]
+
+
+def test_medoid_is_central_member(rng):
+    embeddings, _ = clusters(rng, n_clusters=1, per_cluster=9)
+    (medoid,) = k_medoids(embeddings, 1)
+
+    dists = np.linalg.norm(embeddings[:, None] - embeddings[None, :], axis=2).sum(axis=1)
+    assert medoid == int(np.argmin(dists))
+
+
+def test_unknown_method_raises(rng):
+    with pytest.raises(ValueError):
+        select_representatives(rng.normal(size=(8, 128)), 2, "random")
+
+
+def test_plan_compaction_keeps_k_per_user(rng):
+    rows = make_rows(rng, n_users=2, per_user=8)
+    # user-9 : déjà sous k
+    rows += [dict(row, user_id="user-9", id=f"row-9-{j}") for j, row in enumerate(make_rows(rng, 1, 3))]
+    gallery = Gallery.from_rows(rows)
+
+    archived, users = plan_compaction(gallery, k=5)
+
+    assert len(archived) == 2 * 3
+    assert sorted(gallery.user_ids[users].tolist()) == ["user-0", "user-1"]
+    # user_ids : seuls les utilisateurs demandés (et au-delà de k) sont compactés
+    archived, users = plan_compaction(gallery, k=5, user_ids=["user-1", "user-9", "inconnu"])
+    assert gallery.user_ids[users].tolist() == ["user-1"]
+    assert all(rid.startswith("row-1-") for rid in archived)
+
+
+def test_compact_report_and_original_untouched(rng):
+    gallery = Gallery.from_rows(make_rows(rng, n_users=4, per_user=10))
+    compacted, archived, report = compact(gallery, k=3, threshold=0.6)
+
+    assert len(gallery) == 40
+    assert len(compacted) == 12 and report["rows_after"] == 12
+    assert report["archived"] == len(archived) == 28
+    assert report["users_compacted"] == 4
+    assert report["bytes_after"] < report["bytes_before"]
+    assert report["accuracy_before"] == report["accuracy_after"] == 1.0
+    assert report["reference_rows"] is None
+
+
+def test_nothing_to_compact(rng):
+    gallery = Gallery.from_rows(make_rows(rng, n_users=2, per_user=2))
+    compacted, archived, report = compact(gallery, k=5, threshold=0.6)
+
+    assert compacted is gallery and archived == []
+    assert report["accuracy_before"] is None
+
+
+def test_reference_gives_same_accuracy_as_full_gallery(rng):
+    # Utilisateurs proches les uns des autres : la précision n'est pas triviale
+    rows = make_rows(rng, n_users=12, per_user=8, spread=0.04)
+    full = Gallery.from_rows(rows)
+    scheduled = ["user-0", "user-1", "user-2"]
+    own = Gallery.from_rows([row for row in rows if row["user_id"] in scheduled])
+
+    _, _, expected = compact(full, k=3, user_ids=scheduled, threshold=0.6)
+    _, _, report = compact(own, k=3, user_ids=scheduled, threshold=0.6, reference=full)
+
+    assert report["reference_rows"] == len(full)
+    assert report["archived"] == expected["archived"]
+    assert report["accuracy_before"] == expected["accuracy_before"]
+    assert report["accuracy_after"] == expected["accuracy_after"]
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.rows = rows
+        self.archived = []
+
+    def get_embeddings_by_users(self, user_ids):
+        return [row for row in self.rows if row["user_id"] in user_ids]
+
+    def archive_embeddings(self, row_ids):
+        self.archived.extend(row_ids)
+        self.rows = [row for row in self.rows if row["id"] not in set(row_ids)]
+        return True
+
+
+def test_compactor_archives_scheduled_users_only(rng):
+    db = FakeDb(make_rows(rng, n_users=3, per_user=7))
+    compactor = GalleryCompactor(db=db, k=4, threshold=0.6)
+
+    compactor.schedule("user-1")
+    compactor.close(timeout=5)
+
+    assert len(db.archived) == 3
+    assert all(rid.startswith("row-1-") for rid in db.archived)
+    assert [report["users_compacted"] for report in compactor.reports] == [1]
+
+
+def test_compactor_retries_while_writes_pending(rng):
+    db = FakeDb(make_rows(rng, n_users=1, per_user=7))
+    db.flush = lambda timeout=None: False
+    db.pending = lambda: 1
+    compactor = GalleryCompactor(db=db, k=4, threshold=0.6, flush_timeout=0.0, max_retries=2)
+
+    compactor.schedule("user-0")
+    compactor.close(timeout=5)
+
+    assert db.archived == []
+    assert compactor.reports == []
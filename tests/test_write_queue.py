@@ -0,0 +1,144 @@
+import json
+import threading
+
+import pytest
+
+from database.write_queue import WriteBehindQueue
+
+
+class FakeBackend:
+    """Backend en mémoire : `reject` (ids d'embeddings refusés), `reachable`, `fail` (panne totale)."""
+
+    def __init__(self, reject=(), reachable=True, fail=False):
+        self.users = {}
+        self.embeddings = {}
+        self.reject = set(reject)
+        self.reachable = reachable
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def create_user(self, name, user_id=None):
+        if self.fail:
+            return None
+        with self.lock:
+            self.calls.append(("create_user", user_id))
+            self.users[user_id] = name
+        return user_id
+
+    def save_face_embeddings(self, items):
+        if self.fail or any(item["id"] in self.reject for item in items):
+            return False
+        with self.lock:
+            self.calls.append(("save_face_embedding", [item["id"] for item in items]))
+            for item in items:
+                self.embeddings[item["id"]] = item
+        return True
+
+    def get_embedding_count(self):
+        return len(self.embeddings) if self.reachable and not self.fail else None
+
+
+def make_queue(tmp_path, backend, **kwargs):
+    options = dict(flush_interval=0.01, base_backoff=0.01, max_backoff=0.02, fsync=False)
+    options.update(kwargs)
+    return WriteBehindQueue(backend, journal_path=tmp_path / "journal.jsonl", **options)
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_writes_are_applied_in_order_and_journal_emptied(tmp_path):
+    backend = FakeBackend()
+    queue = make_queue(tmp_path, backend)
+    user_id = queue.create_user("Alice")
+    queue.save_face_embeddings([{"id": "e1", "user_id": user_id, "embedding": [0.0] * 128}])
+
+    assert queue.flush(timeout=5)
+    queue.close()
+
+    assert [op for op, _ in backend.calls] == ["create_user", "save_face_embedding"]
+    assert backend.users == {user_id: "Alice"}
+    assert read_jsonl(tmp_path / "journal.jsonl") == []
+
+
+def test_pending_writes_survive_restart(tmp_path):
+    down = FakeBackend(fail=True)
+    queue = make_queue(tmp_path, down)
+    user_id = queue.create_user("Alice")
+    queue.save_face_embedding(user_id, [0.5] * 128)
+    queue.close(timeout=0.1)
+    assert queue.pending() == 2
+
+    backend = FakeBackend()
+    replayed = make_queue(tmp_path, backend)
+    assert replayed.flush(timeout=5)
+    replayed.close()
+
+    assert backend.users == {user_id: "Alice"}
+    assert len(backend.embeddings) == 1
+
+
+def test_replay_skips_acked_and_truncated_entries(tmp_path):
+    journal = tmp_path / "journal.jsonl"
+    with open(journal, "w", encoding="utf-8") as f:
+        for seq, name in ((1, "Alice"), (2, "Bob"), (3, "Carol")):
+            f.write(json.dumps({"seq": seq, "op": "create_user", "data": {"id": f"u{seq}", "name": name}}) + "\n")
+        f.write(json.dumps({"ack": [2]}) + "\n")
+        f.write(json.dumps({"retry": 3, "attempts": 2}) + "\n")
+        f.write('{"seq": 4, "op": "create_us')
+
+    backend = FakeBackend(fail=True)
+    queue = make_queue(tmp_path, backend)
+    pending = list(queue._pending)
+    queue.close(timeout=0.1)
+
+    assert [entry["seq"] for entry in pending] == [1, 3]
+    assert pending[1]["attempts"] == 2
+    # Nouvelles écritures numérotées après les anciennes
+    assert queue._seq == 3
+
+
+def test_rejected_write_is_dead_lettered_and_queue_continues(tmp_path):
+    backend = FakeBackend(reject={"bad"})
+    queue = make_queue(tmp_path, backend, max_attempts=2)
+    queue.save_face_embeddings([
+        {"id": "good-1", "user_id": "u", "embedding": [0.0] * 128},
+        {"id": "bad", "user_id": "u", "embedding": [0.0] * 128},
+        {"id": "good-2", "user_id": "u", "embedding": [0.0] * 128},
+    ])
+
+    assert queue.flush(timeout=5)
+    stats = queue.stats()
+    queue.close()
+
+    assert set(backend.embeddings) == {"good-1", "good-2"}
+    assert stats["dead_lettered"] == 1 and stats["pending"] == 0
+    dead = read_jsonl(queue.dead_letter_path)
+    assert [record["data"]["id"] for record in dead] == ["bad"]
+    assert dead[0]["attempts"] == 2 and "dead_at" in dead[0]
+    # Le compteur est relu au démarrage suivant
+    restarted = make_queue(tmp_path, FakeBackend())
+    assert restarted.stats()["dead_lettered"] == 1
+    restarted.close()
+
+
+def test_unreachable_backend_does_not_count_attempts(tmp_path):
+    backend = FakeBackend(reject={"bad"}, reachable=False)
+    queue = make_queue(tmp_path, backend, max_attempts=1)
+    queue.save_face_embeddings([{"id": "bad", "user_id": "u", "embedding": [0.0] * 128}])
+
+    assert not queue.flush(timeout=0.3)
+    queue.close(timeout=0.1)
+
+    assert queue.stats()["dead_lettered"] == 0
+    assert not queue.dead_letter_path.exists()
+
+
+def test_closed_queue_rejects_writes(tmp_path):
+    queue = make_queue(tmp_path, FakeBackend())
+    queue.close()
+    with pytest.raises(RuntimeError):
+        queue.create_user("Alice")
@@ -1,16 +1,24 @@
 import cv2
 import numpy as np
 
-def resize_image(image, size=(160, 160)):
-    """Redimensionner l’image."""
+_INV_255 = np.float32(1.0 / 255.0)
+
+def resize_image(image, size=(160, 160), out=None):
+    """Redimensionner l’image (dans `out` si fourni, sans allocation)."""
+    if out is not None:
+        return cv2.resize(image, size, dst=out)
     return cv2.resize(image, size)
 
-def normalize_image(image):
-    """Normalisation entre 0 et 1."""
+def normalize_image(image, out=None):
+    """Normalisation entre 0 et 1 (dans `out` float32 si fourni)."""
+    if out is not None:
+        return np.multiply(image, _INV_255, out=out)
     return image.astype("float32") / 255.0
 
-def convert_to_rgb(image):
-    """Convertir BGR → RGB."""
+def convert_to_rgb(image, out=None):
+    """Convertir BGR → RGB (dans `out` si fourni)."""
+    if out is not None:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=out)
     return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
 def crop_face(image, box, margin=10, margin_pct=None):
@@ -36,3 +44,57 @@ def crop_face(image, box, margin=10, margin_pct=None):
     y2 = min(y + h + margin_y, image.shape[0])
 
     return image[y1:y2, x1:x2]
+
+
+def as_bgr(image):
+    """Image BGR 3 canaux : les images grises (H, W) / (H, W, 1) et BGRA sont converties."""
+    if image.ndim == 2 or (image.ndim == 3 and image.shape[2] == 1):
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.ndim == 3 and image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+    if image.ndim == 3 and image.shape[2] == 3:
+        return image
+    raise ValueError(f"Image BGR attendue (reçu : forme {image.shape})")
+
+
+class PreprocessBuffer:
+    """
+    Buffers réutilisables pour préparer un lot de visages (resize → BGR→RGB → [0, 1]).
+
+    Le redimensionnement écrit directement dans un buffer uint8 préalloué ; l'inversion
+    des canaux et la normalisation sont faites en une seule passe (vue [..., ::-1]
+    multipliée dans le buffer float32). Aucune allocation par image tant que la taille
+    du lot ne dépasse pas la capacité (qui double si nécessaire).
+
+    Attention : le tableau retourné par fill() est réécrit à l'appel suivant.
+    """
+
+    def __init__(self, size=(224, 224), batch_size=1):
+        self.size = size
+        self._bgr = None
+        self.batch = None
+        self._allocate(batch_size)
+
+    def _allocate(self, capacity):
+        w, h = self.size
+        self._bgr = np.empty((capacity, h, w, 3), dtype=np.uint8)
+        self.batch = np.empty((capacity, h, w, 3), dtype=np.float32)
+
+    @property
+    def capacity(self):
+        return self.batch.shape[0]
+
+    def fill(self, crops):
+        """
+        Prépare les crops dans le buffer ; retourne la vue (N, H, W, 3) float32.
+        Les crops gris ou BGRA sont d'abord convertis en BGR (sinon cv2.resize
+        allouerait un autre tableau et la case du buffer garderait l'image précédente).
+        """
+        n = len(crops)
+        if n > self.capacity:
+            self._allocate(max(n, 2 * self.capacity))
+        for i, crop in enumerate(crops):
+            resize_image(as_bgr(crop), self.size, out=self._bgr[i])
+            normalize_image(self._bgr[i][..., ::-1], out=self.batch[i])
+        return self.batch[:n]
+